@@ -1,28 +1,111 @@
 """
 FastAPI Routes
 Defines the /chat endpoint
+
+Importing this module only loads FastAPI. The chat service (LangGraph,
+memory, vector store, embeddings) is built on the first /chat request, or
+at startup when API_WARMUP=1.
 """
 
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from .service import ChatService
 import logging
 
+from db import metrics
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+API_WARMUP = os.getenv("API_WARMUP", "0") == "1"
+STREAM_BUFFER_EVENTS = int(os.getenv("STREAM_BUFFER_EVENTS", "64"))
+
+REQUESTS = metrics.counter("gptmemory_requests_total", "Chat requests", ("endpoint",))
+REQUEST_ERRORS = metrics.counter("gptmemory_request_errors_total", "Chat requests that failed", ("endpoint",))
+REQUEST_SECONDS = metrics.histogram("gptmemory_request_duration_seconds", "Chat request latency", ("endpoint",))
+STREAM_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "gptmemory_stream_first_token_seconds", "Time from /chat/stream request to its first token"
+)
+_chat_service = None
+_chat_service_lock = threading.Lock()
+
+
+def get_chat_service():
+    """Build the chat service (and start background compaction) on first use."""
+    global _chat_service
+
+    with _chat_service_lock:
+        if _chat_service is None:
+            from .service import ChatService
+            from memory.compaction import start_compaction
+
+            _chat_service = ChatService()
+            start_compaction()
+
+    return _chat_service
+
+
+def __getattr__(name):
+    # `from api.routes import chat_service` keeps working, built lazily
+    if name == "chat_service":
+        return get_chat_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _warm_up():
+    from .service import warm_up
+
+    get_chat_service()
+    warm_up()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Optionally warm up; drain pending memory writes before the process exits."""
+    if API_WARMUP:
+        logger.info("Warming up chat service")
+        await asyncio.get_running_loop().run_in_executor(None, _warm_up)
+    yield
+    # Only stop what was actually started
+    if "memory.writeback" in sys.modules:
+        logger.info("Finishing post-response memory write-back")
+        await sys.modules["memory.writeback"].shutdown_writeback()
+    if "memory.summary_scheduler" in sys.modules:
+        logger.info("Summarizing buffered turns")
+        await asyncio.get_running_loop().run_in_executor(
+            None, sys.modules["memory.summary_scheduler"].shutdown_summary_scheduler
+        )
+    if "memory.compaction" in sys.modules:
+        sys.modules["memory.compaction"].shutdown_compaction()
+    if "memory.write_queue" in sys.modules:
+        logger.info("Draining write-behind queue")
+        sys.modules["memory.write_queue"].shutdown_write_queue()
+    if "db.executor" in sys.modules:
+        sys.modules["db.executor"].shutdown_executor()
+    if "db.embeddings" in sys.modules:
+        sys.modules["db.embeddings"].shutdown_embeddings()
+    if "db.http_clients" in sys.modules:
+        await sys.modules["db.http_clients"].aclose_http_clients()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="GPTMemory API",
     description="Persistent memory system for ChatGPT",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Initialize service
-chat_service = ChatService()
-
-
 # Request/Response models
 class ChatRequest(BaseModel):
     message: str
@@ -34,6 +117,10 @@ class ChatResponse(BaseModel):
     user_id: str
 
 
+class EndSessionRequest(BaseModel):
+    user_id: str = "default_user"
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -50,16 +137,20 @@ async def chat(request: ChatRequest):
     Main chat endpoint
     Accepts a message and returns a response with memory
     """
+    REQUESTS.labels("/chat").inc()
+    start = time.perf_counter()
     try:
         logger.info(f"Received message from user {request.user_id}: {request.message}")
         
-        # Process message through service
-        response = await chat_service.process_message(
+        # Process message through service (built off the event loop on first use)
+        service = _chat_service or await asyncio.get_running_loop().run_in_executor(None, get_chat_service)
+        response = await service.process_message(
             message=request.message,
             user_id=request.user_id
         )
         
         logger.info(f"Generated response for user {request.user_id}")
+        REQUEST_SECONDS.labels("/chat").observe(time.perf_counter() - start)
         
         return ChatResponse(
             response=response,
@@ -67,15 +158,139 @@ async def chat(request: ChatRequest):
         )
     
     except Exception as e:
+        REQUEST_ERRORS.labels("/chat").inc()
         logger.error(f"Error processing chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def _sse_stream(events: AsyncIterator[dict], user_id: str, start: float) -> AsyncIterator[bytes]:
+    """
+    Server-Sent Events for a ChatService event stream.
+    A bounded buffer sits between the graph and the socket: when it is full
+    the graph is no longer pulled, and tokens that piled up while the client
+    was slow go out coalesced in one frame. If the client disconnects the
+    response is cancelled and the turn with it.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER_EVENTS)
+
+    async def produce():
+        async with aclosing(events):
+            try:
+                async for event in events:
+                    await queue.put(event)
+            except Exception as e:
+                REQUEST_ERRORS.labels("/chat/stream").inc()
+                logger.exception(f"Error streaming chat for user {user_id}")
+                await queue.put({"event": "error", "data": {"detail": str(e)}})
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    first_token = True
+    try:
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            frames, tokens = [], []
+            for event in batch:
+                if event is not None and event["event"] == "token":
+                    if first_token:
+                        STREAM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                        first_token = False
+                    tokens.append(event["data"]["text"])
+                    continue
+                if tokens:
+                    frames.append(_sse("token", {"text": "".join(tokens)}))
+                    tokens = []
+                if event is None:
+                    finished = True
+                    break
+                frames.append(_sse(event["event"], event["data"]))
+            if tokens:
+                frames.append(_sse("token", {"text": "".join(tokens)}))
+            yield b"".join(frames)
+    finally:
+        if not producer.done():
+            logger.info(f"Client {user_id} disconnected mid-stream")
+            producer.cancel()
+
+
+class EventStreamResponse(StreamingResponse):
+    """StreamingResponse that always closes its iterator, so a disconnect cancels the turn right away."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    Events: retrieval, token (repeated), done, memory
+    Tokens are the chat model's stream deltas (graph/pipeline.generate_tokens).
+    """
+    REQUESTS.labels("/chat/stream").inc()
+    start = time.perf_counter()
+    logger.info(f"Received streaming message from user {request.user_id}: {request.message}")
+
+    service = _chat_service or await asyncio.get_running_loop().run_in_executor(None, get_chat_service)
+    return EventStreamResponse(
+        _sse_stream(service.stream_message(request.message, request.user_id), request.user_id, start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat/end")
+async def end_session(request: EndSessionRequest):
+    """
+    End a conversation: summarize the session's buffered turns now
+    instead of waiting for the batch to fill (SUMMARY_BATCH)
+    """
+    service = _chat_service or await asyncio.get_running_loop().run_in_executor(None, get_chat_service)
+    if not await service.end_session(request.user_id):
+        raise HTTPException(status_code=503, detail="Summarizing the session failed; it will be retried")
+    return {"user_id": request.user_id, "summarized": True}
+
+
+_HEALTH_STATS = [
+    ("writeback", "memory.writeback", "get_writeback"),
+    ("write_queue", "memory.write_queue", "get_write_queue"),
+    ("dedup", "memory.dedup", "get_deduplicator"),
+    ("retrieval_cache", "memory.retrieval_cache", "get_retrieval_cache"),
+    ("working_memory", "memory.working_memory", "get_working_memory"),
+    ("working_sets", "memory.working_set", "get_working_sets"),
+    ("summaries", "memory.summary_scheduler", "get_summary_scheduler"),
+    ("remember_gate", "memory.remember_gate", "get_remember_gate"),
+    ("compaction", "memory.compaction", "get_compactor"),
+    ("http", "db.http_clients", "get_http_clients"),
+]
+
+
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
-    return {
+    """Detailed health check (stats only for subsystems that were loaded)"""
+    health = {
         "status": "healthy",
         "service": "GPTMemory API",
-        "endpoints": ["/", "/chat", "/health"]
-    }
\ No newline at end of file
+        "endpoints": ["/", "/chat", "/chat/stream", "/chat/end", "/health", "/metrics"],
+    }
+    # Like lifespan: a health probe must not import the chat stack on a cold process
+    for key, module, getter in _HEALTH_STATS:
+        if module in sys.modules:
+            health[key] = getattr(sys.modules[module], getter)().stats()
+    return health
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint (db/metrics.py)"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -3,10 +3,13 @@ Chat Service Layer
 Connects FastAPI to the LangGraph memory system
 """
 
+import asyncio
+import functools
 import logging
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from graph.pipeline import build_graph
+from db.executor import run_blocking
+from memory.writeback import BACKGROUND_WRITEBACK, get_writeback
 
 logger = logging.getLogger(__name__)
 
@@ -17,27 +20,44 @@ class ChatService:
     Delegates all intelligence + memory to LangGraph.
     """
 
-    def __init__(self):
+    def __init__(self, background_writeback: bool = BACKGROUND_WRITEBACK):
         # Build LangGraph once (expensive ops happen here, not per request)
-        self.graph = build_graph()
+        from graph.pipeline import build_graph, build_response_graph, build_writeback_graph
+
+        self.background_writeback = background_writeback
+        if background_writeback:
+            # Reply after generate; summarize + store run afterwards (memory/writeback.py)
+            self.graph = build_response_graph()
+            self.writeback_graph = build_writeback_graph()
+        else:
+            self.graph = build_graph()
         logger.info("LangGraph memory pipeline initialized")
 
+    @staticmethod
+    def _initial_state(message: str, user_id: str) -> dict:
+        return {
+            "user_input": message,
+            "retrieved_memories": [],
+            "response": None,
+            "summary": None,
+            "memory_id": None,
+            "metadata": {
+                "session_id": user_id,
+                "timestamps": {},
+            },
+        }
+
     async def process_message(self, message: str, user_id: str) -> str:
         """
         Process incoming message through LangGraph memory system.
         """
         try:
-            # Invoke the graph with the correct state shape
-            final_state = self.graph.invoke({
-                "user_input": message,
-                "retrieved_memories": [],
-                "response": None,
-                "summary": None,
-                "metadata": {
-                    "session_id": user_id,
-                    "timestamps": {},
-                },
-            })
+            if self.background_writeback:
+                # Let this session's previous turns land so they can be retrieved
+                await get_writeback().wait_session(user_id)
+
+            # ainvoke: blocking I/O runs on the bounded executor, not the event loop
+            final_state = await self.graph.ainvoke(self._initial_state(message, user_id))
 
             response = final_state.get("response")
 
@@ -45,8 +65,73 @@ class ChatService:
                 logger.warning("Graph returned no response")
                 return "Sorry, I couldn't generate a response."
 
+            if self.background_writeback:
+                # Blocking invoke: runs on the write-back pool, off the response path's threads
+                await get_writeback().submit(user_id, functools.partial(self.writeback_graph.invoke, final_state))
+
             return response
 
         except Exception as e:
             logger.exception("Error processing message via LangGraph")
             return f"Internal error: {str(e)}"
+
+    async def stream_message(self, message: str, user_id: str) -> AsyncIterator[dict]:
+        """
+        Process a message, yielding events as the graph produces them:
+        retrieval {"memories"} -> token {"text"}... -> done {"response"} -> memory {"stored"}.
+        "stored" is true only if store_memory wrote a memory for this turn: false
+        for turns the remember gate skipped, turns buffered for a batch summary
+        (SUMMARY_BATCH) and dropped write-backs.
+        Closing the iterator before "done" cancels the turn (nothing is stored).
+        """
+        if self.background_writeback:
+            await get_writeback().wait_session(user_id)
+
+        final_state = self._initial_state(message, user_id)
+        async for mode, chunk in self.graph.astream(final_state, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                yield {"event": "token", "data": {"text": chunk["token"]}}
+                continue
+            for node, update in chunk.items():
+                final_state.update(update or {})
+                if node == "retrieve_memory":
+                    yield {"event": "retrieval", "data": {"memories": len(final_state["retrieved_memories"])}}
+                elif node == "generate_response":
+                    yield {"event": "done", "data": {"response": final_state.get("response")}}
+
+        if not final_state.get("response"):
+            return
+        if self.background_writeback:
+            written = await get_writeback().submit(
+                user_id, functools.partial(self.writeback_graph.invoke, final_state)
+            )
+            # Shielded: a client leaving now must not cancel the write-back
+            final_state = await asyncio.shield(written) or {}
+        yield {"event": "memory", "data": {"stored": bool(final_state.get("memory_id"))}}
+
+    async def end_session(self, user_id: str) -> bool:
+        """
+        Summarize the session's still-buffered turns now (SUMMARY_BATCH).
+        Runs behind the session's pending write-backs. False if summarizing failed.
+        """
+        from memory.summary_scheduler import get_summary_scheduler
+
+        end = functools.partial(get_summary_scheduler().end_session, user_id)
+        if self.background_writeback:
+            return bool(await (await get_writeback().submit(user_id, end)))
+        return await run_blocking(end)
+
+
+def warm_up():
+    """
+    Initialize what the first request would otherwise pay for:
+    embedding model, vector store and its executor.
+    """
+    from db.embeddings import get_embeddings
+    from db.executor import get_executor
+    from db.vector_store import init_vector_store
+
+    get_embeddings()
+    init_vector_store()
+    get_executor()
+    logger.info("Memory backends warmed up")
@@ -0,0 +1,157 @@
+"""
+Micro-batching dispatcher for embedding requests.
+Concurrent callers are coalesced into one embed_documents call.
+
+Requests that arrive within `window_ms` of the first queued request (or until
+`max_batch` texts are waiting) are sent together, and each caller gets its own
+vector back through a Future. Up to `max_in_flight` batches run concurrently so
+a slow provider call doesn't hold up collection of the next batch.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+DEFAULT_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings wrapper that funnels all calls through one dispatcher thread."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        window_ms: float = DEFAULT_WINDOW_MS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ):
+        self.embeddings = embeddings
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._queue: "queue.Queue[Optional[tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Held while queueing and while closing, so nothing lands behind the stop sentinel unseen
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches_sent = 0
+        self.texts_sent = 0
+
+    def _ensure_started_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_in_flight, thread_name_prefix="embedding-batch"
+            )
+            self._thread = threading.Thread(
+                target=self._run, name="embedding-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window_ms / 1000.0
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            # Block collection (not callers) while all provider slots are busy
+            self._slots.acquire()
+            self._pool.submit(self._dispatch, batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch: list[tuple[str, Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Embedding provider returned {len(vectors)} vectors for {len(texts)} texts")
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        self._count(len(texts))
+        for (_, fut), vec in zip(batch, vectors):
+            fut.set_result(vec)
+
+    def _count(self, texts: int):
+        # Dispatch threads and direct embed_documents callers both report here
+        with self._stats_lock:
+            self.batches_sent += 1
+            self.texts_sent += texts
+
+    def _submit(self, text: str) -> Future:
+        fut: Future = Future()
+        with self._start_lock:
+            self._ensure_started_locked()
+            self._queue.put((text, fut))
+        return fut
+
+    def embed_query(self, text: str) -> list[float]:
+        """Queue a single text and wait for its batched vector."""
+        return self._submit(text).result()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Large batches go straight through; small ones join the queue."""
+        if len(texts) >= self.max_batch:
+            vectors = self.embeddings.embed_documents(texts)
+            self._count(len(texts))
+            return vectors
+        futures = [self._submit(t) for t in texts]
+        return [f.result() for f in futures]
+
+    def stats(self) -> dict:
+        """Provider call counters."""
+        with self._stats_lock:
+            batches, texts = self.batches_sent, self.texts_sent
+        return {
+            "batches_sent": batches,
+            "texts_sent": texts,
+            "avg_batch_size": texts / batches if batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def close(self):
+        """Stop the dispatcher after flushing anything already queued; fail whatever it didn't pick up."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+            self._thread = None
+            self._pool = None
+            # Nothing can queue behind the sentinel while the lock is held, but a dispatcher that
+            # died (or was never restarted) leaves its queue behind: fail it rather than hang callers
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[1].set_exception(RuntimeError("Embedding batcher closed before the request was sent"))
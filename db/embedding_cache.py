@@ -0,0 +1,259 @@
+"""
+Content-addressed cache in front of the embedding model.
+Repeated queries and re-stored summaries never hit the provider twice.
+
+Two tiers:
+- in-memory LRU (bounded by entry count)
+- on-disk SQLite file next to chroma_db/ (bounded by total bytes)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "embedding_cache.sqlite3")
+DEFAULT_MAX_MEMORY_ITEMS = 10_000
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different inputs share a key."""
+    return " ".join(text.split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Hash of model name + normalized text."""
+    payload = f"{model_name}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=20).hexdigest()
+
+
+class _DiskTier:
+    """SQLite-backed key -> float32 blob store with size-bounded eviction."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        self._total_bytes = row[0]
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            placeholders = ",".join("?" * len(keys))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            if rows:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows],
+                )
+                self._conn.commit()
+        for key, blob in rows:
+            vec = array("f")
+            vec.frombytes(blob)
+            found[key] = vec.tolist()
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            for key, blob, size, ts in rows:
+                old = self._conn.execute(
+                    "SELECT size FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if old:
+                    self._total_bytes -= old[0]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, blob, size, ts),
+                )
+                self._total_bytes += size
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """Drop least recently used rows until under the byte budget."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._total_bytes = 0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any langchain Embeddings and memoizes vectors by content hash.
+    Misses are embedded in a single embed_documents call.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_memory_items: int = DEFAULT_MAX_MEMORY_ITEMS,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = _DiskTier(cache_path, max_disk_bytes) if cache_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _memory_get(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+            return vec
+
+    def _memory_put(self, key: str, vector: list[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _count(self, memory_hits: int = 0, disk_hits: int = 0, misses: int = 0):
+        # Callers on many threads share the counters
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += misses
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts, only sending cache misses to the wrapped model."""
+        keys = [cache_key(self.model_name, t) for t in texts]
+        results: dict[str, list[float]] = {}
+
+        pending = []
+        for key in keys:
+            if key in results:
+                continue
+            vec = self._memory_get(key)
+            if vec is not None:
+                results[key] = vec
+            else:
+                pending.append(key)
+        self._count(memory_hits=len(results))
+
+        if pending and self._disk is not None:
+            from_disk = self._disk.get_many(pending)
+            for key, vec in from_disk.items():
+                results[key] = vec
+                self._memory_put(key, vec)
+            self._count(disk_hits=len(from_disk))
+            pending = [k for k in pending if k not in from_disk]
+
+        if pending:
+            pending_set = set(pending)
+            miss_texts = {}
+            for key, text in zip(keys, texts):
+                if key in pending_set and key not in miss_texts:
+                    miss_texts[key] = text
+            vectors = self.embeddings.embed_documents(list(miss_texts.values()))
+            fresh = dict(zip(miss_texts.keys(), vectors))
+            self._count(misses=len(fresh))
+            for key, vec in fresh.items():
+                results[key] = vec
+                self._memory_put(key, vec)
+            if self._disk is not None:
+                self._disk.put_many(fresh)
+
+        return [results[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a single query through the cache."""
+        key = cache_key(self.model_name, text)
+        vec = self._memory_get(key)
+        if vec is not None:
+            self._count(memory_hits=1)
+            return vec
+
+        if self._disk is not None:
+            found = self._disk.get_many([key])
+            if key in found:
+                self._count(disk_hits=1)
+                self._memory_put(key, found[key])
+                return found[key]
+
+        vec = self.embeddings.embed_query(text)
+        self._count(misses=1)
+        self._memory_put(key, vec)
+        if self._disk is not None:
+            self._disk.put_many({key: vec})
+        return vec
+
+    def stats(self) -> dict:
+        """Hit/miss counters for both tiers."""
+        with self._lock:
+            memory_hits, disk_hits, misses = self.memory_hits, self.disk_hits, self.misses
+            memory_items = len(self._memory)
+        lookups = memory_hits + disk_hits + misses
+        return {
+            "memory_hits": memory_hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": (memory_hits + disk_hits) / lookups if lookups else 0.0,
+            "memory_items": memory_items,
+            "disk_bytes": self._disk.total_bytes if self._disk is not None else 0,
+        }
+
+    def clear(self):
+        """Drop both tiers and reset counters."""
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+        if self._disk is not None:
+            self._disk.clear()
@@ -1,11 +1,111 @@
 """
 Embedding configuration for the project.
 Everyone imports from here - don't create embeddings elsewhere.
+
+Backend is picked with EMBEDDINGS_BACKEND:
+- "openai" (default): OpenAI text-embedding-3-small
+- "local": offline hashed n-gram vectorizer (db/local_embeddings.py)
+
+Vectors from different backends are not comparable - use a fresh persist
+directory when switching.
 """
 
-from langchain_openai import OpenAIEmbeddings
+import os
+
+from langchain_core.embeddings import Embeddings
+
+from db.embedding_batcher import BatchingEmbeddings
+from db.embedding_cache import CachedEmbeddings
+from db.metrics import callback, instrument_call
+
+
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai")
+EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+LOCAL_EMBEDDING_IDF_PATH = os.getenv("LOCAL_EMBEDDING_IDF_PATH")
+_embeddings = None
+
+
+class TimedEmbeddings(Embeddings):
+    """Provider wrapper feeding the external-call metrics (call="embed")."""
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+        self._embed_documents = instrument_call(inner.embed_documents, "embed")
+        self._embed_query = instrument_call(inner.embed_query, "embed")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed_query(text)
+
+    def __getattr__(self, name):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
 
 
 def get_embeddings():
-    """Returns the embedding model. Change here to swap models."""
-    return OpenAIEmbeddings(model="text-embedding-3-small")
+    """
+    Returns the embedding model. Change here to swap models.
+    Remote layers: content cache -> micro-batcher -> provider.
+    The local backend is cheaper to recompute than to cache, so it is used as-is.
+    """
+    global _embeddings
+
+    if _embeddings is not None:
+        return _embeddings
+
+    if EMBEDDINGS_BACKEND == "local":
+        from db.local_embeddings import HashedNgramEmbeddings
+
+        _embeddings = TimedEmbeddings(HashedNgramEmbeddings(
+            dim=LOCAL_EMBEDDING_DIM,
+            idf_path=LOCAL_EMBEDDING_IDF_PATH,
+        ))
+    elif EMBEDDINGS_BACKEND == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from db.http_clients import get_http_clients
+
+        clients = get_http_clients()
+        provider = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            http_client=clients.client("openai"),
+            http_async_client=clients.async_client("openai"),
+        )
+        _embeddings = CachedEmbeddings(
+            BatchingEmbeddings(TimedEmbeddings(provider)),
+            model_name=EMBEDDING_MODEL,
+        )
+    else:
+        raise ValueError(f"Unknown EMBEDDINGS_BACKEND: {EMBEDDINGS_BACKEND}")
+
+    return _embeddings
+
+
+def shutdown_embeddings():
+    """Stop the micro-batcher's dispatcher thread if it was started (FastAPI shutdown)."""
+    batcher = _embeddings.embeddings if isinstance(_embeddings, CachedEmbeddings) else _embeddings
+    if isinstance(batcher, BatchingEmbeddings):
+        batcher.close()
+
+
+def get_embedding_cache_stats() -> dict:
+    """Hit/miss counters of the shared embedding cache."""
+    if not isinstance(_embeddings, CachedEmbeddings):
+        return {}
+    return _embeddings.stats()
+
+
+def _cache_lookups() -> dict:
+    stats = get_embedding_cache_stats()
+    return {
+        "memory_hit": stats.get("memory_hits", 0),
+        "disk_hit": stats.get("disk_hits", 0),
+        "miss": stats.get("misses", 0),
+    }
+
+
+callback("gptmemory_embedding_cache_lookups_total", "Embedding cache lookups by outcome",
+         _cache_lookups, kind="counter", labelnames=("result",))
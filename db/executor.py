@@ -0,0 +1,44 @@
+"""
+Bounded thread pool for blocking I/O called from async code.
+Embedding HTTP calls and vector store reads/writes that have no native
+async API run here instead of on the event loop thread.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+_executor: Optional[ThreadPoolExecutor] = None
+
+T = TypeVar("T")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Initialize or return the shared blocking-I/O pool."""
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io"
+        )
+
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Await a blocking call on the bounded pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True):
+    """Stop the pool (FastAPI shutdown)."""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,460 @@
+"""
+Shared HTTP connection pools for every LLM and embedding provider call.
+
+One sync and one async httpx transport hold all keep-alive connections.
+Each provider gets thin clients on top of them with its own max in-flight
+limit, so summarization, generation and the OpenAI embeddings reuse warm
+connections instead of each opening (and re-handshaking) their own.
+
+    get_openai_client()                 sync OpenAI SDK client
+    get_async_openai_client()           async OpenAI SDK client
+    get_http_clients().client(name)     raw httpx.Client for any provider
+
+Async clients belong to the serving event loop. Stats (requests sent and
+connections opened per pool, counted from httpcore trace events, and
+per-provider in-flight and time spent waiting for a slot) are on /health.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+
+from db.metrics import callback, counter, histogram
+
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "32"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "60"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "60"))
+HTTP2 = os.getenv("HTTP2", "0") == "1"
+# "provider=limit,..."; unlisted providers get DEFAULT_MAX_IN_FLIGHT
+PROVIDER_MAX_IN_FLIGHT = os.getenv("PROVIDER_MAX_IN_FLIGHT", "openai=16")
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("DEFAULT_MAX_IN_FLIGHT", "32"))
+
+_clients: Optional["HTTPClients"] = None
+_openai_client = None
+_async_openai_client = None
+_singleton_lock = threading.Lock()
+
+HTTP_REQUEST_SECONDS = histogram(
+    "gptmemory_http_request_duration_seconds", "Provider HTTP request latency to response headers", ("provider",)
+)
+HTTP_REQUEST_ERRORS = counter("gptmemory_http_request_errors_total", "Provider HTTP transport errors", ("provider",))
+
+
+def parse_limits(spec: str) -> dict[str, int]:
+    """"openai=16,local=4" -> {"openai": 16, "local": 4}."""
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+_CONNECT_EVENTS = ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete")
+
+
+class PoolStats:
+    """Requests sent through a shared pool and connections it opened (from httpcore trace events)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connects = 0
+        self._lock = threading.Lock()
+
+    def sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def connected(self):
+        with self._lock:
+            self.connects += 1
+
+    def tracer(self, inner: Optional[Callable] = None) -> Callable:
+        """httpcore `trace` extension for a sync request, chained to the caller's own."""
+        def trace(event: str, info: dict):
+            if event in _CONNECT_EVENTS:
+                self.connected()
+            if inner is not None:
+                inner(event, info)
+        return trace
+
+    def async_tracer(self, inner: Optional[Callable] = None) -> Callable:
+        async def trace(event: str, info: dict):
+            if event in _CONNECT_EVENTS:
+                self.connected()
+            if inner is not None:
+                await inner(event, info)
+        return trace
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connects": self.connects,
+                "reused": max(0, self.requests - self.connects),
+            }
+
+
+class ProviderStats:
+    """Request and limiter counters for one provider."""
+
+    def __init__(self, limit: int, provider: str = ""):
+        self.limit = limit
+        self.latency = HTTP_REQUEST_SECONDS.labels(provider)
+        self.errors = HTTP_REQUEST_ERRORS.labels(provider)
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waited = 0
+        self.wait_s = 0.0
+        self.max_wait_s = 0.0
+        self._lock = threading.Lock()
+
+    def started(self, wait_s: float):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if wait_s > 1e-4:
+                self.waited += 1
+            self.wait_s += wait_s
+            self.max_wait_s = max(self.max_wait_s, wait_s)
+
+    def finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "waited": self.waited,
+                "avg_wait_ms": round(1000 * self.wait_s / self.requests, 3) if self.requests else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait_s, 3),
+            }
+
+
+class _FifoSlots:
+    """Counting semaphore that hands slots to waiters in arrival order (no barging)."""
+
+    def __init__(self, n: int):
+        self._free = n
+        self._waiters: deque[threading.Event] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            turn = threading.Event()
+            self._waiters.append(turn)
+        turn.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes straight to the next waiter
+            else:
+                self._free += 1
+
+
+def _release_once(release: Callable[[], None]) -> Callable[[], None]:
+    done = False
+
+    def wrapper():
+        nonlocal done
+        if not done:
+            done = True
+            release()
+
+    return wrapper
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees the provider slot once read or closed."""
+
+    def __init__(self, inner: httpx.SyncByteStream, release: Callable[[], None]):
+        self._inner = inner
+        self._release = release
+
+    def __iter__(self):
+        yield from self._inner
+
+    def close(self):
+        try:
+            self._inner.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._inner = inner
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._inner.aclose()
+        finally:
+            self._release()
+
+
+class _LimitedTransport(httpx.BaseTransport):
+    """A provider's view of the shared transport, capped at `limit` in-flight requests."""
+
+    def __init__(self, inner: httpx.HTTPTransport, limit: int, stats: ProviderStats, pool: PoolStats):
+        self._inner = inner
+        self._slots = _FifoSlots(limit)
+        self._stats = stats
+        self._pool = pool
+
+    def _release(self):
+        self._stats.finished()
+        self._slots.release()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        self._slots.acquire()
+        self._stats.started(time.perf_counter() - start)
+        release = _release_once(self._release)
+        request.extensions = {**request.extensions, "trace": self._pool.tracer(request.extensions.get("trace"))}
+        self._pool.sent()
+        sent = time.perf_counter()
+        try:
+            response = self._inner.handle_request(request)
+        except BaseException:
+            self._stats.errors.inc()
+            release()
+            raise
+        self._stats.latency.observe(time.perf_counter() - sent)
+        # Streaming responses hold the slot until the body is consumed
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def close(self):
+        pass  # the shared transport is closed by HTTPClients.close()
+
+
+class _AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Async counterpart of _LimitedTransport. An asyncio.Semaphore binds to the
+    loop that first waits on it, so each event loop gets its own `limit` slots.
+    """
+
+    def __init__(self, inner: httpx.AsyncHTTPTransport, limit: int, stats: ProviderStats, pool: PoolStats):
+        self._inner = inner
+        self._limit = limit
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._slots_lock = threading.Lock()
+        self._stats = stats
+        self._pool = pool
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._slots_lock:
+            slots = self._slots.get(loop)
+            if slots is None:
+                slots = self._slots[loop] = asyncio.Semaphore(self._limit)
+            return slots
+
+    def _release(self, slots: asyncio.Semaphore):
+        self._stats.finished()
+        slots.release()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        slots = self._loop_slots()
+        await slots.acquire()
+        self._stats.started(time.perf_counter() - start)
+        release = _release_once(lambda: self._release(slots))
+        request.extensions = {**request.extensions, "trace": self._pool.async_tracer(request.extensions.get("trace"))}
+        self._pool.sent()
+        sent = time.perf_counter()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException:
+            self._stats.errors.inc()
+            release()
+            raise
+        self._stats.latency.observe(time.perf_counter() - sent)
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self):
+        pass
+
+
+class HTTPClients:
+    """Provider-client registry over one shared sync and one shared async pool."""
+
+    def __init__(self, limits: Optional[dict[str, int]] = None, http2: bool = HTTP2):
+        self.limits = parse_limits(PROVIDER_MAX_IN_FLIGHT) if limits is None else dict(limits)
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.warning("HTTP2=1 but the h2 package is not installed, using HTTP/1.1")
+        self._lock = threading.Lock()
+        self._transport: Optional[httpx.HTTPTransport] = None
+        self._async_transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._pool_stats = PoolStats()
+        self._async_pool_stats = PoolStats()
+        self._clients: dict[str, httpx.Client] = {}
+        self._async_clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, ProviderStats] = {}
+        self._async_stats: dict[str, ProviderStats] = {}
+
+    def _pool_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(HTTP_TIMEOUT_S, connect=HTTP_CONNECT_TIMEOUT_S)
+
+    def limit(self, provider: str) -> int:
+        return self.limits.get(provider, DEFAULT_MAX_IN_FLIGHT)
+
+    def client(self, provider: str) -> httpx.Client:
+        """Shared-pool httpx.Client for a provider (callers must not close it)."""
+        with self._lock:
+            if provider not in self._clients:
+                if self._transport is None:
+                    self._transport = httpx.HTTPTransport(limits=self._pool_limits(), http2=self.http2)
+                stats = self._stats[provider] = ProviderStats(self.limit(provider), provider)
+                self._clients[provider] = httpx.Client(
+                    transport=_LimitedTransport(self._transport, self.limit(provider), stats, self._pool_stats),
+                    timeout=self._timeout(),
+                )
+            return self._clients[provider]
+
+    def async_client(self, provider: str) -> httpx.AsyncClient:
+        """Shared-pool httpx.AsyncClient for a provider (callers must not close it)."""
+        with self._lock:
+            if provider not in self._async_clients:
+                if self._async_transport is None:
+                    self._async_transport = httpx.AsyncHTTPTransport(limits=self._pool_limits(), http2=self.http2)
+                stats = self._async_stats[provider] = ProviderStats(self.limit(provider), provider)
+                self._async_clients[provider] = httpx.AsyncClient(
+                    transport=_AsyncLimitedTransport(
+                        self._async_transport, self.limit(provider), stats, self._async_pool_stats
+                    ),
+                    timeout=self._timeout(),
+                )
+            return self._async_clients[provider]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "pool": self._pool_stats.snapshot(),
+                "async_pool": self._async_pool_stats.snapshot(),
+                "providers": {name: s.snapshot() for name, s in self._stats.items()},
+                "async_providers": {name: s.snapshot() for name, s in self._async_stats.items()},
+            }
+
+    def close(self):
+        """Close the sync pool."""
+        with self._lock:
+            self._clients.clear()
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+
+    async def aclose(self):
+        """Close both pools (call from the event loop that used the async clients)."""
+        with self._lock:
+            self._async_clients.clear()
+            transport, self._async_transport = self._async_transport, None
+        if transport is not None:
+            await transport.aclose()
+        self.close()
+
+
+def get_http_clients() -> HTTPClients:
+    """Initialize or return the shared provider-client registry."""
+    global _clients
+
+    with _singleton_lock:
+        if _clients is None:
+            _clients = HTTPClients()
+
+    return _clients
+
+
+def get_openai_client():
+    """OpenAI SDK client on the shared pool (needs OPENAI_API_KEY in environment)."""
+    global _openai_client
+
+    if _openai_client is None:
+        from openai import OpenAI
+        _openai_client = OpenAI(http_client=get_http_clients().client("openai"))
+
+    return _openai_client
+
+
+def get_async_openai_client():
+    """AsyncOpenAI SDK client on the shared async pool."""
+    global _async_openai_client
+
+    if _async_openai_client is None:
+        from openai import AsyncOpenAI
+        _async_openai_client = AsyncOpenAI(http_client=get_http_clients().async_client("openai"))
+
+    return _async_openai_client
+
+
+async def aclose_http_clients():
+    """Close the shared pools (FastAPI shutdown)."""
+    global _clients, _openai_client, _async_openai_client
+
+    if _clients is not None:
+        await _clients.aclose()
+        _clients = None
+    _openai_client = None
+    _async_openai_client = None
+
+
+def _in_flight() -> dict:
+    if _clients is None:
+        return {}
+    stats = _clients.stats()
+    totals: dict[str, int] = {}
+    for group in ("providers", "async_providers"):
+        for name, provider in stats[group].items():
+            totals[name] = totals.get(name, 0) + provider["in_flight"]
+    return totals
+
+
+def _connects() -> float:
+    if _clients is None:
+        return 0
+    stats = _clients.stats()
+    return stats["pool"]["connects"] + stats["async_pool"]["connects"]
+
+
+callback("gptmemory_http_in_flight", "Provider requests in flight", _in_flight, labelnames=("provider",))
+callback("gptmemory_http_connections_opened_total", "Connections opened by the shared pools", _connects, kind="counter")
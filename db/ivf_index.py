@@ -0,0 +1,255 @@
+"""
+IVF (inverted file) approximate nearest neighbour index in NumPy.
+
+Vectors are clustered with spherical k-means; each row is filed under its
+nearest centroid. A query scores the centroids, then exactly rescores only
+the rows of the `nprobe` best lists. Higher nprobe = better recall, slower.
+
+The index stores row numbers only - vectors stay in the owning store's
+matrix (db/numpy_store.py), so memory overhead is ~4 bytes per row.
+Rows added after training go straight into their nearest list; rows added
+while a (background) retrain is running are scanned exactly until the new
+lists are swapped in.
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NPROBE = 16
+TRAIN_SAMPLE_PER_LIST = 32
+KMEANS_ITERS = 10
+ASSIGN_CHUNK = 65_536
+RETRAIN_GROWTH = 2.0
+
+
+def default_nlist(n_rows: int) -> int:
+    """Rule of thumb: ~4*sqrt(n) lists."""
+    return int(min(65_536, max(16, 4 * np.sqrt(n_rows))))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (max inner product) for each row, chunked."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        block = np.asarray(vectors[start:start + ASSIGN_CHUNK], dtype=np.float32)
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a random sample of rows."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, nlist * TRAIN_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        labels = assign(sample, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        # Per-list sums via one sort + reduceat (np.add.at is far slower)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        empty = counts == 0
+        # Re-seed empty lists from random sample rows
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+class _Lists:
+    """Row ids per list in growable int32 arrays."""
+
+    def __init__(self, nlist: int):
+        self.rows = [np.empty(0, dtype=np.int32) for _ in range(nlist)]
+        self.sizes = np.zeros(nlist, dtype=np.int64)
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray, nlist: int, offset: int = 0) -> "_Lists":
+        lists = cls(nlist)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+        for i in range(nlist):
+            members = (order[bounds[i]:bounds[i + 1]] + offset).astype(np.int32)
+            lists.rows[i] = members
+            lists.sizes[i] = len(members)
+        return lists
+
+    def append(self, labels: np.ndarray, start_row: int):
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        for lst in np.unique(sorted_labels):
+            lo, hi = np.searchsorted(sorted_labels, [lst, lst + 1])
+            new_rows = (order[lo:hi] + start_row).astype(np.int32)
+            size = self.sizes[lst]
+            arr = self.rows[lst]
+            if size + len(new_rows) > len(arr):
+                grown = np.empty(max(16, 2 * (size + len(new_rows))), dtype=np.int32)
+                grown[:size] = arr[:size]
+                arr = grown
+                self.rows[lst] = arr
+            arr[size:size + len(new_rows)] = new_rows
+            self.sizes[lst] = size + len(new_rows)
+
+    def gather(self, list_ids) -> np.ndarray:
+        parts = [self.rows[i][:self.sizes[i]] for i in list_ids]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+
+class IVFIndex:
+    """ANN layer over a row-addressable float32 matrix of unit vectors."""
+
+    def __init__(self, nprobe: int = DEFAULT_NPROBE, nlist: Optional[int] = None, path: Optional[str] = None):
+        self.nprobe = nprobe
+        self.fixed_nlist = nlist
+        self.path = path
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: Optional[_Lists] = None
+        self.indexed_rows = 0  # rows [0, indexed_rows) are filed in lists
+        self.trained_rows = 0
+        self._lock = threading.Lock()
+        self._training: Optional[threading.Thread] = None
+        if path and os.path.exists(path):
+            self._load()
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def reset(self):
+        """Forget the trained index (and its file); the next maybe_retrain rebuilds it."""
+        with self._lock:
+            self.centroids = None
+            self._lists = None
+            self.indexed_rows = 0
+            self.trained_rows = 0
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    # ---- training ----
+
+    def train(self, matrix: np.ndarray):
+        """(Re)build centroids and lists from the first len(matrix) rows."""
+        n = len(matrix)
+        if n == 0:
+            return
+        nlist = min(self.fixed_nlist or default_nlist(n), n)
+        centroids = train_centroids(matrix, nlist)
+        labels = assign(matrix, centroids)
+        lists = _Lists.from_labels(labels, nlist)
+        with self._lock:
+            self.centroids = centroids
+            self._lists = lists
+            self.indexed_rows = n
+            self.trained_rows = n
+        self._save()
+
+    def maybe_retrain(self, matrix_fn: Callable[[], np.ndarray], min_rows: int):
+        """Retrain in a background thread once the store has grown enough."""
+        n = len(matrix_fn())
+        if n < min_rows:
+            return
+        if self.ready and n < self.trained_rows * RETRAIN_GROWTH:
+            return
+        if self._training is not None and self._training.is_alive():
+            return
+
+        def run():
+            try:
+                self.train(matrix_fn()[:n])
+                # File rows that arrived during training
+                self.add(matrix_fn())
+            except Exception:
+                logger.exception("IVF retrain failed")
+
+        self._training = threading.Thread(target=run, name="ivf-retrain", daemon=True)
+        self._training.start()
+
+    def wait(self):
+        """Block until a background retrain finishes."""
+        if self._training is not None:
+            self._training.join()
+
+    # ---- inserts ----
+
+    def add(self, matrix: np.ndarray):
+        """File every row not yet in a list under its nearest centroid."""
+        with self._lock:
+            if not self.ready:
+                return
+            start_row = self.indexed_rows
+            new = matrix[start_row:]
+            if len(new) == 0:
+                return
+            labels = assign(new, self.centroids)
+            self._lists.append(labels, start_row)
+            self.indexed_rows = start_row + len(new)
+
+    # ---- search ----
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> tuple[np.ndarray, int]:
+        """Candidate rows from the nprobe nearest lists, plus the first unindexed row."""
+        with self._lock:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            centroid_scores = self.centroids @ query
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+            return self._lists.gather(probe), self.indexed_rows
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k (rows, scores), best first."""
+        rows, indexed = self.candidates(query, nprobe)
+        # Rows not yet filed (appended during a retrain) are scanned exactly
+        if indexed < len(matrix):
+            rows = np.concatenate([rows, np.arange(indexed, len(matrix), dtype=np.int32)])
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        rows = np.sort(rows)  # sequential access into the mmap
+        scores = matrix[rows] @ query
+        k = min(k, len(rows))
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
+
+    # ---- persistence ----
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self.ready:
+                return
+            centroids, trained = self.centroids, self.trained_rows
+            labels = np.empty(self.indexed_rows, dtype=np.int32)
+            for i, size in enumerate(self._lists.sizes):
+                labels[self._lists.rows[i][:size]] = i
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, centroids=centroids, labels=labels, trained_rows=trained)
+        os.replace(tmp, self.path)
+
+    def save(self):
+        """Persist centroids and list assignments."""
+        self._save()
+
+    def _load(self):
+        data = np.load(self.path)
+        self.centroids = data["centroids"]
+        labels = data["labels"].astype(np.int32)
+        self.trained_rows = int(data["trained_rows"])
+        self._lists = _Lists.from_labels(labels, len(self.centroids))
+        self.indexed_rows = len(labels)
@@ -0,0 +1,245 @@
+"""
+BM25 inverted index kept alongside the vector store.
+Used by hybrid retrieval (memory/retrieve.py) to shortlist candidates
+without embedding the query.
+
+Persistence is an append-only JSONL log per partition; the in-memory index
+is built from it on first search. Writes before that only append to the log.
+Postings are growable NumPy arrays (doc numbers + term frequencies).
+Deletes append a tombstone to the log and mask the document out of scoring.
+Metadata patches (dedup refreshes, compaction access counts) and replaced
+texts (near-duplicate updates) are logged and applied too, so lexical-only
+hits return the same text and metadata as the store.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+K1 = 1.2
+B = 0.75
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her him his how i if in "
+    "is it its me my of on or our she so that the their them they this to was we were what when "
+    "where which who why will with you your user said".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens, stopwords dropped, plural/possessive 's' stripped."""
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower().replace("'s", "")):
+        if tok in STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+class _Postings:
+    __slots__ = ("docs", "tfs", "size")
+
+    def __init__(self):
+        self.docs = np.empty(4, dtype=np.int32)
+        self.tfs = np.empty(4, dtype=np.float32)
+        self.size = 0
+
+    def append(self, doc: int, tf: int):
+        if self.size == len(self.docs):
+            self.docs = np.resize(self.docs, 2 * self.size)
+            self.tfs = np.resize(self.tfs, 2 * self.size)
+        self.docs[self.size] = doc
+        self.tfs[self.size] = tf
+        self.size += 1
+
+
+class BM25Index:
+    """Okapi BM25 over one partition's memories."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = path is None or not os.path.exists(path)
+        self._postings: dict[str, _Postings] = {}
+        self._doc_len = np.empty(0, dtype=np.float32)
+        self._records: list[tuple[str, str, dict]] = []
+        self._ids: set[str] = set()
+        self._doc_of: dict[str, int] = {}
+        self._deleted = np.zeros(0, dtype=bool)
+        self._total_len = 0.0
+        self._log = None
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._ids)
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        if rec.get("deleted"):
+                            self._remove(rec["id"])
+                        elif "patch" in rec:
+                            self._update(rec["id"], rec["patch"], rec.get("text"))
+                        else:
+                            self._index(rec["id"], rec["text"], rec["metadata"])
+            self._loaded = True
+
+    def _index(self, doc_id: str, text: str, metadata: dict):
+        if doc_id in self._ids:  # retried/duplicate write
+            return
+        self._ids.add(doc_id)
+        doc = len(self._records)
+        tokens = tokenize(text)
+        counts: dict[str, int] = {}
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, tf in counts.items():
+            postings = self._postings.get(tok)
+            if postings is None:
+                postings = self._postings[tok] = _Postings()
+            postings.append(doc, tf)
+        if doc == len(self._doc_len):
+            self._doc_len = np.resize(self._doc_len, max(16, 2 * doc))
+            self._deleted = np.resize(self._deleted, len(self._doc_len))
+        self._deleted[doc] = False
+        self._doc_of[doc_id] = doc
+        self._doc_len[doc] = len(tokens)
+        self._total_len += len(tokens)
+        self._records.append((doc_id, text, metadata))
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict]):
+        """Index new memories (append to the log; index in memory if loaded)."""
+        with self._lock:
+            if self._loaded:
+                rows = [r for r in zip(ids, texts, metadatas) if r[0] not in self._ids]
+                ids, texts, metadatas = [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+            if self.path:
+                if self._log is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._log = open(self.path, "a", encoding="utf-8")
+                for doc_id, text, meta in zip(ids, texts, metadatas):
+                    self._log.write(json.dumps({"id": doc_id, "text": text, "metadata": meta}) + "\n")
+                self._log.flush()
+            if self._loaded:
+                for doc_id, text, meta in zip(ids, texts, metadatas):
+                    self._index(doc_id, text, meta)
+
+    def _remove(self, doc_id: str):
+        doc = self._doc_of.pop(doc_id, None)
+        if doc is None:
+            return
+        self._ids.discard(doc_id)
+        self._deleted[doc] = True
+        self._total_len -= float(self._doc_len[doc])
+
+    def remove(self, ids: list[str]):
+        """Drop memories from search (tombstones in the log)."""
+        with self._lock:
+            if self.path and os.path.exists(self.path):
+                if self._log is None:
+                    self._log = open(self.path, "a", encoding="utf-8")
+                for doc_id in ids:
+                    self._log.write(json.dumps({"id": doc_id, "deleted": True}) + "\n")
+                self._log.flush()
+            if self._loaded:
+                for doc_id in ids:
+                    self._remove(doc_id)
+
+    def _update(self, doc_id: str, patch: dict, text: Optional[str] = None):
+        doc = self._doc_of.get(doc_id)
+        if doc is None:
+            return
+        _, old_text, meta = self._records[doc]
+        if text is None:
+            self._records[doc] = (doc_id, old_text, {**meta, **patch})
+        else:
+            # New wording: reindex under a new doc number
+            self._remove(doc_id)
+            self._index(doc_id, text, {**meta, **patch})
+
+    def update(self, ids: list[str], patches: list[dict], texts: Optional[list[str]] = None):
+        """Merge metadata patches into indexed memories, and replace their texts if given (logged like deletes)."""
+        texts = texts or [None] * len(ids)
+        with self._lock:
+            if self.path and os.path.exists(self.path):
+                if self._log is None:
+                    self._log = open(self.path, "a", encoding="utf-8")
+                for doc_id, patch, text in zip(ids, patches, texts):
+                    rec = {"id": doc_id, "patch": patch}
+                    if text is not None:
+                        rec["text"] = text
+                    self._log.write(json.dumps(rec) + "\n")
+                self._log.flush()
+            if self._loaded:
+                for doc_id, patch, text in zip(ids, patches, texts):
+                    self._update(doc_id, patch, text)
+
+    def search(self, query: str, k: int = 10) -> list[dict]:
+        """
+        Top-k BM25 matches, best first.
+        Each hit: {"id", "text", "metadata", "score", "coverage"} where coverage
+        is the share of the query's IDF mass the document matched (0..1).
+        """
+        self._ensure_loaded()
+        with self._lock:
+            n_docs = len(self._records)
+            live = n_docs - int(self._deleted[:n_docs].sum())
+            terms = set(tokenize(query))
+            if live == 0 or not terms:
+                return []
+            avgdl = self._total_len / live
+            doc_len = self._doc_len[:n_docs]
+            scores = np.zeros(n_docs, dtype=np.float32)
+            matched_idf = np.zeros(n_docs, dtype=np.float32)
+            total_idf = 0.0
+            for term in terms:
+                postings = self._postings.get(term)
+                df = postings.size if postings else 0
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                total_idf += idf
+                if not postings:
+                    continue
+                docs = postings.docs[:postings.size]
+                tfs = postings.tfs[:postings.size]
+                norm = K1 * (1 - B + B * doc_len[docs] / avgdl)
+                scores[docs] += idf * tfs * (K1 + 1) / (tfs + norm)
+                matched_idf[docs] += idf
+
+            scores[self._deleted[:n_docs]] = 0.0
+            hits = np.flatnonzero(scores)
+            if len(hits) == 0:
+                return []
+            k = min(k, len(hits))
+            top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results = []
+            for doc in top.tolist():
+                doc_id, text, meta = self._records[doc]
+                results.append({
+                    "id": doc_id,
+                    "text": text,
+                    "metadata": meta,
+                    "score": float(scores[doc]),
+                    "coverage": float(matched_idf[doc] / total_idf) if total_idf else 0.0,
+                })
+            return results
+
+    def close(self):
+        """Close the log; the in-memory index is kept until dropped."""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,154 @@
+"""
+Offline embedding backend - no network, no model download.
+Hashed character n-grams (feature hashing) with optional IDF weighting.
+
+Hashing is done with NumPy a chunk of texts at a time: the texts are
+concatenated into one byte buffer, every n-gram window is hashed with a
+polynomial rolling hash, and counts are scattered into the output matrix
+with a single bincount. Very large bulk jobs are split across processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_DIM = 512
+DEFAULT_NGRAM_RANGE = (3, 5)
+BULK_THRESHOLD = 5_000
+CHUNK_SIZE = 128  # keeps the per-chunk hash arrays cache-resident
+_HASH_MULT = np.uint64(0x100000001B3)
+_MIX_MULT = np.uint64(0xFF51AFD7ED558CCD)
+
+
+def _hash_counts(texts: list[str], dim: int, ngram_range: tuple[int, int]) -> np.ndarray:
+    """Signed hashed n-gram counts, shape (len(texts), dim), float32."""
+    n_docs = len(texts)
+    out = np.zeros((n_docs, dim), dtype=np.float32)
+    if n_docs == 0:
+        return out
+
+    encoded = [f" {' '.join(t.lower().split())} ".encode("utf-8") for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=n_docs)
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    doc_of = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+
+    flat = np.zeros(n_docs * dim, dtype=np.float64)
+    lo, hi = ngram_range
+    with np.errstate(over="ignore"):
+        for n in range(lo, hi + 1):
+            if len(buf) < n:
+                continue
+            starts = np.arange(len(buf) - n + 1)
+            # Drop windows that straddle two documents
+            starts = starts[doc_of[starts] == doc_of[starts + n - 1]]
+            if len(starts) == 0:
+                continue
+            h = np.full(len(starts), np.uint64(n), dtype=np.uint64)
+            for j in range(n):
+                h = h * _HASH_MULT + buf[starts + j]
+            h ^= h >> np.uint64(33)
+            h *= _MIX_MULT
+            h ^= h >> np.uint64(33)
+
+            bucket = (h % np.uint64(dim)).astype(np.int64)
+            sign = np.where((h >> np.uint64(63)) == 1, -1.0, 1.0)
+            flat += np.bincount(doc_of[starts] * dim + bucket, weights=sign, minlength=n_docs * dim)
+
+    out[:] = flat.reshape(n_docs, dim)
+    return out
+
+
+def _embed_chunk(args) -> np.ndarray:
+    """Process-pool entry point (must be module level to pickle)."""
+    texts, dim, ngram_range, idf = args
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for i in range(0, len(texts), CHUNK_SIZE):
+        out[i:i + CHUNK_SIZE] = _finalize(_hash_counts(texts[i:i + CHUNK_SIZE], dim, ngram_range), idf)
+    return out
+
+
+def _finalize(counts: np.ndarray, idf: Optional[np.ndarray]) -> np.ndarray:
+    """Sublinear tf, optional IDF, then L2 row normalization."""
+    vecs = np.sign(counts) * np.log1p(np.abs(counts))
+    if idf is not None:
+        vecs *= idf
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vecs / norms).astype(np.float32)
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    Local drop-in for OpenAIEmbeddings (same embed_query/embed_documents).
+    Vectors are deterministic for a given dim/ngram_range/IDF table.
+    """
+
+    def __init__(
+        self,
+        dim: int = DEFAULT_DIM,
+        ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        idf_path: Optional[str] = None,
+        bulk_threshold: int = BULK_THRESHOLD,
+        max_workers: Optional[int] = None,
+    ):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.bulk_threshold = bulk_threshold
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.idf: Optional[np.ndarray] = None
+        if idf_path and os.path.exists(idf_path):
+            self.load_idf(idf_path)
+
+    @property
+    def model_name(self) -> str:
+        lo, hi = self.ngram_range
+        suffix = "-idf" if self.idf is not None else ""
+        return f"local-ngram{lo}{hi}-{self.dim}{suffix}"
+
+    def fit(self, corpus: list[str]) -> "HashedNgramEmbeddings":
+        """Learn IDF weights per hash bucket from a reference corpus."""
+        df = np.zeros(self.dim, dtype=np.int64)
+        for i in range(0, len(corpus), CHUNK_SIZE):
+            counts = _hash_counts(corpus[i:i + CHUNK_SIZE], self.dim, self.ngram_range)
+            df += np.count_nonzero(counts, axis=0)
+        n = len(corpus)
+        self.idf = (np.log((1 + n) / (1 + df)) + 1.0).astype(np.float32)
+        return self
+
+    def save_idf(self, path: str):
+        """Persist the fitted IDF table."""
+        if self.idf is None:
+            raise ValueError("No IDF table fitted")
+        np.save(path, self.idf)
+
+    def load_idf(self, path: str):
+        """Load a previously saved IDF table."""
+        idf = np.load(path)
+        if idf.shape != (self.dim,):
+            raise ValueError(f"IDF table has shape {idf.shape}, expected ({self.dim},)")
+        self.idf = idf.astype(np.float32)
+
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        """Embed a batch as a (n, dim) float32 matrix."""
+        if len(texts) < self.bulk_threshold or self.max_workers <= 1:
+            return _embed_chunk((texts, self.dim, self.ngram_range, self.idf))
+
+        chunk = -(-len(texts) // self.max_workers)
+        jobs = [
+            (texts[i:i + chunk], self.dim, self.ngram_range, self.idf)
+            for i in range(0, len(texts), chunk)
+        ]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return np.vstack(list(pool.map(_embed_chunk, jobs)))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch of documents."""
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a single query."""
+        return self.embed_array([text])[0].tolist()
@@ -0,0 +1,208 @@
+"""
+Secondary metadata indexes for the NumPy store (db/numpy_store.py).
+
+A filter is narrowed to candidate rows before any vector is scored:
+- hash indexes (session_id, type, memory_type): value -> row list,
+  for equality and $in
+- sorted indexes (ts, epoch seconds): row order by value, for
+  $gt/$gte/$lt/$lte windows via searchsorted
+
+Predicates on other keys (or operators the indexes can't answer) are
+checked against the candidates' metadata afterwards.
+"""
+
+from datetime import datetime
+from typing import Any, Optional
+
+import numpy as np
+
+from db.vector_backends import matches_filter
+
+
+HASH_KEYS = ("session_id", "type", "memory_type")
+RANGE_KEYS = ("ts",)
+_RANGE_OPS = {"$gt", "$gte", "$lt", "$lte", "$eq"}
+
+
+def to_epoch(value) -> Optional[float]:
+    """Epoch seconds from a number or ISO-8601 string (None if neither)."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class _RowList:
+    """Growable sorted int64 row array."""
+    __slots__ = ("rows", "size")
+
+    def __init__(self):
+        self.rows = np.empty(4, dtype=np.int64)
+        self.size = 0
+
+    def append(self, row: int):
+        if self.size == len(self.rows):
+            self.rows = np.resize(self.rows, 2 * self.size)
+        self.rows[self.size] = row
+        self.size += 1
+
+    def insert(self, row: int):
+        """Add a row, keeping the array sorted."""
+        self.append(row)
+        live = self.rows[:self.size]
+        if self.size > 1 and live[-2] > row:
+            live[:] = np.sort(live)
+
+    def remove(self, row: int):
+        live = self.rows[:self.size]
+        keep = live[live != row]
+        self.rows[:len(keep)] = keep
+        self.size = len(keep)
+
+    def view(self) -> np.ndarray:
+        return self.rows[:self.size]
+
+
+class _SortedColumn:
+    """Float column (NaN = missing) with a lazily maintained sort order."""
+
+    def __init__(self):
+        self.values = np.empty(0, dtype=np.float64)
+        self.size = 0
+        self._order: Optional[np.ndarray] = None  # rows with a value, ascending
+        self._order_size = 0
+
+    def append(self, values: list[Optional[float]]):
+        new = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        needed = self.size + len(new)
+        if needed > len(self.values):
+            self.values = np.resize(self.values, max(16, 2 * needed))
+        start = self.size
+        self.values[start:needed] = new
+        self.size = needed
+        if self._order is None:
+            return
+        # Appends in time order (the common case) extend the sort order in place
+        present = np.flatnonzero(~np.isnan(new))
+        last = self.values[self._order[self._order_size - 1]] if self._order_size else -np.inf
+        if len(present) and (np.any(np.diff(new[present]) < 0) or new[present[0]] < last):
+            self._order = None
+            return
+        if self._order_size + len(present) > len(self._order):
+            self._order = np.resize(self._order, max(16, 2 * (self._order_size + len(present))))
+        self._order[self._order_size:self._order_size + len(present)] = present + start
+        self._order_size += len(present)
+
+    def set(self, row: int, value: Optional[float]):
+        self.values[row] = np.nan if value is None else value
+        self._order = None
+
+    def _sorted(self) -> np.ndarray:
+        if self._order is None:
+            values = self.values[:self.size]
+            present = np.flatnonzero(~np.isnan(values))
+            self._order = present[np.argsort(values[present], kind="stable")]
+            self._order_size = len(self._order)
+        return self._order[:self._order_size]
+
+    def range(self, ops: dict) -> np.ndarray:
+        """Rows whose value satisfies every operator, ascending by row."""
+        order = self._sorted()
+        keys = self.values[order]
+        lo, hi = 0, len(order)
+        for op, bound in ops.items():
+            if op in ("$gt", "$gte", "$eq"):
+                lo = max(lo, int(np.searchsorted(keys, bound, side="right" if op == "$gt" else "left")))
+            if op in ("$lt", "$lte", "$eq"):
+                hi = min(hi, int(np.searchsorted(keys, bound, side="left" if op == "$lt" else "right")))
+        return np.sort(order[lo:hi]) if lo < hi else np.empty(0, dtype=np.int64)
+
+
+def _hash_values(condition) -> Optional[list]:
+    """Values an equality/$in condition accepts, or None if not hashable."""
+    if not isinstance(condition, dict):
+        return [condition]
+    if set(condition) == {"$eq"}:
+        return [condition["$eq"]]
+    if set(condition) == {"$in"}:
+        return list(condition["$in"])
+    return None
+
+
+class MetadataIndex:
+    """Hash and sorted indexes over a store's row metadata."""
+
+    def __init__(self, hash_keys: tuple = HASH_KEYS, range_keys: tuple = RANGE_KEYS):
+        self._hash: dict[str, dict[Any, _RowList]] = {key: {} for key in hash_keys}
+        self._range: dict[str, _SortedColumn] = {key: _SortedColumn() for key in range_keys}
+        self.size = 0
+
+    def add(self, metadatas: list[dict]):
+        """Index rows [size, size + len(metadatas))."""
+        start = self.size
+        for key, table in self._hash.items():
+            for i, meta in enumerate(metadatas):
+                value = meta.get(key)
+                if value is not None:
+                    rows = table.get(value)
+                    if rows is None:
+                        rows = table[value] = _RowList()
+                    rows.append(start + i)
+        for key, column in self._range.items():
+            column.append([to_epoch(meta.get(key)) for meta in metadatas])
+        self.size += len(metadatas)
+
+    def update(self, row: int, old: dict, new: dict):
+        """Re-index one row after a metadata change."""
+        for key, table in self._hash.items():
+            if old.get(key) == new.get(key):
+                continue
+            if old.get(key) is not None:
+                table[old[key]].remove(row)
+            if new.get(key) is not None:
+                table.setdefault(new[key], _RowList()).insert(row)
+        for key, column in self._range.items():
+            if old.get(key) != new.get(key):
+                column.set(row, to_epoch(new.get(key)))
+
+    def candidates(self, filter: dict, n: int) -> tuple[Optional[np.ndarray], dict]:
+        """
+        Rows (ascending, < n) satisfying the indexable predicates, plus the
+        residual filter still to check. None rows = nothing was indexable.
+        """
+        rows: Optional[np.ndarray] = None
+        residual = {}
+        for key, condition in filter.items():
+            matched = None
+            if key in self._hash:
+                values = _hash_values(condition)
+                if values is not None:
+                    parts = [self._hash[key][v].view() for v in values if v in self._hash[key]]
+                    matched = np.unique(np.concatenate(parts)) if len(parts) > 1 else (
+                        parts[0] if parts else np.empty(0, dtype=np.int64)
+                    )
+            elif key in self._range and isinstance(condition, dict) and set(condition) <= _RANGE_OPS:
+                matched = self._range[key].range(condition)
+            if matched is None:
+                residual[key] = condition
+                continue
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        if rows is not None:
+            rows = rows[:np.searchsorted(rows, n)]
+        return rows, residual
+
+    def filter_rows(self, filter: dict, metadata: list[dict], n: int) -> np.ndarray:
+        """All rows < n matching filter, ascending."""
+        rows, residual = self.candidates(filter, n)
+        if rows is None:
+            rows = np.arange(n, dtype=np.int64)
+        if residual and len(rows):
+            keep = np.fromiter(
+                (matches_filter(metadata[r], residual) for r in rows.tolist()), dtype=bool, count=len(rows)
+            )
+            rows = rows[keep]
+        return rows
@@ -0,0 +1,260 @@
+"""
+Process-wide metrics, exposed in Prometheus text format on /metrics.
+
+- counter() / histogram(): updated on the hot path. Label children are
+  cached, so an update is one bisect, a lock and a couple of adds.
+- callback(): read at scrape time from stats a subsystem already keeps
+  (queue depths, cache hits), so it costs nothing per request.
+- instrument(fn, ...): perf_counter timer around a sync or async callable,
+  feeding a duration histogram and counting exceptions.
+
+METRICS=0 makes instrument() return the callable unchanged.
+"""
+
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Callable, Optional, Union
+
+
+METRICS = os.getenv("METRICS", "1") == "1"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above the highest bound
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The child for one label combination (cache it on hot paths)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_label_str(self.labelnames, values)} {_number(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Callback(_Metric):
+    """Gauge or counter whose value(s) are read at scrape time."""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self) -> list[str]:
+        try:
+            value: Union[float, dict] = self.fn()
+        except Exception:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{_label_str(self.labelnames, values if isinstance(values, tuple) else (values,))} {_number(v)}"
+            for values, v in value.items()
+        ]
+
+
+def _get_or_register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} already registered differently")
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Counter:
+    return _get_or_register(Counter(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_register(Histogram(name, help, labelnames, buckets))
+
+
+def callback(name: str, help: str, fn: Callable, kind: str = "gauge", labelnames: tuple = ()) -> Callback:
+    """
+    Register a scrape-time metric. fn returns a number, or {label values: number}.
+    Re-registering a name replaces its function.
+    """
+    metric = _get_or_register(Callback(name, help, kind, fn, labelnames))
+    metric.fn = fn
+    return metric
+
+
+def instrument(fn: Callable, duration: Histogram, errors: Optional[Counter] = None, *labels) -> Callable:
+    """Wrap fn (sync or async) to time every call and count its exceptions."""
+    if not METRICS:
+        return fn
+    timings = duration.labels(*labels)
+    failures = errors.labels(*labels) if errors is not None else None
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def timed_async(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                if failures is not None:
+                    failures.inc()
+                raise
+            finally:
+                timings.observe(time.perf_counter() - start)
+        return timed_async
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            if failures is not None:
+                failures.inc()
+            raise
+        finally:
+            timings.observe(time.perf_counter() - start)
+    return timed
+
+
+def render() -> str:
+    """Every registered metric in Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# Shared instruments for external calls; subsystems label them with their call name
+EXTERNAL_CALL_SECONDS = histogram(
+    "gptmemory_external_call_duration_seconds", "Latency of embedding, vector store and LLM calls", ("call",)
+)
+EXTERNAL_CALL_ERRORS = counter(
+    "gptmemory_external_call_errors_total", "Failed embedding, vector store and LLM calls", ("call",)
+)
+
+
+def instrument_call(fn: Callable, call: str) -> Callable:
+    """instrument() with the shared external-call metrics."""
+    return instrument(fn, EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS, call)
+
+
+def timed_call(call: str) -> Callable:
+    """Decorator form of instrument_call."""
+    return lambda fn: instrument_call(fn, call)
@@ -0,0 +1,103 @@
+"""
+One-off move of pre-partitioning memories into per-session partitions.
+
+Before PARTITION_BY_SESSION, every memory lived in the shared `gpt_memory`
+collection; session lookups now only read the session's own partition.
+This copies each shared memory that carries a session_id into that
+session's partition (vectors and BM25 log included - nothing is
+re-embedded), then deletes it from the shared collection. Copies are
+written before anything is deleted and IDs already in a partition are
+skipped, so an interrupted run can simply be repeated. Memories without a
+session_id stay shared.
+
+Run with the API stopped:
+    python -m db.migrate_partitions [--backend numpy|chroma] [--persist-dir P] [--dry-run]
+"""
+
+import argparse
+import os
+import time
+from typing import Optional
+
+from db.lexical_index import BM25Index
+from db.partitions import partition_name
+from db.vector_store import COLLECTION_NAME, VECTOR_BACKEND, create_backend, default_persist_directory
+
+
+def migrate_to_partitions(
+    backend: str = VECTOR_BACKEND, persist_directory: Optional[str] = None, dry_run: bool = False
+) -> dict:
+    """Move session memories out of the shared collection. Returns counts."""
+    start = time.perf_counter()
+    persist_directory = persist_directory or default_persist_directory(backend)
+    lexical_dir = os.path.join(persist_directory, "lexical")
+    shared = create_backend(backend, COLLECTION_NAME, persist_directory, with_embeddings=False)
+    partitions: dict[str, tuple] = {}
+    moved_ids: list[str] = []
+    skipped = 0
+    try:
+        for ids, texts, metadatas, vectors in shared.iter_batches():
+            rows: dict[str, list[int]] = {}
+            for i, meta in enumerate(metadatas):
+                session_id = meta.get("session_id")
+                if isinstance(session_id, str) and session_id:
+                    rows.setdefault(session_id, []).append(i)
+            for session_id, positions in rows.items():
+                if session_id not in partitions:
+                    name = partition_name(COLLECTION_NAME, session_id)
+                    store = create_backend(backend, name, persist_directory, with_embeddings=False)
+                    existing = {rec["id"] for rec in store.list_records()}
+                    partitions[session_id] = (store, BM25Index(os.path.join(lexical_dir, name + ".jsonl")), existing)
+                store, index, existing = partitions[session_id]
+                fresh = [i for i in positions if ids[i] not in existing]
+                skipped += len(positions) - len(fresh)
+                moved_ids += [ids[i] for i in positions]
+                if dry_run or not fresh:
+                    continue
+                batch_ids = [ids[i] for i in fresh]
+                batch_texts = [texts[i] for i in fresh]
+                batch_metas = [metadatas[i] for i in fresh]
+                store.add_embeddings(batch_texts, vectors[fresh], batch_metas, batch_ids)
+                index.add(batch_ids, batch_texts, batch_metas)
+                existing.update(batch_ids)
+
+        # Only after every copy is written
+        if moved_ids and not dry_run:
+            shared.delete(moved_ids)
+            BM25Index(os.path.join(lexical_dir, COLLECTION_NAME + ".jsonl")).remove(moved_ids)
+        remaining = shared.count() if not dry_run else shared.count() - len(moved_ids)
+    finally:
+        for store, index, _ in partitions.values():
+            store.close()
+            index.close()
+        shared.close()
+
+    return {
+        "sessions": len(partitions),
+        "moved": len(moved_ids) - skipped,
+        "already_present": skipped,
+        "left_shared": remaining,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m db.migrate_partitions", description="Move shared-collection memories into session partitions"
+    )
+    parser.add_argument("--backend", default=VECTOR_BACKEND, choices=["numpy", "chroma"])
+    parser.add_argument("--persist-dir")
+    parser.add_argument("--dry-run", action="store_true", help="count what would move, change nothing")
+    args = parser.parse_args(argv)
+
+    stats = migrate_to_partitions(args.backend, args.persist_dir, args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(
+        f"{verb} {stats['moved']} memories into {stats['sessions']} session partitions "
+        f"({stats['already_present']} already there, {stats['left_shared']} without a session stay shared, "
+        f"{stats['seconds']:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
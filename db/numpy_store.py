@@ -0,0 +1,591 @@
+"""
+In-process NumPy vector engine backed by memory-mapped files.
+
+On-disk layout for a collection `name` inside the persist directory:
+- name.header.json   dim, committed row count, capacity, generation, dead sidecar bytes
+- name.vectors.f32   append-only float32 matrix (capacity x dim), L2-normalized
+- name.meta.jsonl    one JSON record per row: id, text, metadata
+- name.offsets.i64   byte offset of each row's record in name.meta.jsonl
+
+- name.ivf.npz        optional IVF centroids + list assignments (db/ivf_index.py)
+
+delete() rewrites the surviving rows into a new generation of data files
+(name.gN.vectors.f32, ...) and then swaps the header, so a crash mid-rewrite
+leaves the previous generation intact. Updates append the new record and
+repoint the row's offset; once superseded records outweigh the live ones
+(and SIDECAR_RECLAIM_BYTES) the rows are rewritten the same way.
+
+Reopening only maps the files - nothing is parsed until a row is returned.
+Search is exact cosine similarity (one matmul plus argpartition) unless an
+ANN index is enabled and the collection has at least `ann_min_rows` rows.
+Filtered searches first narrow rows with secondary metadata indexes
+(db/metadata_index.py, built on first filtered query) and only score those.
+"""
+
+import json
+import os
+import threading
+import uuid
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from db.ivf_index import DEFAULT_NPROBE, IVFIndex
+from db.metadata_index import MetadataIndex
+from db.vector_backends import VectorBackend
+
+
+INITIAL_CAPACITY = 1024
+DEFAULT_ANN_MIN_ROWS = 50_000
+SIDECAR_RECLAIM_BYTES = int(os.getenv("NUMPY_SIDECAR_RECLAIM_BYTES", str(16 * 1024 * 1024)))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot product == cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore(VectorBackend):
+    """Append-only exact vector index on a memory-mapped float32 matrix."""
+
+    def __init__(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        persist_directory: str,
+        ann: Optional[str] = None,
+        nprobe: int = DEFAULT_NPROBE,
+        ann_min_rows: int = DEFAULT_ANN_MIN_ROWS,
+    ):
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        os.makedirs(persist_directory, exist_ok=True)
+
+        base = os.path.join(persist_directory, collection_name)
+        self._base = base
+        self._header_path = base + ".header.json"
+        self.generation = 0
+        self._dead_bytes = 0  # superseded records still in the sidecar
+        self._set_paths(0)
+
+        self._lock = threading.RLock()
+        self.dim: Optional[int] = None
+        self._count = 0
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._offsets: Optional[np.memmap] = None
+        self._meta_file = None
+        self._id_to_row: Optional[dict[str, int]] = None
+        self._metadata: Optional[list[dict]] = None
+        self._meta_index: Optional[MetadataIndex] = None
+
+        if os.path.exists(self._header_path):
+            with open(self._header_path) as f:
+                header = json.load(f)
+            self.dim = header["dim"]
+            self._count = header["count"]
+            self._capacity = header["capacity"]
+            self.generation = header.get("generation", 0)
+            self._dead_bytes = header.get("dead_bytes", 0)
+            self._set_paths(self.generation)
+            self._map_files()
+
+        self.ann_min_rows = ann_min_rows
+        self._ann: Optional[IVFIndex] = None
+        if ann == "ivf":
+            self._ann = IVFIndex(nprobe=nprobe, path=base + ".ivf.npz")
+            if self._ann.indexed_rows > self._count:
+                # Index is ahead of the committed rows (crash mid-write): rebuild
+                self._ann.reset()
+            self._sync_ann()
+        elif ann:
+            raise ValueError(f"Unknown ANN index: {ann}")
+
+    # ---- file management ----
+
+    def _data_paths(self, generation: int) -> tuple[str, str, str]:
+        prefix = self._base if generation == 0 else f"{self._base}.g{generation}"
+        return prefix + ".vectors.f32", prefix + ".meta.jsonl", prefix + ".offsets.i64"
+
+    def _set_paths(self, generation: int):
+        self._vectors_path, self._meta_path, self._offsets_path = self._data_paths(generation)
+
+    def _map_files(self):
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim)
+        )
+        self._offsets = np.memmap(
+            self._offsets_path, dtype=np.int64, mode="r+", shape=(self._capacity,)
+        )
+
+    def _ensure_open(self):
+        """Remap after close() so a closed store transparently reopens."""
+        if self._vectors is None and self._capacity:
+            self._map_files()
+
+    def _write_header(self):
+        tmp = self._header_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "dim": self.dim, "count": self._count, "capacity": self._capacity,
+                "generation": self.generation, "dead_bytes": self._dead_bytes,
+            }, f)
+        os.replace(tmp, self._header_path)
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, self._capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._offsets.flush()
+        # Grow the files in place; existing rows are untouched
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        with open(self._offsets_path, "ab") as f:
+            f.truncate(new_capacity * 8)
+        self._capacity = new_capacity
+        self._map_files()
+
+    def _sync_ann(self):
+        """File new rows in the ANN index and retrain in the background when due."""
+        if self._ann is None:
+            return
+        self._ann.add(self.matrix())
+        self._ann.maybe_retrain(self.matrix, self.ann_min_rows)
+
+    def _meta_writer(self):
+        if self._meta_file is None:
+            self._meta_file = open(self._meta_path, "ab")
+        return self._meta_file
+
+    # ---- writes ----
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        """Append precomputed vectors. Returns their IDs."""
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1))
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != index dim {self.dim}")
+
+            self._ensure_open()
+            start = self._count
+            end = start + len(texts)
+            self._ensure_capacity(end)
+
+            meta_file = self._meta_writer()
+            offset = meta_file.seek(0, os.SEEK_END)
+            for i, (doc_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+                line = json.dumps({"id": doc_id, "text": text, "metadata": meta}).encode("utf-8") + b"\n"
+                self._offsets[start + i] = offset
+                meta_file.write(line)
+                offset += len(line)
+            meta_file.flush()
+
+            self._vectors[start:end] = vectors
+            self._vectors.flush()
+            self._offsets.flush()
+
+            # Commit point: rows become visible once the header says so
+            self._count = end
+            self._write_header()
+
+            if self._id_to_row is not None:
+                for i, doc_id in enumerate(ids):
+                    self._id_to_row[doc_id] = start + i
+            if self._metadata is not None:
+                self._metadata.extend(metadatas)
+            if self._meta_index is not None:
+                self._meta_index.add(metadatas)
+
+        self._sync_ann()
+        return ids
+
+    def add_documents(self, documents: list[Document], ids: Optional[list[str]] = None) -> list[str]:
+        """Embed and append documents. Explicit IDs that already exist are skipped (idempotent)."""
+        if ids is None and any(d.id for d in documents):
+            ids = [d.id or str(uuid.uuid4()) for d in documents]
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+            keep = list(range(len(documents)))
+        else:
+            keep, seen = [], set()
+            for i, doc_id in enumerate(ids):
+                if doc_id not in seen and self.row_of(doc_id) is None:
+                    keep.append(i)
+                seen.add(doc_id)
+        if keep:
+            texts = [documents[i].page_content for i in keep]
+            vectors = self.embeddings.embed_documents(texts)
+            self.add_embeddings(
+                texts, vectors, [dict(documents[i].metadata) for i in keep], [ids[i] for i in keep]
+            )
+        return ids
+
+    def update_metadata(self, ids: list[str], patches: list[dict]) -> int:
+        """
+        Merge patches into stored metadata. Returns how many docs were found.
+        The new record is appended to the sidecar and the row's offset repointed.
+        """
+        return self._rewrite(ids, patches)
+
+    def update_documents(self, ids: list[str], texts: list[str], patches: list[dict]) -> int:
+        """
+        Replace stored texts and merge metadata patches. Returns how many docs were found.
+        Vectors are overwritten in place; an ANN index keeps the row in its old list.
+        """
+        if not ids:
+            return 0
+        vectors = normalize_rows(
+            np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32).reshape(len(texts), -1)
+        )
+        return self._rewrite(ids, patches, texts, vectors)
+
+    def _rewrite(
+        self,
+        ids: list[str],
+        patches: list[dict],
+        texts: Optional[list[str]] = None,
+        vectors: Optional[np.ndarray] = None,
+    ) -> int:
+        updated, reclaim = 0, False
+        with self._lock:
+            if vectors is not None and self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != index dim {self.dim}")
+            self._ensure_open()
+            meta_file = self._meta_writer()
+            offset = meta_file.seek(0, os.SEEK_END)
+            for i, (doc_id, patch) in enumerate(zip(ids, patches)):
+                row = self.row_of(doc_id)
+                if row is None or row >= self._count:
+                    continue
+                rec = self.get_records([row])[0]
+                self._dead_bytes += len(json.dumps(rec).encode("utf-8")) + 1  # the line it was read from
+                old = rec["metadata"]
+                rec["metadata"] = {**old, **patch}
+                if texts is not None:
+                    rec["text"] = texts[i]
+                    self._vectors[row] = vectors[i]
+                line = json.dumps(rec).encode("utf-8") + b"\n"
+                meta_file.write(line)
+                meta_file.flush()
+                self._offsets[row] = offset
+                offset += len(line)
+                if self._metadata is not None:
+                    self._metadata[row] = rec["metadata"]
+                if self._meta_index is not None:
+                    self._meta_index.update(row, old, rec["metadata"])
+                updated += 1
+            if vectors is not None:
+                self._vectors.flush()
+            self._offsets.flush()
+            if updated:
+                self._write_header()
+                reclaim = self._dead_bytes > max(SIDECAR_RECLAIM_BYTES, offset - self._dead_bytes)
+        if updated and reclaim:
+            self._reclaim()
+        return updated
+
+    def _reclaim(self):
+        """Drop superseded sidecar records by rewriting every row into the next generation."""
+        if self._ann is not None:
+            self._ann.wait()  # as in delete()
+        with self._lock:
+            self._ensure_open()
+            if self._count:
+                # Same rows, same order: row numbers, metadata and ANN indexes stay valid
+                self._write_generation(np.arange(self._count, dtype=np.int64))
+
+    def delete(self, ids: list[str]) -> int:
+        """
+        Remove documents by ID. Returns how many were found.
+        Surviving rows are rewritten (in order) into the next file generation;
+        row numbers change, so the ANN index is rebuilt.
+        """
+        if self._ann is not None:
+            self._ann.wait()  # a running retrain reads the matrix under our lock
+        with self._lock:
+            self._ensure_open()
+            drop = {row for row in (self.row_of(doc_id) for doc_id in ids) if row is not None and row < self._count}
+            if not drop:
+                return 0
+            keep = np.array([r for r in range(self._count) if r not in drop], dtype=np.int64)
+            records = self._write_generation(keep)
+            self._id_to_row = {rec["id"]: row for row, rec in enumerate(records)}
+            if self._metadata is not None:
+                self._metadata = [rec["metadata"] for rec in records]
+            self._meta_index = None
+            if self._ann is not None:
+                self._ann.reset()
+
+        self._sync_ann()
+        return len(drop)
+
+    def _write_generation(self, keep: np.ndarray) -> list[dict]:
+        """Copy the kept rows (in order) into the next generation and switch to it. Returns their records."""
+        records = self.get_records(keep.tolist())
+        vectors = np.asarray(self._vectors[keep]) if len(keep) else np.empty((0, self.dim), np.float32)
+
+        generation = self.generation + 1
+        vectors_path, meta_path, offsets_path = self._data_paths(generation)
+        capacity = INITIAL_CAPACITY
+        while capacity < len(keep):
+            capacity *= 2
+        offsets = np.zeros(capacity, dtype=np.int64)
+        with open(meta_path, "wb") as f:
+            for i, rec in enumerate(records):
+                offsets[i] = f.tell()
+                f.write(json.dumps(rec).encode("utf-8") + b"\n")
+        with open(offsets_path, "wb") as f:
+            f.write(offsets.tobytes())
+        with open(vectors_path, "wb") as f:
+            f.write(vectors.astype(np.float32).tobytes())
+            f.truncate(capacity * self.dim * 4)
+
+        old_paths = (self._vectors_path, self._meta_path, self._offsets_path)
+        if self._meta_file is not None:
+            self._meta_file.close()
+            self._meta_file = None
+        self._vectors = None
+        self._offsets = None
+
+        # Commit point: the header names the new generation
+        self.generation = generation
+        self._count = len(keep)
+        self._capacity = capacity
+        self._dead_bytes = 0
+        self._set_paths(generation)
+        self._write_header()
+        self._map_files()
+        for path in old_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return records
+
+    def iter_batches(self, batch_size: int = 50_000):
+        """Stream (ids, texts, metadatas, vectors) in row order; vectors are mmap views."""
+        mat = self.matrix()
+        for start in range(0, len(mat), batch_size):
+            end = min(len(mat), start + batch_size)
+            records = self.get_records(range(start, end))
+            yield (
+                [rec["id"] for rec in records], [rec["text"] for rec in records],
+                [rec["metadata"] for rec in records], mat[start:end],
+            )
+
+    def list_records(self) -> list[dict]:
+        """Every stored record as {"id", "text", "metadata"}."""
+        with self._lock:
+            return self.get_records(range(self._count)) if self._count else []
+
+    def records_by_id(self, ids: list[str]) -> list[dict]:
+        with self._lock:
+            rows = [row for row in (self.row_of(doc_id) for doc_id in ids) if row is not None and row < self._count]
+            return self.get_records(rows)
+
+    # ---- reads ----
+
+    def matrix(self) -> np.ndarray:
+        """Committed rows as a read-only view (no copy)."""
+        with self._lock:
+            self._ensure_open()
+            if self._vectors is None:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            return self._vectors[:self._count]
+
+    def get_records(self, rows) -> list[dict]:
+        """Read sidecar records for the given row numbers."""
+        with self._lock:
+            self._ensure_open()
+            offsets = [int(self._offsets[r]) for r in rows]
+            meta_path = self._meta_path
+        records = []
+        with open(meta_path, "rb") as f:
+            for off in offsets:
+                f.seek(off)
+                records.append(json.loads(f.readline()))
+        return records
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Row number for a document ID (index built on first use)."""
+        with self._lock:
+            if self._id_to_row is None:
+                self._id_to_row = {}
+                if self._count:
+                    for row, rec in enumerate(self.get_records(range(self._count))):
+                        self._id_to_row[rec["id"]] = row
+            return self._id_to_row.get(doc_id)
+
+    def _load_metadata(self) -> list[dict]:
+        """All row metadata, read from the sidecar on first use."""
+        with self._lock:
+            if self._metadata is None:
+                records = self.get_records(range(self._count)) if self._count else []
+                self._metadata = [rec["metadata"] for rec in records]
+            return self._metadata
+
+    def filter_rows(self, filter: Optional[dict], n: int) -> Optional[np.ndarray]:
+        """Rows (< n, ascending) matching filter via the metadata indexes. None = no filter."""
+        if not filter:
+            return None
+        metadata = self._load_metadata()
+        with self._lock:
+            if self._meta_index is None:
+                self._meta_index = MetadataIndex()
+                self._meta_index.add(metadata)
+            return self._meta_index.filter_rows(filter, metadata, n)
+
+    def _to_documents(self, rows, scores) -> list[tuple[Document, float]]:
+        records = self.get_records(rows)
+        return [
+            (Document(id=rec["id"], page_content=rec["text"], metadata=rec["metadata"]), float(score))
+            for rec, score in zip(records, scores)
+        ]
+
+    @staticmethod
+    def _score(mat: np.ndarray, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """(q x candidates) scores; column j is row rows[j] (every row if rows is None)."""
+        if rows is None:
+            return queries @ mat.T
+        if len(rows) * 4 < len(mat):
+            # Selective filter: gather just the candidate vectors
+            return queries @ mat[rows].T
+        return (queries @ mat.T)[:, rows]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: list[float], k: int = 4, filter: Optional[dict] = None
+    ) -> list[tuple[Document, float]]:
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        # Row numbers are only valid for one generation: hold the lock from
+        # scoring until their records are read so delete() can't swap it
+        with self._lock:
+            mat = self.matrix()
+            if len(mat) == 0:
+                return []
+            if self._use_ann(filter, len(mat)):
+                rows, scores = self._ann.search(mat, query, k)
+                return self._to_documents(rows.tolist(), scores)
+            rows = self.filter_rows(filter, len(mat))
+            if rows is not None and len(rows) == 0:
+                return []
+            scores = self._score(mat, query[None, :], rows)[0]
+            idx = top_k(scores, k)
+            if rows is not None:
+                return self._to_documents(rows[idx].tolist(), scores[idx])
+            return self._to_documents(idx.tolist(), scores[idx])
+
+    def _use_ann(self, filter: Optional[dict], n_rows: int) -> bool:
+        # Filtered searches stay exact: the filter may exclude whole lists
+        return (
+            self._ann is not None and self._ann.ready
+            and not filter and n_rows >= self.ann_min_rows
+        )
+
+    def similarity_search_batch_by_vectors(
+        self, embeddings: list[list[float]], k: int = 4, filter: Optional[dict] = None
+    ) -> list[list[tuple[Document, float]]]:
+        if len(embeddings) == 0:
+            return []
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        with self._lock:  # one generation from scoring to records, as above
+            mat = self.matrix()
+            if len(mat) == 0:
+                return [[] for _ in embeddings]
+            if self._use_ann(filter, len(mat)):
+                return [self.similarity_search_by_vector_with_score(e, k=k) for e in embeddings]
+            # One (q x candidates) score matrix for the whole batch
+            rows = self.filter_rows(filter, len(mat))
+            scores = self._score(mat, queries, rows)
+            k = min(k, scores.shape[1])
+            if k <= 0:
+                return [[] for _ in embeddings]
+            if k < scores.shape[1]:
+                part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+            part_scores = np.take_along_axis(scores, part, axis=1)
+            order = np.argsort(-part_scores, axis=1, kind="stable")
+            idx = np.take_along_axis(part, order, axis=1)
+            if rows is not None:
+                idx = rows[idx]
+            top_scores = np.take_along_axis(part_scores, order, axis=1)
+
+            # Read each distinct row's record once, but hand every query its own Documents
+            unique_rows = sorted(set(idx.ravel().tolist()))
+            records = dict(zip(unique_rows, self.get_records(unique_rows)))
+            return [
+                [
+                    (
+                        Document(
+                            id=records[row]["id"], page_content=records[row]["text"],
+                            metadata=dict(records[row]["metadata"]),
+                        ),
+                        float(score),
+                    )
+                    for row, score in zip(rows, row_scores)
+                ]
+                for rows, row_scores in zip(idx.tolist(), top_scores.tolist())
+            ]
+
+    def get_vectors(self, ids: list[str]) -> Optional[np.ndarray]:
+        with self._lock:
+            mat = self.matrix()
+            if self.dim is None:
+                return None
+            out = np.zeros((len(ids), self.dim), dtype=np.float32)
+            for i, doc_id in enumerate(ids):
+                row = self.row_of(doc_id)
+                if row is not None and row < len(mat):
+                    out[i] = mat[row]
+            return out
+
+    def count(self) -> int:
+        return self._count
+
+    def close(self):
+        """Release file handles. The store remaps itself on next use."""
+        if self._ann is not None:
+            self._ann.wait()
+            self._ann.save()
+        with self._lock:
+            if self._meta_file is not None:
+                self._meta_file.close()
+                self._meta_file = None
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._offsets.flush()
+            self._vectors = None
+            self._offsets = None
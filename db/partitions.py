@@ -0,0 +1,85 @@
+"""
+Per-session partitions of the memory index.
+Each session (user_id) gets its own collection, opened lazily, so a query
+only ranks against that user's memories.
+
+Open partitions are kept in an LRU; the least recently used one is closed
+once more than `max_open` are open, which bounds file handles. Anything with
+a close() method can be partitioned (vector backends, lexical indexes); a
+closed partition must reopen itself on next use.
+
+There is only ever one live instance per partition: a caller may still hold
+an evicted one, so it is kept (weakly) and handed out again by the next
+get() instead of opening a second instance on the same files.
+"""
+
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+def partition_name(collection_name: str, session_id: str) -> str:
+    """Stable, filesystem/collection-safe name for a session's partition."""
+    digest = hashlib.blake2b(session_id.encode("utf-8"), digest_size=12).hexdigest()
+    return f"{collection_name}_s_{digest}"
+
+
+class PartitionManager:
+    """LRU of open per-session backends."""
+
+    def __init__(self, collection_name: str, factory: Callable[[str], Any], max_open: int = 64):
+        self.collection_name = collection_name
+        self.factory = factory
+        self.max_open = max_open
+        self._open: OrderedDict[str, Any] = OrderedDict()
+        self._closed: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.reopens = 0
+        self.evictions = 0
+
+    def get(self, session_id: str):
+        """Return the partition for a session, opening it if needed."""
+        with self._lock:
+            backend = self._open.get(session_id)
+            if backend is not None:
+                self._open.move_to_end(session_id)
+                return backend
+
+            backend = self._closed.pop(session_id, None)
+            if backend is not None:
+                self.reopens += 1  # evicted but still referenced somewhere
+            else:
+                backend = self.factory(partition_name(self.collection_name, session_id))
+                self.opens += 1
+            self._open[session_id] = backend
+
+            while len(self._open) > self.max_open:
+                evicted_id, evicted = self._open.popitem(last=False)
+                evicted.close()
+                self._closed[evicted_id] = evicted
+                self.evictions += 1
+
+            return backend
+
+    def open_sessions(self) -> list[str]:
+        with self._lock:
+            return list(self._open)
+
+    def stats(self) -> dict:
+        return {
+            "open_partitions": len(self._open),
+            "max_open": self.max_open,
+            "opens": self.opens,
+            "reopens": self.reopens,
+            "evictions": self.evictions,
+        }
+
+    def close_all(self):
+        with self._lock:
+            for session_id, backend in self._open.items():
+                backend.close()
+                self._closed[session_id] = backend
+            self._open.clear()
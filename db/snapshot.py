@@ -0,0 +1,311 @@
+"""
+Binary snapshots of the memory store, for backup/restore and fast cold start.
+
+A snapshot is a directory:
+- manifest.json                 format, collections, per-file sizes + xxh3-128
+                                checksums, and a checksum of the manifest itself
+- <collection>.vectors.f32      raw little-endian float32 block (count x dim),
+                                memory-mappable; .f32.zst if compress_vectors
+- <collection>.records.zst      zstd stream of length-prefixed ormsgpack frames,
+                                each a list of [id, text, metadata]
+
+Every collection of the backend's persist directory is included (the shared
+collection and each session partition). Restore memory-maps the vector
+block and bulk-loads it with add_embeddings - nothing is re-embedded - then
+rebuilds the BM25 logs. Search indexes (IVF, metadata) rebuild lazily.
+
+CLI:
+    python -m db.snapshot create <dir> [--backend numpy|chroma] [--persist-dir P] [--compress-vectors]
+    python -m db.snapshot restore <dir> [--backend numpy|chroma] [--persist-dir P] [--no-verify]
+    python -m db.snapshot verify <dir>
+"""
+
+import argparse
+import json
+import os
+import shutil
+import struct
+import time
+from datetime import datetime
+from typing import Iterator, Optional
+
+import numpy as np
+import ormsgpack
+import xxhash
+import zstandard
+
+from db.lexical_index import BM25Index
+from db.vector_store import VECTOR_BACKEND, create_backend, default_persist_directory
+
+
+FORMAT = "gptmemory-snapshot"
+VERSION = 1
+BATCH_ROWS = 50_000
+ZSTD_LEVEL = 3
+_FRAME = struct.Struct("<I")
+
+
+class SnapshotError(Exception):
+    """Missing, corrupt or incompatible snapshot."""
+
+
+class _HashingWriter:
+    """File wrapper that tracks size and xxh3-128 of everything written."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.hash = xxhash.xxh3_128()
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        self.file.write(data)
+        self.hash.update(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self) -> dict:
+        self.file.close()
+        return {"bytes": self.bytes, "xxh3": self.hash.hexdigest()}
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 24) -> str:
+    digest = xxhash.xxh3_128()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_checksum(manifest: dict) -> str:
+    body = {key: value for key, value in manifest.items() if key != "checksum"}
+    return xxhash.xxh3_128_hexdigest(json.dumps(body, sort_keys=True).encode("utf-8"))
+
+
+def list_collections(backend: str, persist_directory: str) -> list[str]:
+    """Names of every collection stored in a persist directory."""
+    if backend == "numpy":
+        suffix = ".header.json"
+        return sorted(name[:-len(suffix)] for name in os.listdir(persist_directory) if name.endswith(suffix))
+    if backend == "chroma":
+        import chromadb
+        client = chromadb.PersistentClient(path=persist_directory)
+        return sorted(c if isinstance(c, str) else c.name for c in client.list_collections())
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
+
+# ---- create ----
+
+def _write_collection(store, name: str, out_dir: str, compress_vectors: bool) -> Optional[dict]:
+    vectors_file = name + (".vectors.f32.zst" if compress_vectors else ".vectors.f32")
+    records_file = name + ".records.zst"
+    vectors_out = _HashingWriter(os.path.join(out_dir, vectors_file))
+    records_out = _HashingWriter(os.path.join(out_dir, records_file))
+    vector_sink = vectors_out
+    if compress_vectors:
+        vector_sink = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(vectors_out, closefd=False)
+    record_sink = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(records_out, closefd=False)
+
+    count, dim = 0, None
+    for ids, texts, metadatas, vectors in store.iter_batches(BATCH_ROWS):
+        if vectors is None or len(ids) == 0:
+            continue
+        block = np.ascontiguousarray(vectors, dtype="<f4")
+        dim = block.shape[1]
+        vector_sink.write(block.tobytes())
+        frame = ormsgpack.packb([[i, t, m] for i, t, m in zip(ids, texts, metadatas)])
+        record_sink.write(_FRAME.pack(len(frame)))
+        record_sink.write(frame)
+        count += len(ids)
+
+    if compress_vectors:
+        vector_sink.flush(zstandard.FLUSH_FRAME)
+    record_sink.flush(zstandard.FLUSH_FRAME)
+    vectors_meta = vectors_out.close()
+    records_meta = records_out.close()
+    if count == 0:
+        os.remove(os.path.join(out_dir, vectors_file))
+        os.remove(os.path.join(out_dir, records_file))
+        return None
+    return {
+        "name": name,
+        "count": count,
+        "dim": dim,
+        "vectors": {"file": vectors_file, "compression": "zstd" if compress_vectors else "none", **vectors_meta},
+        "records": {"file": records_file, "compression": "zstd", **records_meta},
+    }
+
+
+def create_snapshot(
+    out_dir: str,
+    backend: str = VECTOR_BACKEND,
+    persist_directory: Optional[str] = None,
+    compress_vectors: bool = False,
+) -> dict:
+    """Write a snapshot of every collection. Returns the manifest."""
+    persist_directory = persist_directory or default_persist_directory(backend)
+    if os.path.exists(out_dir):
+        raise SnapshotError(f"{out_dir} already exists")
+    tmp_dir = out_dir.rstrip("/") + ".partial"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    collections = []
+    for name in list_collections(backend, persist_directory):
+        store = create_backend(backend, name, persist_directory, with_embeddings=False)
+        try:
+            entry = _write_collection(store, name, tmp_dir, compress_vectors)
+        finally:
+            store.close()
+        if entry is not None:
+            collections.append(entry)
+
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "created": datetime.now().isoformat(),
+        "source_backend": backend,
+        "collections": collections,
+    }
+    manifest["checksum"] = _manifest_checksum(manifest)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    # Commit point: the snapshot only appears once complete
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+# ---- read ----
+
+def read_manifest(snapshot_dir: str) -> dict:
+    path = os.path.join(snapshot_dir, "manifest.json")
+    if not os.path.exists(path):
+        raise SnapshotError(f"No manifest in {snapshot_dir}")
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("version") != VERSION:
+        raise SnapshotError(f"Unsupported snapshot format in {snapshot_dir}")
+    if manifest.get("checksum") != _manifest_checksum(manifest):
+        raise SnapshotError("Manifest checksum mismatch")
+    return manifest
+
+
+def verify_snapshot(snapshot_dir: str) -> dict:
+    """Check the manifest and every file's size and checksum. Returns the manifest."""
+    manifest = read_manifest(snapshot_dir)
+    for entry in manifest["collections"]:
+        for part in ("vectors", "records"):
+            meta = entry[part]
+            path = os.path.join(snapshot_dir, meta["file"])
+            if not os.path.exists(path) or os.path.getsize(path) != meta["bytes"]:
+                raise SnapshotError(f"{meta['file']}: missing or truncated")
+            if file_checksum(path) != meta["xxh3"]:
+                raise SnapshotError(f"{meta['file']}: checksum mismatch")
+    return manifest
+
+
+def open_vectors(snapshot_dir: str, entry: dict) -> np.ndarray:
+    """A collection's vectors: a read-only memmap, or decompressed if stored as zstd."""
+    meta = entry["vectors"]
+    path = os.path.join(snapshot_dir, meta["file"])
+    shape = (entry["count"], entry["dim"])
+    if meta["compression"] == "none":
+        return np.memmap(path, dtype="<f4", mode="r", shape=shape)
+    with open(path, "rb") as f:
+        raw = zstandard.ZstdDecompressor().stream_reader(f).read()
+    return np.frombuffer(raw, dtype="<f4").reshape(shape)
+
+
+def iter_records(snapshot_dir: str, entry: dict) -> Iterator[list]:
+    """Yield batches of [id, text, metadata] records in row order."""
+    path = os.path.join(snapshot_dir, entry["records"]["file"])
+    with open(path, "rb") as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f)
+        while header := reader.read(_FRAME.size):
+            (size,) = _FRAME.unpack(header)
+            yield ormsgpack.unpackb(reader.read(size))
+
+
+# ---- restore ----
+
+def restore_snapshot(
+    snapshot_dir: str,
+    backend: str = VECTOR_BACKEND,
+    persist_directory: Optional[str] = None,
+    verify: bool = True,
+    lexical: bool = True,
+) -> dict:
+    """
+    Load a snapshot into empty collections of the target backend.
+    Returns {"collections", "rows", "seconds"}.
+    """
+    start = time.perf_counter()
+    manifest = verify_snapshot(snapshot_dir) if verify else read_manifest(snapshot_dir)
+    persist_directory = persist_directory or default_persist_directory(backend)
+    os.makedirs(persist_directory, exist_ok=True)
+
+    rows = 0
+    for entry in manifest["collections"]:
+        store = create_backend(backend, entry["name"], persist_directory, with_embeddings=False)
+        try:
+            if store.count():
+                raise SnapshotError(f"Target collection {entry['name']} is not empty")
+            vectors = open_vectors(snapshot_dir, entry)
+            index = BM25Index(os.path.join(persist_directory, "lexical", entry["name"] + ".jsonl")) if lexical else None
+            offset = 0
+            for batch in iter_records(snapshot_dir, entry):
+                ids = [rec[0] for rec in batch]
+                texts = [rec[1] for rec in batch]
+                metadatas = [rec[2] for rec in batch]
+                store.add_embeddings(texts, vectors[offset:offset + len(batch)], metadatas, ids)
+                if index is not None:
+                    index.add(ids, texts, metadatas)
+                offset += len(batch)
+            if index is not None:
+                index.close()
+            rows += offset
+        finally:
+            store.close()
+
+    return {"collections": len(manifest["collections"]), "rows": rows, "seconds": time.perf_counter() - start}
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m db.snapshot", description="Snapshot/restore the memory store")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="write a snapshot directory")
+    create.add_argument("snapshot_dir")
+    create.add_argument("--backend", default=VECTOR_BACKEND, choices=["numpy", "chroma"])
+    create.add_argument("--persist-dir")
+    create.add_argument("--compress-vectors", action="store_true", help="zstd the vector block (no mmap on restore)")
+
+    restore = commands.add_parser("restore", help="load a snapshot into empty collections")
+    restore.add_argument("snapshot_dir")
+    restore.add_argument("--backend", default=VECTOR_BACKEND, choices=["numpy", "chroma"])
+    restore.add_argument("--persist-dir")
+    restore.add_argument("--no-verify", action="store_true", help="skip file checksums")
+
+    verify = commands.add_parser("verify", help="check manifest and file checksums")
+    verify.add_argument("snapshot_dir")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "create":
+            manifest = create_snapshot(args.snapshot_dir, args.backend, args.persist_dir, args.compress_vectors)
+            rows = sum(entry["count"] for entry in manifest["collections"])
+            print(f"Snapshot written: {len(manifest['collections'])} collections, {rows} memories")
+        elif args.command == "restore":
+            stats = restore_snapshot(args.snapshot_dir, args.backend, args.persist_dir, verify=not args.no_verify)
+            print(f"Restored {stats['rows']} memories in {stats['collections']} collections ({stats['seconds']:.1f}s)")
+        else:
+            manifest = verify_snapshot(args.snapshot_dir)
+            print(f"OK: {len(manifest['collections'])} collections")
+    except SnapshotError as e:
+        parser.exit(1, f"Snapshot error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
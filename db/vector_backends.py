@@ -0,0 +1,334 @@
+"""
+Pluggable vector store backends.
+db/vector_store.py talks to this interface only, so engines can be swapped.
+
+Filters are flat metadata dicts. A plain value means equality; a dict of
+operators ($eq, $ne, $gt, $gte, $lt, $lte, $in, $nin) expresses comparisons,
+e.g. {"session_id": "abc", "ts": {"$gte": 1700000000.0}}.
+"""
+
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+_OPERATORS = {
+    "$eq": lambda value, arg: value == arg,
+    "$ne": lambda value, arg: value != arg,
+    "$gt": lambda value, arg: value > arg,
+    "$gte": lambda value, arg: value >= arg,
+    "$lt": lambda value, arg: value < arg,
+    "$lte": lambda value, arg: value <= arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+}
+
+
+def _matches(value, condition) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    if value is None:
+        return False
+    try:
+        return all(_OPERATORS[op](value, arg) for op, arg in condition.items())
+    except TypeError:  # e.g. comparing a str to a number
+        return False
+
+
+def matches_filter(metadata: dict, filter: Optional[dict]) -> bool:
+    """True if every filter condition holds for the metadata."""
+    if not filter:
+        return True
+    return all(_matches(metadata.get(key), condition) for key, condition in filter.items())
+
+
+def time_range_filter(start: Optional[float] = None, end: Optional[float] = None, key: str = "ts") -> dict:
+    """Filter for memories with start <= ts < end (epoch seconds; either bound optional)."""
+    condition = {}
+    if start is not None:
+        condition["$gte"] = start
+    if end is not None:
+        condition["$lt"] = end
+    return {key: condition} if condition else {}
+
+
+class VectorBackend(ABC):
+    """Minimal surface the memory layer needs from a vector engine."""
+
+    embeddings: Embeddings
+
+    @abstractmethod
+    def add_documents(self, documents: list[Document], ids: Optional[list[str]] = None) -> list[str]:
+        """Embed and store documents. Returns their IDs."""
+
+    @abstractmethod
+    def similarity_search_by_vector_with_score(
+        self, embedding: list[float], k: int = 4, filter: Optional[dict] = None
+    ) -> list[tuple[Document, float]]:
+        """Top-k documents for a query vector, highest cosine similarity first (the score every layer uses)."""
+
+    def similarity_search_batch_by_vectors(
+        self, embeddings: list[list[float]], k: int = 4, filter: Optional[dict] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """Top-k per query vector. Engines override this with a real batch path."""
+        return [self.similarity_search_by_vector_with_score(e, k=k, filter=filter) for e in embeddings]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, filter: Optional[dict] = None) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def get_vectors(self, ids: list[str]) -> Optional[np.ndarray]:
+        """Stored vectors for ids, row per id (zeros if unknown). None if unsupported."""
+        return None
+
+    def update_metadata(self, ids: list[str], patches: list[dict]) -> int:
+        """Merge patches into stored documents' metadata. Returns how many were found."""
+        raise NotImplementedError
+
+    def update_documents(self, ids: list[str], texts: list[str], patches: list[dict]) -> int:
+        """Replace stored documents' text (re-embedded) and merge metadata patches. Returns how many were found."""
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]) -> int:
+        """Remove documents by ID. Returns how many were found."""
+        raise NotImplementedError
+
+    def list_records(self) -> list[dict]:
+        """Every stored document as {"id", "text", "metadata"}."""
+        raise NotImplementedError
+
+    def records_by_id(self, ids: list[str]) -> list[dict]:
+        """Stored documents for ids as {"id", "text", "metadata"}; unknown IDs are skipped."""
+        raise NotImplementedError
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings,
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        """Store documents with precomputed vectors (bulk load, no embedding calls)."""
+        raise NotImplementedError
+
+    def iter_batches(self, batch_size: int = 50_000) -> Iterator[tuple[list[str], list[str], list[dict], np.ndarray]]:
+        """Stream (ids, texts, metadatas, vectors) for every stored document."""
+        records = self.list_records()
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            ids = [rec["id"] for rec in batch]
+            yield ids, [rec["text"] for rec in batch], [rec["metadata"] for rec in batch], self.get_vectors(ids)
+
+    def count(self) -> int:
+        """Number of stored documents."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release file handles. Default: nothing to do."""
+
+
+CHROMA_MAX_BATCH = 5_000
+CHROMA_SEGMENT_CACHE_BYTES = int(os.getenv("CHROMA_SEGMENT_CACHE_BYTES", str(1024 * 1024 * 1024)))
+
+
+def _chroma_cosine(space: str):
+    """Distance -> cosine similarity for a Chroma space, exact for unit-length embeddings (both embedders are)."""
+    if space == "l2":
+        return lambda distance: 1.0 - distance / 2.0  # Chroma's l2 is squared: |a - b|^2 = 2 - 2cos
+    return lambda distance: 1.0 - distance  # "cosine" is 1 - cos, "ip" 1 - a.b
+
+
+def _chroma_where(filter: Optional[dict]) -> Optional[dict]:
+    """Chroma needs an explicit $and for more than one condition (one operator each)."""
+    if not filter:
+        return None
+    clauses = []
+    for key, condition in filter.items():
+        if isinstance(condition, dict):
+            clauses += [{key: {op: arg}} for op, arg in condition.items()]
+        else:
+            clauses.append({key: condition})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class ChromaBackend(VectorBackend):
+    """
+    Adapter over langchain_chroma.Chroma (the original engine).
+    All collections of a persist directory share one chromadb client; close()
+    drops this collection's handle, and its HNSW segment is then unloaded by
+    chromadb's LRU segment cache (capped at CHROMA_SEGMENT_CACHE_BYTES).
+    The collection is reopened on next use.
+    """
+
+    def __init__(self, collection_name: str, embeddings: Embeddings, persist_directory: str):
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        store = self._store
+        if store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._open()
+                store = self._store
+        return store
+
+    def _open(self):
+        from chromadb.config import Settings
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            collection_name=self.collection_name,
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_directory,
+            client_settings=Settings(
+                is_persistent=True,
+                persist_directory=self.persist_directory,
+                anonymized_telemetry=False,
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=CHROMA_SEGMENT_CACHE_BYTES,
+            ),
+        )
+
+    def close(self):
+        with self._lock:
+            self._store = None
+
+    def _similarity(self):
+        # Not langchain's relevance functions: its "l2" one treats Chroma's squared distance as a plain one
+        return _chroma_cosine((self.store._collection.metadata or {}).get("hnsw:space", "l2"))
+
+    def add_documents(self, documents: list[Document], ids: Optional[list[str]] = None) -> list[str]:
+        if ids is not None:
+            return self.store.add_documents(documents, ids=ids)
+        return self.store.add_documents(documents)
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: list[float], k: int = 4, filter: Optional[dict] = None
+    ) -> list[tuple[Document, float]]:
+        # Chroma returns distances (lower is better); expose cosine similarity instead
+        results = self.store.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=_chroma_where(filter)
+        )
+        similarity = self._similarity()
+        return [(doc, similarity(distance)) for doc, distance in results]
+
+    def similarity_search_batch_by_vectors(
+        self, embeddings: list[list[float]], k: int = 4, filter: Optional[dict] = None
+    ) -> list[list[tuple[Document, float]]]:
+        # One collection.query call scores every query vector
+        if not embeddings:
+            return []
+        results = self.store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=_chroma_where(filter),
+            include=["documents", "metadatas", "distances"],
+        )
+        similarity = self._similarity()
+        batches = []
+        for ids, texts, metas, distances in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"]
+        ):
+            batches.append([
+                (Document(id=doc_id, page_content=text, metadata=meta or {}), similarity(distance))
+                for doc_id, text, meta, distance in zip(ids, texts, metas, distances)
+            ])
+        return batches
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None) -> list[Document]:
+        return self.store.similarity_search(query, k=k, filter=_chroma_where(filter))
+
+    def get_vectors(self, ids: list[str]) -> Optional[np.ndarray]:
+        if not ids:
+            return None
+        got = self.store._collection.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(got["ids"], got["embeddings"]))
+        if not by_id:
+            return None
+        dim = len(next(iter(by_id.values())))
+        return np.asarray(
+            [by_id[i] if i in by_id else np.zeros(dim) for i in ids], dtype=np.float32
+        )
+
+    def update_metadata(self, ids: list[str], patches: list[dict]) -> int:
+        # Chroma merges metadata keys on update; unknown IDs are ignored
+        found = set(self.store._collection.get(ids=ids, include=[])["ids"])
+        pairs = [(i, p) for i, p in zip(ids, patches) if i in found]
+        if pairs:
+            self.store._collection.update(ids=[i for i, _ in pairs], metadatas=[p for _, p in pairs])
+        return len(pairs)
+
+    def update_documents(self, ids: list[str], texts: list[str], patches: list[dict]) -> int:
+        found = set(self.store._collection.get(ids=ids, include=[])["ids"])
+        rows = [(i, t, p) for i, t, p in zip(ids, texts, patches) if i in found]
+        if rows:
+            self.store._collection.update(
+                ids=[i for i, _, _ in rows],
+                embeddings=self.embeddings.embed_documents([t for _, t, _ in rows]),
+                documents=[t for _, t, _ in rows],
+                metadatas=[p for _, _, p in rows],
+            )
+        return len(rows)
+
+    def delete(self, ids: list[str]) -> int:
+        found = self.store._collection.get(ids=ids, include=[])["ids"]
+        if found:
+            self.store._collection.delete(ids=found)
+        return len(found)
+
+    def list_records(self) -> list[dict]:
+        got = self.store._collection.get(include=["documents", "metadatas"])
+        return [
+            {"id": doc_id, "text": text, "metadata": meta or {}}
+            for doc_id, text, meta in zip(got["ids"], got["documents"], got["metadatas"])
+        ]
+
+    def records_by_id(self, ids: list[str]) -> list[dict]:
+        got = self.store._collection.get(ids=ids, include=["documents", "metadatas"])
+        return [
+            {"id": doc_id, "text": text, "metadata": meta or {}}
+            for doc_id, text, meta in zip(got["ids"], got["documents"], got["metadatas"])
+        ]
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None) -> list[str]:
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for start in range(0, len(ids), CHROMA_MAX_BATCH):
+            end = start + CHROMA_MAX_BATCH
+            self.store._collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end].tolist(),
+                documents=texts[start:end],
+                metadatas=[meta or None for meta in metadatas[start:end]],
+            )
+        return ids
+
+    def iter_batches(self, batch_size: int = 50_000):
+        for offset in range(0, self.count(), batch_size):
+            got = self.store._collection.get(
+                limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"]
+            )
+            yield (
+                got["ids"], got["documents"], [meta or {} for meta in got["metadatas"]],
+                np.asarray(got["embeddings"], dtype=np.float32),
+            )
+
+    def count(self) -> int:
+        return self.store._collection.count()
@@ -1,59 +1,328 @@
 """
-Vector database interface using Chroma.
+Vector database interface.
 Handles storing and searching memory summaries.
+
+The engine is picked with VECTOR_BACKEND:
+- "chroma" (default): langchain_chroma, persisted to ./chroma_db/
+- "numpy": memory-mapped NumPy index (db/numpy_store.py), persisted to ./vector_index/
+  VECTOR_ANN=ivf adds an IVF approximate index once a collection reaches
+  ANN_MIN_ROWS rows; IVF_NPROBE trades recall for latency.
+
+With PARTITION_BY_SESSION on (default), memories that carry a session_id are
+written to and searched in that session's own partition (db/partitions.py).
+Calls without a session_id use the shared collection. Memories stored in the
+shared collection before partitioning are moved into their sessions'
+partitions by `python -m db.migrate_partitions` (a warning is logged until then).
+
+With LEXICAL_INDEX on (default), every add_documents also feeds a per-partition
+BM25 index (db/lexical_index.py) used by hybrid retrieval.
+
+Every memory gets a numeric `ts` (epoch seconds) next to its ISO `timestamp`;
+filters accept operators on it, e.g. time_range_filter(start=now - 30 days).
 """
 
+import logging
 import os
+import threading
+import time
 from datetime import datetime
 from typing import Optional
 
-from langchain_chroma import Chroma
+import numpy as np
 from langchain_core.documents import Document
 
 from db.embeddings import get_embeddings
+from db.executor import run_blocking
+from db.lexical_index import BM25Index
+from db.metadata_index import to_epoch
+from db.metrics import timed_call
+from db.partitions import PartitionManager
+from db.vector_backends import VectorBackend
 
 
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+COLLECTION_NAME = "gpt_memory"
 CHROMA_PERSIST_DIR = os.path.join(os.path.dirname(__file__), "..", "chroma_db")
-_vector_store: Optional[Chroma] = None
+NUMPY_PERSIST_DIR = os.path.join(os.path.dirname(__file__), "..", "vector_index")
+PARTITION_BY_SESSION = os.getenv("PARTITION_BY_SESSION", "1") == "1"
+MAX_OPEN_PARTITIONS = int(os.getenv("MAX_OPEN_PARTITIONS", "64"))
+VECTOR_ANN = os.getenv("VECTOR_ANN") or None
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "50000"))
+LEXICAL_INDEX = os.getenv("LEXICAL_INDEX", "1") == "1"
+_vector_store: Optional[VectorBackend] = None
+_partitions: Optional[PartitionManager] = None
+_lexical_partitions: Optional[PartitionManager] = None
+_lexical_global: Optional[BM25Index] = None
+_init_lock = threading.RLock()
+
+
+def create_backend(
+    backend: str, collection_name: str, persist_directory: str, with_embeddings: bool = True
+) -> VectorBackend:
+    """Construct a backend by name. with_embeddings=False opens it for vector-level access only."""
+    embeddings = get_embeddings() if with_embeddings else None
+    if backend == "chroma":
+        from db.vector_backends import ChromaBackend
+        return ChromaBackend(collection_name, embeddings, persist_directory)
+    if backend == "numpy":
+        from db.numpy_store import NumpyVectorStore
+        return NumpyVectorStore(
+            collection_name, embeddings, persist_directory,
+            ann=VECTOR_ANN, nprobe=IVF_NPROBE, ann_min_rows=ANN_MIN_ROWS,
+        )
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
 
 
-def init_vector_store(persist_directory: str = CHROMA_PERSIST_DIR) -> Chroma:
-    """Initialize or return existing store. Data persists to ./chroma_db/"""
+def default_persist_directory(backend: str = VECTOR_BACKEND) -> str:
+    return NUMPY_PERSIST_DIR if backend == "numpy" else CHROMA_PERSIST_DIR
+
+
+def init_vector_store(persist_directory: Optional[str] = None) -> VectorBackend:
+    """Initialize or return existing store."""
     global _vector_store
-    
+
     if _vector_store is not None:
         return _vector_store
-    
-    os.makedirs(persist_directory, exist_ok=True)
-    
-    _vector_store = Chroma(
-        collection_name="gpt_memory",
-        embedding_function=get_embeddings(),
-        persist_directory=persist_directory
-    )
-    
+
+    with _init_lock:
+        if _vector_store is None:
+            persist_directory = persist_directory or default_persist_directory()
+            os.makedirs(persist_directory, exist_ok=True)
+            _vector_store = create_backend(VECTOR_BACKEND, COLLECTION_NAME, persist_directory)
+
     return _vector_store
 
 
-def add_documents(texts: list[str], metadata: list[dict]) -> list[str]:
+def get_partitions(persist_directory: Optional[str] = None) -> PartitionManager:
+    """Initialize or return the per-session partition manager."""
+    global _partitions
+
+    if _partitions is not None:
+        return _partitions
+
+    with _init_lock:
+        if _partitions is None:
+            persist_directory = persist_directory or default_persist_directory()
+            os.makedirs(persist_directory, exist_ok=True)
+            _partitions = PartitionManager(
+                COLLECTION_NAME,
+                lambda name: create_backend(VECTOR_BACKEND, name, persist_directory),
+                max_open=MAX_OPEN_PARTITIONS,
+            )
+            _warn_unmigrated()
+
+    return _partitions
+
+
+def _warn_unmigrated():
+    """Memories written before partitioning sit in the shared collection, invisible to session lookups."""
+    try:
+        shared = init_vector_store().count()
+    except Exception:
+        return
+    if shared:
+        logger.warning(
+            "The shared collection holds %d memories; per-session retrieval only reads partitions. "
+            "Move those with a session_id into their partitions with: python -m db.migrate_partitions",
+            shared,
+        )
+
+
+def get_store(session_id: Optional[str] = None) -> VectorBackend:
+    """Backend that holds a session's memories (shared store if unpartitioned)."""
+    if PARTITION_BY_SESSION and session_id:
+        return get_partitions().get(session_id)
+    return init_vector_store()
+
+
+def get_lexical_index(session_id: Optional[str] = None) -> BM25Index:
+    """BM25 index that mirrors get_store(session_id)."""
+    global _lexical_partitions, _lexical_global
+
+    lexical_dir = os.path.join(default_persist_directory(), "lexical")
+
+    if PARTITION_BY_SESSION and session_id:
+        if _lexical_partitions is None:
+            with _init_lock:
+                if _lexical_partitions is None:
+                    _lexical_partitions = PartitionManager(
+                        COLLECTION_NAME,
+                        lambda name: BM25Index(os.path.join(lexical_dir, name + ".jsonl")),
+                        max_open=MAX_OPEN_PARTITIONS,
+                    )
+        return _lexical_partitions.get(session_id)
+
+    if _lexical_global is None:
+        with _init_lock:
+            if _lexical_global is None:
+                _lexical_global = BM25Index(os.path.join(lexical_dir, COLLECTION_NAME + ".jsonl"))
+    return _lexical_global
+
+
+@timed_call("vector_write")
+def add_documents(texts: list[str], metadata: list[dict], ids: Optional[list[str]] = None) -> list[str]:
     """Store text with metadata. Returns list of doc IDs."""
-    store = init_vector_store()
-    
+    groups: dict[Optional[str], list[int]] = {}
     documents = []
-    for text, meta in zip(texts, metadata):
+    for i, (text, meta) in enumerate(zip(texts, metadata)):
         if "timestamp" not in meta:
             meta["timestamp"] = datetime.now().isoformat()
+        if "ts" not in meta:
+            # Numeric epoch copy of the timestamp for cheap range filters
+            meta["ts"] = to_epoch(meta["timestamp"]) or time.time()
         documents.append(Document(page_content=text, metadata=meta))
-    
-    return store.add_documents(documents)
+        groups.setdefault(meta.get("session_id"), []).append(i)
+
+    stored_ids = [""] * len(documents)
+    for session_id, positions in groups.items():
+        store = get_store(session_id)
+        group_ids = [ids[i] for i in positions] if ids is not None else None
+        stored = store.add_documents([documents[i] for i in positions], ids=group_ids)
+        for i, doc_id in zip(positions, stored):
+            stored_ids[i] = doc_id
+        if LEXICAL_INDEX:
+            get_lexical_index(session_id).add(
+                stored, [texts[i] for i in positions], [documents[i].metadata for i in positions]
+            )
+
+    return stored_ids
+
+
+def update_metadata(ids: list[str], patches: list[dict], session_id: Optional[str] = None) -> int:
+    """Merge metadata patches into stored documents (and their lexical entries). Returns how many were found."""
+    updated = get_store(session_id).update_metadata(ids, patches)
+    if LEXICAL_INDEX:
+        get_lexical_index(session_id).update(ids, patches)
+    return updated
+
+
+@timed_call("vector_write")
+def update_documents(ids: list[str], texts: list[str], patches: list[dict], session_id: Optional[str] = None) -> int:
+    """Replace stored documents' text (re-embedded) and merge metadata patches. Returns how many were found."""
+    updated = get_store(session_id).update_documents(ids, texts, patches)
+    if LEXICAL_INDEX:
+        get_lexical_index(session_id).update(ids, patches, texts)
+    return updated
+
+
+def delete_documents(ids: list[str], session_id: Optional[str] = None) -> int:
+    """Remove documents (and their lexical entries). Returns how many were found."""
+    removed = get_store(session_id).delete(ids)
+    if LEXICAL_INDEX:
+        get_lexical_index(session_id).remove(ids)
+    return removed
+
+
+def list_documents(session_id: Optional[str] = None) -> list[dict]:
+    """Every stored memory of a partition as {"id", "text", "metadata"}."""
+    return get_store(session_id).list_records()
+
+
+def get_documents(ids: list[str], session_id: Optional[str] = None) -> list[dict]:
+    """Stored memories for ids as {"id", "text", "metadata"}; unknown IDs are skipped."""
+    return get_store(session_id).records_by_id(ids)
+
+
+@timed_call("vector_load")
+def load_documents(session_id: Optional[str] = None) -> tuple[list[str], list[str], list[dict], np.ndarray]:
+    """Every stored memory of a partition as (ids, texts, metadatas, vectors), vectors in one in-RAM matrix."""
+    ids, texts, metadatas, blocks = [], [], [], []
+    for batch_ids, batch_texts, batch_metadatas, vectors in get_store(session_id).iter_batches():
+        if vectors is None:
+            raise ValueError("Backend can't hand back stored vectors")
+        ids += batch_ids
+        texts += batch_texts
+        metadatas += batch_metadatas
+        blocks.append(np.asarray(vectors, dtype=np.float32))
+    vectors = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+    return ids, texts, metadatas, vectors
+
+
+@timed_call("vector_search")
+def similarity_search(
+    query: str, k: int = 5, session_id: Optional[str] = None, filters: Optional[dict] = None
+) -> list[Document]:
+    """Find k most similar documents to query, within a session's partition if given."""
+    store = get_store(session_id)
+    return store.similarity_search(query, k=k, filter=filters)
+
+
+@timed_call("vector_search")
+def similarity_search_with_score(
+    query: str, k: int = 5, session_id: Optional[str] = None, filters: Optional[dict] = None
+) -> list[tuple[Document, float]]:
+    """Like similarity_search, with a similarity score (higher is better) per hit."""
+    store = get_store(session_id)
+    return store.similarity_search_with_score(query, k=k, filter=filters)
+
+
+@timed_call("vector_rescore")
+def dense_scores(query: str, ids: list[str], session_id: Optional[str] = None) -> Optional[list[float]]:
+    """
+    Cosine similarity of query to already-stored documents, without a search.
+    Returns None if the backend can't hand back stored vectors.
+    """
+    vectors = get_store(session_id).get_vectors(ids)
+    if vectors is None:
+        return None
+    query_vec = np.asarray(get_embeddings().embed_query(query), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vec) or 1.0)
+    norms[norms == 0] = 1.0
+    return (vectors @ query_vec / norms).tolist()
+
+
+@timed_call("vector_search_batch")
+def similarity_search_batch_with_score(
+    queries: list[str], k: int = 5, filters: Optional[dict] = None, session_id: Optional[str] = None
+) -> list[list[tuple[Document, float]]]:
+    """
+    Find k most similar documents for each query, with a similarity score per hit.
+    All queries are embedded in one call and scored against the index together.
+    """
+    if not queries:
+        return []
+    store = get_store(session_id)
+    vectors = get_embeddings().embed_documents(list(queries))
+    return store.similarity_search_batch_by_vectors(vectors, k=k, filter=filters)
+
+
+def similarity_search_batch(
+    queries: list[str], k: int = 5, filters: Optional[dict] = None, session_id: Optional[str] = None
+) -> list[list[Document]]:
+    """similarity_search_batch_with_score without the scores."""
+    results = similarity_search_batch_with_score(queries, k=k, filters=filters, session_id=session_id)
+    return [[doc for doc, _ in hits] for hits in results]
+
+
+async def aadd_documents(texts: list[str], metadata: list[dict], ids: Optional[list[str]] = None) -> list[str]:
+    """Async add_documents; the blocking write runs on the bounded I/O pool."""
+    return await run_blocking(add_documents, texts, metadata, ids)
+
+
+async def asimilarity_search(
+    query: str, k: int = 5, session_id: Optional[str] = None, filters: Optional[dict] = None
+) -> list[Document]:
+    """Async similarity_search; never blocks the event loop."""
+    return await run_blocking(similarity_search, query, k, session_id, filters)
+
+
+async def asimilarity_search_with_score(
+    query: str, k: int = 5, session_id: Optional[str] = None, filters: Optional[dict] = None
+) -> list[tuple[Document, float]]:
+    """Async similarity_search_with_score."""
+    return await run_blocking(similarity_search_with_score, query, k, session_id, filters)
 
 
-def similarity_search(query: str, k: int = 5) -> list[Document]:
-    """Find k most similar documents to query."""
-    store = init_vector_store()
-    return store.similarity_search(query, k=k)
+async def asimilarity_search_batch(
+    queries: list[str], k: int = 5, filters: Optional[dict] = None, session_id: Optional[str] = None
+) -> list[list[Document]]:
+    """Async similarity_search_batch."""
+    return await run_blocking(similarity_search_batch, queries, k, filters, session_id)
 
 
 def persist():
-    """Explicit save. Chroma auto-saves but keeping for FAISS compat."""
+    """Explicit save. Both backends write through, kept for FAISS compat."""
     pass
@@ -7,10 +7,11 @@ Tests how well ChatGPT performs without the memory system
 """
 
 import os
-from openai import OpenAI
 from typing import List, Dict
 import json
 
+from db.http_clients import get_openai_client
+
 
 class BaselineEvaluator:
     """
@@ -19,7 +20,7 @@ class BaselineEvaluator:
     
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key) if api_key else None
+        self.client = get_openai_client() if api_key else None
         self.conversation_history = []
         
     def chat(self, message: str) -> str:
@@ -0,0 +1,84 @@
+"""
+Benchmark - IVF approximate search vs exact search
+recall@k and median query latency on synthetic clustered corpora.
+
+Run: python -m eval.bench_ann [rows ...]     (default: 100000 1000000)
+     python -m eval.bench_ann 100000 1000000 5000000
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from db.ivf_index import IVFIndex
+from db.numpy_store import normalize_rows, top_k
+
+
+DIM = 128
+K = 10
+N_QUERIES = 100
+
+
+def clustered_corpus(n: int, n_clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random topic centres, like real embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, DIM), dtype=np.float32)
+    out = np.empty((n, DIM), dtype=np.float32)
+    for start in range(0, n, 500_000):
+        size = min(500_000, n - start)
+        labels = rng.integers(0, n_clusters, size)
+        out[start:start + size] = centres[labels] + 0.6 * rng.standard_normal((size, DIM), dtype=np.float32)
+    return normalize_rows(out)
+
+
+def median_ms(fn, queries) -> float:
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]
+
+    print("\n" + "="*62)
+    print(f"IVF vs EXACT (dim={DIM}, recall@{K}, {N_QUERIES} queries)")
+    print("="*62)
+    print(f"{'rows':>9} {'mode':>14} {'recall':>8} {'ms/query':>10} {'train s':>9}")
+
+    for n in sizes:
+        path = tempfile.mkdtemp(prefix="ann_")
+        try:
+            # Store the corpus as a memmap, same access pattern as NumpyVectorStore
+            matrix = np.memmap(f"{path}/vectors.f32", dtype=np.float32, mode="w+", shape=(n, DIM))
+            matrix[:] = clustered_corpus(n)
+            queries = clustered_corpus(N_QUERIES, seed=1)
+
+            truth = [set(top_k(matrix @ q, K).tolist()) for q in queries]
+            exact_ms = median_ms(lambda q: top_k(matrix @ q, K), queries)
+            print(f"{n:>9} {'exact':>14} {1.0:>8.3f} {exact_ms:>10.3f} {'-':>9}")
+
+            index = IVFIndex()
+            start = time.perf_counter()
+            index.train(matrix)
+            train_s = time.perf_counter() - start
+
+            for nprobe in (1, 4, 16, 64):
+                hits = 0
+                for q, expected in zip(queries, truth):
+                    rows, _ = index.search(matrix, q, K, nprobe=nprobe)
+                    hits += len(expected & set(rows.tolist()))
+                recall = hits / (K * N_QUERIES)
+                ms = median_ms(lambda q: index.search(matrix, q, K, nprobe=nprobe), queries)
+                label = f"ivf nprobe={nprobe}"
+                print(f"{n:>9} {label:>14} {recall:>8.3f} {ms:>10.3f} {train_s:>9.1f}")
+            del matrix
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    print("="*62 + "\n")
@@ -0,0 +1,73 @@
+"""
+Benchmark - concurrent /chat throughput, blocking invoke vs ainvoke
+Runs ChatService-style requests from many concurrent clients on one event
+loop. The old path called graph.invoke on the loop thread; the async path
+awaits graph.ainvoke with blocking I/O on the bounded executor.
+
+Uses the NumPy backend in a temp dir and a fake embedder with 40 ms latency.
+
+Run: python -m eval.bench_async_chat
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ["REMEMBER_GATE"] = "0"  # every turn goes through summarize + store
+
+import db.embeddings
+import db.vector_store
+from eval.bench_embedding_batcher import LatencyEmbedder
+from graph.pipeline import build_graph
+
+
+REQUESTS_PER_CLIENT = 8
+
+
+def initial_state(message: str, user_id: str) -> dict:
+    return {
+        "user_input": message,
+        "retrieved_memories": [],
+        "response": None,
+        "summary": None,
+        "metadata": {"session_id": user_id, "timestamps": {}},
+    }
+
+
+async def client(graph, user_id: str, use_async: bool):
+    for i in range(REQUESTS_PER_CLIENT):
+        state = initial_state(f"message {i} from {user_id}", user_id)
+        if use_async:
+            await graph.ainvoke(state)
+        else:
+            graph.invoke(state)  # what /chat used to do: blocks the loop
+
+
+async def run(graph, clients: int, use_async: bool) -> float:
+    """Requests per second across all clients."""
+    start = time.perf_counter()
+    await asyncio.gather(*(client(graph, f"user-{c}", use_async) for c in range(clients)))
+    return clients * REQUESTS_PER_CLIENT / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="async_chat_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    db.embeddings._embeddings = LatencyEmbedder(base_ms=40.0, per_text_ms=0.0, dim=64)
+    graph = build_graph()
+
+    try:
+        print("\n" + "="*52)
+        print("CONCURRENT CHAT THROUGHPUT (40 ms embedding latency)")
+        print("="*52)
+        print(f"{'clients':>8} {'invoke req/s':>14} {'ainvoke req/s':>15} {'gain':>8}")
+        for clients in (1, 8, 32):
+            blocking = asyncio.run(run(graph, clients, use_async=False))
+            non_blocking = asyncio.run(run(graph, clients, use_async=True))
+            print(f"{clients:>8} {blocking:>14.1f} {non_blocking:>15.1f} {non_blocking / blocking:>7.1f}x")
+        print("="*52 + "\n")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,65 @@
+"""
+Benchmark - batched multi-query similarity search
+A loop of single-query searches vs one similarity_search_batch-style call
+(one embedding request + one score matrix), NumPy backend.
+
+Run: python -m eval.bench_batch_search
+"""
+
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from db.numpy_store import NumpyVectorStore
+from eval.bench_embedding_batcher import LatencyEmbedder
+
+
+DIM = 384
+
+
+def run_loop(store: NumpyVectorStore, queries: list[str], k: int):
+    for q in queries:
+        store.similarity_search_by_vector_with_score(store.embeddings.embed_query(q), k=k)
+
+
+def run_batch(store: NumpyVectorStore, queries: list[str], k: int):
+    vectors = store.embeddings.embed_documents(queries)
+    store.similarity_search_batch_by_vectors(vectors, k=k)
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+
+    print("\n" + "="*66)
+    print("BATCHED SIMILARITY SEARCH (k=5)")
+    print("="*66)
+    print(f"{'rows':>8} {'queries':>8} {'embed':>8} {'loop ms':>10} {'batch ms':>10} {'speedup':>8}")
+
+    for rows in (10_000, 100_000):
+        path = tempfile.mkdtemp(prefix="batch_search_")
+        try:
+            store = NumpyVectorStore("bench", None, path)
+            store.add_embeddings(
+                [f"memory {i}" for i in range(rows)],
+                rng.standard_normal((rows, DIM), dtype=np.float32),
+            )
+            for label, base_ms in (("none", 0.0), ("40ms", 40.0)):
+                store.embeddings = LatencyEmbedder(base_ms=base_ms, per_text_ms=0.0, dim=DIM)
+                for n_queries in (16, 128):
+                    queries = [f"question {i}" for i in range(n_queries)]
+                    loop_ms = timed(run_loop, store, queries, 5)
+                    batch_ms = timed(run_batch, store, queries, 5)
+                    print(f"{rows:>8} {n_queries:>8} {label:>8} {loop_ms:>10.1f} {batch_ms:>10.1f} {loop_ms / batch_ms:>7.1f}x")
+            store.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    print("="*66 + "\n")
@@ -0,0 +1,98 @@
+"""
+Benchmark - memory compaction and retention
+Per-session index size, disk use and retrieval latency before and after one
+compaction pass (quota + consolidation + LFU/recency eviction).
+Uses the NumPy backend, the local embedder and a stub summarizer (no API calls).
+
+Run: python -m eval.bench_compaction
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+
+import numpy as np
+
+import db.vector_store as vector_store
+from memory.compaction import Compactor
+
+
+SESSIONS = 10
+MEMORIES_PER_SESSION = 5_000
+QUOTA = 1_000
+CONSOLIDATE_AT = 800
+TOPICS = ["coffee", "hiking", "python", "tax return", "sister's wedding", "marathon", "garden", "flat hunt"]
+
+
+def stub_summarizer(summaries: list[str]) -> str:
+    """Stands in for the LLM: keeps the distinct facts, truncated."""
+    facts = list(dict.fromkeys(s.removeprefix("User said: ") for s in summaries))
+    return "Consolidated: " + "; ".join(facts)[:400]
+
+
+def disk_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def query_ms(queries, repeats: int = 3) -> float:
+    times = []
+    for _ in range(repeats):
+        for session_id, query in queries:
+            start = time.perf_counter()
+            vector_store.similarity_search(query, k=3, session_id=session_id)
+            times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    path = tempfile.mkdtemp(prefix="compaction_")
+    vector_store.NUMPY_PERSIST_DIR = path
+    try:
+        now = datetime.now()
+        for s in range(SESSIONS):
+            session_id = f"user-{s}"
+            texts, metas = [], []
+            for i in range(MEMORIES_PER_SESSION):
+                topic = TOPICS[rng.integers(len(TOPICS))]
+                age = timedelta(days=float(rng.uniform(0, 365)))
+                texts.append(f"User said: note {i} about {topic} ({rng.integers(1000)})")
+                metas.append({
+                    "type": "summary", "session_id": session_id, "timestamp": (now - age).isoformat(),
+                })
+            vector_store.add_documents(texts, metas)
+
+        queries = [(f"user-{s}", f"what did I say about {TOPICS[s % len(TOPICS)]}") for s in range(SESSIONS)]
+        rows_before = sum(vector_store.get_store(f"user-{s}").count() for s in range(SESSIONS))
+        disk_before = disk_bytes(path)
+        latency_before = query_ms(queries)
+
+        compactor = Compactor(
+            quota=QUOTA, consolidate_at=CONSOLIDATE_AT, min_age_s=30 * 86400,
+            summarizer=stub_summarizer, max_sessions=SESSIONS, max_merges=20 * SESSIONS, pause_s=0.0,
+        )
+        # Retrieval hits feed the LFU side of eviction
+        for session_id, query in queries:
+            hits = vector_store.similarity_search(query, k=20, session_id=session_id)
+            compactor.record_access(session_id, [doc.id for doc in hits])
+
+        report = compactor.run_pass([f"user-{s}" for s in range(SESSIONS)])
+        rows_after = sum(vector_store.get_store(f"user-{s}").count() for s in range(SESSIONS))
+        disk_after = disk_bytes(path)
+        latency_after = query_ms(queries)
+
+        print("\n" + "="*60)
+        print(f"COMPACTION ({SESSIONS} sessions x {MEMORIES_PER_SESSION} memories, quota {QUOTA})")
+        print("="*60)
+        print(f"{'':>10} {'rows':>8} {'disk MB':>9} {'query ms':>9}")
+        print(f"{'before':>10} {rows_before:>8} {disk_before / 2**20:>9.1f} {latency_before:>9.3f}")
+        print(f"{'after':>10} {rows_after:>8} {disk_after / 2**20:>9.1f} {latency_after:>9.3f}")
+        print(f"\nconsolidated: {report['consolidated']} memories into {compactor.merges} summaries  "
+              f"evicted: {report['evicted']}  pass: {report['ms']:.0f} ms")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
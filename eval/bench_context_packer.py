@@ -0,0 +1,193 @@
+"""
+Benchmark - token-budget context packer
+Builds the system prompt for scripted chat sessions two ways:
+- before: every retrieved memory, old template (memories ahead of the
+  instructions)
+- after: pack_memories (memory/context.py) with the default budget,
+  score threshold and redundancy filter, and the static-prefix template
+
+Sessions are modelled on the eval scenarios (name, pet, job, favourites):
+each fact is stored a few times in different words, between longer
+small-talk summaries. Every question has one fact that answers it; "kept"
+is how often that fact is still in the packed prompt when retrieval found
+it. "<thresh" and "redund" are the shares of retrieved memories the packer
+dropped for a low score or as redundant.
+
+Prompt tokens use the packer's estimator. "cached" is the prompt's shared
+prefix with the same session's previous prompt, what a provider prefix
+cache can reuse. Latency is modelled, not measured: PREFILL_MS per
+uncached prompt token, a tenth of that per cached one.
+
+Uses the local embedder and the NumPy backend in a temp dir.
+
+Run: python -m eval.bench_context_packer
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+os.environ["RETRIEVAL_CACHE"] = "0"
+
+import numpy as np
+
+import db.vector_store
+from memory.context import context_stats, estimate_tokens, pack_memories
+from memory.retrieve import retrieve_memories
+from memory.write_queue import get_write_queue
+from prompts.system_prompts import get_system_prompt
+
+
+SESSIONS = 20
+QUESTIONS = 12
+KS = [3, 5, 10]
+PREFILL_MS = 0.2
+FACTS = [
+    ("what is my cat's name", ["My cat is called {}", "I have a cat named {}", "{} is the name of my cat"],
+     ["Whiskers", "Mochi", "Luna", "Pepper"]),
+    ("what is my favorite color", ["My favorite color is {}", "I really like the color {}",
+                                   "{} has always been my favorite colour"], ["blue", "green", "teal", "red"]),
+    ("where do I work", ["I work as an engineer at {}", "My job is at {}", "I just started working at {}"],
+     ["Google", "a bakery", "the hospital", "a startup"]),
+    ("what is my name", ["My name is {}", "Call me {}", "I'm {}, nice to meet you"],
+     ["Alex", "Priya", "Sam", "Jordan"]),
+    ("what sport do I play", ["I play {} every weekend", "My favorite sport is {}", "I joined a {} club"],
+     ["tennis", "football", "chess", "volleyball"]),
+]
+SMALL_TALK = [
+    "The user asked about the weather forecast for the weekend and whether it would rain.",
+    "They talked about a documentary they watched and how the ending felt rushed.",
+    "The assistant suggested a few recipes for a quick dinner with pasta and vegetables.",
+    "The user mentioned feeling tired after a long week and wanting to sleep in.",
+    "They discussed plans for an upcoming trip and compared train and flight prices.",
+    "The user asked for tips on keeping houseplants alive during winter.",
+]
+
+OLD_TEMPLATE = """
+You are a helpful AI assistant with access to memories from past conversations.
+
+Below are relevant facts and context from previous interactions:
+
+{retrieved_memories}
+
+Use this information to provide personalized and contextually aware responses.
+If the memories contain relevant information, incorporate it naturally into your answer.
+If the memories don't help with the current question, just answer normally.
+
+Current user message: {user_input}
+"""
+
+
+def old_prompt(question: str, memories: list[dict]) -> str:
+    """The prompt before the packer: every memory, numbered, ahead of the instructions."""
+    block = "No relevant past memories."
+    if memories:
+        block = "=== Relevant Past Information ===\n"
+        for i, memory in enumerate(memories, 1):
+            block += f"{i}. {memory['text']}\n"
+        block += "================================\n"
+    return OLD_TEMPLATE.format(retrieved_memories=block, user_input=question)
+
+
+def shared_prefix_tokens(prompt: str, previous: str) -> int:
+    n = 0
+    for a, b in zip(prompt, previous):
+        if a != b:
+            break
+        n += 1
+    return estimate_tokens(prompt[:n])
+
+
+def seed(session_id: str, rng: random.Random) -> dict[str, str]:
+    """Store a session's memories; returns the answer to each fact's question."""
+    answers, texts = {}, []
+    for question, phrasings, values in FACTS:
+        value = rng.choice(values)
+        answers[question] = value
+        texts += [f"User said: {p.format(value)}." for p in rng.sample(phrasings, k=len(phrasings))]
+    for _ in range(30):
+        texts.append(" ".join(rng.sample(SMALL_TALK, k=rng.randint(1, 3))))
+    rng.shuffle(texts)
+    for i, text in enumerate(texts):
+        db.vector_store.add_documents([text], [{"session_id": session_id, "type": "summary", "ts": 1e9 + i}])
+    return answers
+
+
+def run(k: int, sessions: list[tuple[str, dict, list[str]]]) -> dict:
+    before, after, cached_before, cached_after, pack_us = [], [], [], [], []
+    found = kept = 0
+    stats = dict(context_stats)
+    for session_id, answers, questions in sessions:
+        previous_old = previous_new = ""
+        for question in questions:
+            memories = retrieve_memories(question, session_id=session_id, k=k)
+            start = time.perf_counter()
+            packed = pack_memories(memories)
+            new = get_system_prompt(question, packed.text)
+            pack_us.append((time.perf_counter() - start) * 1e6)
+            old = old_prompt(question, memories)
+
+            before.append(estimate_tokens(old))
+            after.append(estimate_tokens(new))
+            cached_before.append(shared_prefix_tokens(old, previous_old))
+            cached_after.append(shared_prefix_tokens(new, previous_new))
+            previous_old, previous_new = old, new
+
+            answer = answers[question]
+            if any(answer in m["text"] for m in memories):
+                found += 1
+                kept += any(answer in m["text"] for m in packed.memories)
+
+    def latency(tokens, cached):
+        return float(np.mean([(t - c) * PREFILL_MS + c * PREFILL_MS / 10 for t, c in zip(tokens, cached)]))
+
+    dropped = {name: context_stats[name] - stats[name] for name in context_stats}
+    retrieved = sum(dropped.values())
+    return {
+        "below_threshold": dropped["below_threshold"] / retrieved,
+        "redundant": dropped["redundant"] / retrieved,
+        "tokens_before": float(np.mean(before)),
+        "tokens_after": float(np.mean(after)),
+        "cached_before": float(np.mean(cached_before)),
+        "cached_after": float(np.mean(cached_after)),
+        "ms_before": latency(before, cached_before),
+        "ms_after": latency(after, cached_after),
+        "kept": kept / found if found else float("nan"),
+        "pack_us": float(np.mean(pack_us)),
+    }
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="context_packer_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    try:
+        sessions = []
+        for s in range(SESSIONS):
+            rng = random.Random(s)
+            session_id = f"packer-{s}"
+            answers = seed(session_id, rng)
+            sessions.append((session_id, answers, [rng.choice(FACTS)[0] for _ in range(QUESTIONS)]))
+        get_write_queue().flush()
+
+        rows = [(k, run(k, sessions)) for k in KS]
+        print("\n" + "="*112)
+        print(f"CONTEXT PACKER ({SESSIONS} sessions x {QUESTIONS} questions, modelled prefill {PREFILL_MS} ms/token, "
+              f"cached tokens at 1/10)")
+        print("="*112)
+        print(f"{'k':>3} {'tokens before':>14} {'tokens after':>13} {'saved':>7} {'cached before':>14} "
+              f"{'cached after':>13} {'prefill ms':>15} {'<thresh':>8} {'redund':>7} {'kept':>6} {'pack us':>8}")
+        for k, r in rows:
+            saved = 1 - r["tokens_after"] / r["tokens_before"]
+            prefill = f"{r['ms_before']:.1f} -> {r['ms_after']:.1f}"
+            print(f"{k:>3} {r['tokens_before']:>14.1f} {r['tokens_after']:>13.1f} {saved:>7.1%} "
+                  f"{r['cached_before']:>14.1f} {r['cached_after']:>13.1f} {prefill:>15} {r['below_threshold']:>8.1%} "
+                  f"{r['redundant']:>7.1%} {r['kept']:>6.1%} "
+                  f"{r['pack_us']:>8.1f}")
+        print("="*112 + "\n")
+    finally:
+        get_write_queue().close()
+        shutil.rmtree(path, ignore_errors=True)
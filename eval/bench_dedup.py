@@ -0,0 +1,124 @@
+"""
+Benchmark - write-time duplicate suppression
+Index growth for a chat workload where users repeat themselves (same fact
+restated, re-sent messages, small wording changes), with and without dedup.
+Uses the NumPy backend and the local embedder so it runs offline.
+
+Run: python -m eval.bench_dedup
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+
+import numpy as np
+
+import db.vector_store as vector_store
+import memory.store as store
+from memory.dedup import Deduplicator
+
+
+USERS = 50
+TURNS = 60
+FACTS = [
+    "my name is {name} and I live in {city}",
+    "I work as a {job} at a small company",
+    "my favourite food is {food}",
+    "I am allergic to {food}",
+    "remind me to call {name} tomorrow about the {job} interview",
+    "I am planning a trip to {city} next month",
+]
+NAMES = ["Alice", "Bob", "Chen", "Dana", "Emeka", "Farah"]
+CITIES = ["Seattle", "Lagos", "Berlin", "Osaka", "Lima"]
+JOBS = ["nurse", "teacher", "data engineer", "chef"]
+FOODS = ["peanuts", "sushi", "lentil soup", "strawberries"]
+NOISE = ["", "!", ".", " please", " again", " btw"]
+
+
+def make_turns(rng) -> list[tuple[str, str]]:
+    """(session_id, summary) pairs: ~half new facts, the rest repeats or light edits."""
+    turns = []
+    for u in range(USERS):
+        said: list[str] = []
+        for t in range(TURNS):
+            roll = rng.random()
+            if said and roll < 0.3:
+                text = said[rng.integers(len(said))]  # exact repeat / retry
+            elif said and roll < 0.5:
+                base = said[rng.integers(len(said))]  # restated with small edits
+                text = base.rstrip("!.") + NOISE[rng.integers(len(NOISE))]
+                if rng.random() < 0.5:
+                    text = text.upper() if rng.random() < 0.2 else text.capitalize()
+            else:
+                text = FACTS[rng.integers(len(FACTS))].format(
+                    name=NAMES[rng.integers(len(NAMES))],
+                    city=CITIES[rng.integers(len(CITIES))],
+                    job=JOBS[rng.integers(len(JOBS))],
+                    food=FOODS[rng.integers(len(FOODS))],
+                ) + f" (turn {t})"
+                said.append(text)
+            turns.append((f"user-{u}", f"User said: {text}"))
+    return turns
+
+
+def reset_store(path: str):
+    vector_store.NUMPY_PERSIST_DIR = path
+    vector_store._vector_store = None
+    vector_store._partitions = None
+    vector_store._lexical_partitions = None
+    vector_store._lexical_global = None
+
+
+def run(turns, dedup: bool) -> dict:
+    path = tempfile.mkdtemp(prefix="dedup_")
+    try:
+        reset_store(path)
+        store.DEDUP = dedup
+        dedup_state = Deduplicator()
+        store.get_deduplicator = lambda: dedup_state
+
+        start = time.perf_counter()
+        for session_id, text in turns:
+            store.store_summary(text, session_id=session_id)
+        elapsed = time.perf_counter() - start
+
+        partitions = vector_store.get_partitions()
+        rows = sum(partitions.get(f"user-{u}").count() for u in range(USERS))
+        partitions.close_all()
+        return {
+            "rows": rows,
+            "ms_per_write": elapsed * 1000 / len(turns),
+            "stats": dedup_state.stats() if dedup else None,
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    turns = make_turns(rng)
+    # Cost of the check alone
+    dedup = Deduplicator()
+    start = time.perf_counter()
+    for session_id, text in turns:
+        dedup.check(session_id, text)
+    check_us = (time.perf_counter() - start) * 1e6 / len(turns)
+
+    without = run(turns, dedup=False)
+    with_dedup = run(turns, dedup=True)
+
+    print("\n" + "="*60)
+    print(f"WRITE-TIME DEDUP ({USERS} users x {TURNS} turns = {len(turns)} writes)")
+    print("="*60)
+    print(f"{'':>14} {'rows':>8} {'ms/write':>9}")
+    print(f"{'no dedup':>14} {without['rows']:>8} {without['ms_per_write']:>9.3f}")
+    print(f"{'dedup':>14} {with_dedup['rows']:>8} {with_dedup['ms_per_write']:>9.3f}")
+    stats = with_dedup["stats"]
+    print(f"\nexact duplicates: {stats['exact_duplicates']}  near duplicates: {stats['near_duplicates']}  "
+          f"hit rate: {stats['hit_rate']:.1%}")
+    print(f"index growth reduced by {1 - with_dedup['rows'] / without['rows']:.1%}")
+    print(f"dedup check: {check_us:.1f} us/write")
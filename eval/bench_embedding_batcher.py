@@ -0,0 +1,80 @@
+"""
+Benchmark - embedding micro-batching
+Compares per-call embedding vs the BatchingEmbeddings dispatcher
+using a fake embedder that injects provider latency.
+
+Run: python -m eval.bench_embedding_batcher
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from db.embedding_batcher import BatchingEmbeddings
+
+
+class LatencyEmbedder(Embeddings):
+    """Fake provider: fixed round-trip latency plus a small per-text cost."""
+
+    def __init__(self, base_ms: float = 40.0, per_text_ms: float = 0.2, dim: int = 8):
+        self.base_ms = base_ms
+        self.per_text_ms = per_text_ms
+        self.dim = dim
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep((self.base_ms + self.per_text_ms * len(texts)) / 1000.0)
+        return [[float(len(t))] * self.dim for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def run(embeddings: Embeddings, concurrency: int, requests: int) -> dict:
+    """Fire `requests` embed_query calls from `concurrency` threads."""
+    latencies = []
+
+    def one(i: int):
+        start = time.perf_counter()
+        embeddings.embed_query(f"what did I say about topic {i}?")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "qps": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+if __name__ == "__main__":
+    requests = 800
+
+    print("\n" + "="*70)
+    print("EMBEDDING MICRO-BATCHING BENCHMARK")
+    print("="*70)
+    print(f"{'concurrency':>11} {'mode':>22} {'qps':>9} {'p50 ms':>8} {'p99 ms':>8} {'calls':>6}")
+
+    for concurrency in (1, 16, 64):
+        direct = LatencyEmbedder()
+        r = run(direct, concurrency, requests)
+        print(f"{concurrency:>11} {'direct':>22} {r['qps']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {direct.calls:>6}")
+
+        for window_ms, max_batch in ((2, 32), (5, 64)):
+            inner = LatencyEmbedder()
+            batcher = BatchingEmbeddings(inner, window_ms=window_ms, max_batch=max_batch)
+            r = run(batcher, concurrency, requests)
+            batcher.close()
+            label = f"batched {window_ms}ms/{max_batch}"
+            print(f"{concurrency:>11} {label:>22} {r['qps']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {inner.calls:>6}")
+
+    print("="*70 + "\n")
@@ -0,0 +1,100 @@
+"""
+Benchmark - embedding cache
+Replays a chat-like workload (Zipf-distributed repeat questions plus
+re-stored summaries) through CachedEmbeddings in front of a counting fake
+provider, and reports the hit rate and how many provider calls the cache saved.
+
+Run: python -m eval.bench_embedding_cache
+"""
+
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from db.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbedder(Embeddings):
+    """Fake provider that counts calls and texts."""
+
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.calls = 0
+        self.texts = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        return [[float(len(t))] * self.dim for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def workload(n: int, distinct_queries: int, seed: int = 0) -> List[tuple]:
+    """(kind, text) operations: mostly queries, every fifth a summary write (often a repeat)."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(distinct_queries)]
+    queries = [f"what did I tell you about topic {i}?" for i in range(distinct_queries)]
+    ops = []
+    for i in range(n):
+        if i % 5 == 4:
+            topic = rng.randrange(distinct_queries // 2)
+            ops.append(("store", f"User talked about topic {topic}.  "))
+        else:
+            ops.append(("query", rng.choices(queries, weights)[0]))
+    return ops
+
+
+def run(embeddings: Embeddings, ops: List[tuple]) -> float:
+    start = time.perf_counter()
+    for kind, text in ops:
+        if kind == "query":
+            embeddings.embed_query(text)
+        else:
+            embeddings.embed_documents([text])
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    ops = workload(20_000, distinct_queries=2_000)
+    tmp = tempfile.mkdtemp()
+
+    print("\n" + "="*86)
+    print("EMBEDDING CACHE BENCHMARK")
+    print("="*86)
+    print(f"{len(ops)} lookups, {len({text for _, text in ops})} distinct texts\n")
+    print(f"{'config':>26} {'hit rate':>9} {'mem hits':>9} {'disk hits':>10} "
+          f"{'provider':>9} {'saved':>7} {'ms':>8}")
+
+    def report(label: str, provider: CountingEmbedder, cache: CachedEmbeddings, ms: float):
+        stats = cache.stats()
+        saved = len(ops) - provider.calls
+        print(f"{label:>26} {stats['hit_rate']:>9.1%} {stats['memory_hits']:>9} {stats['disk_hits']:>10} "
+              f"{provider.calls:>9} {saved / len(ops):>7.1%} {ms:>8.1f}")
+
+    provider = CountingEmbedder()
+    ms = run(provider, ops)
+    print(f"{'no cache':>26} {'-':>9} {'-':>9} {'-':>10} {provider.calls:>9} {0:>7.1%} {ms:>8.1f}")
+
+    configs = [
+        ("memory 10k", 10_000, None),
+        ("memory 500", 500, None),
+        ("memory 500 + disk", 500, os.path.join(tmp, "cache.sqlite3")),
+    ]
+    for label, items, path in configs:
+        provider = CountingEmbedder()
+        cache = CachedEmbeddings(provider, model_name="bench", cache_path=path, max_memory_items=items)
+        report(label, provider, cache, run(cache, ops))
+
+    # Restart: fresh memory tier, warm disk tier from the run above
+    provider = CountingEmbedder()
+    cache = CachedEmbeddings(provider, model_name="bench", cache_path=os.path.join(tmp, "cache.sqlite3"),
+                             max_memory_items=500)
+    report("restart, warm disk", provider, cache, run(cache, ops))
+
+    print("="*86 + "\n")
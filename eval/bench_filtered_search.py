@@ -0,0 +1,91 @@
+"""
+Benchmark - filtered vector search with secondary metadata indexes
+Highly selective filters (one session, last 30 days) on a shared collection:
+index pushdown vs. scoring everything then filtering (mask) vs. the
+classic post-filter (unfiltered top-k*10, then drop non-matches).
+
+Run: python -m eval.bench_filtered_search
+"""
+
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from db.numpy_store import NumpyVectorStore, normalize_rows, top_k
+from db.vector_backends import matches_filter
+
+
+DIM = 384
+SESSIONS = 1_000
+K = 5
+OVERFETCH = 10
+DAY = 86400.0
+
+
+def median_ms(fn, n: int) -> float:
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    now = time.time()
+    queries = rng.standard_normal((30, DIM), dtype=np.float32)
+
+    print("\n" + "="*60)
+    print(f"FILTERED SEARCH (session + last 30 days, k={K}, {SESSIONS} sessions)")
+    print("="*60)
+    print(f"{'rows':>9} {'matches':>8} {'pushdown ms':>12} {'mask ms':>9} {'post ms':>9} {'post recall':>12}")
+
+    for n_rows in (20_000, 100_000, 400_000):
+        path = tempfile.mkdtemp(prefix="filtered_")
+        try:
+            store = NumpyVectorStore("bench", None, path)
+            metas = [
+                {"session_id": f"user-{s}", "type": "summary", "ts": now - float(age)}
+                for s, age in zip(rng.integers(SESSIONS, size=n_rows), rng.uniform(0, 365 * DAY, size=n_rows))
+            ]
+            for start in range(0, n_rows, 50_000):
+                end = min(n_rows, start + 50_000)
+                vecs = rng.standard_normal((end - start, DIM), dtype=np.float32)
+                store.add_embeddings(["m"] * (end - start), vecs, metas[start:end])
+
+            filters = [
+                {"session_id": f"user-{i}", "ts": {"$gte": now - 30 * DAY}} for i in range(len(queries))
+            ]
+            store.filter_rows(filters[0], store.count())  # build the indexes once
+            mat = store.matrix()
+            metadata = store._load_metadata()
+
+            def pushdown(i):
+                return store.similarity_search_by_vector_with_score(queries[i].tolist(), k=K, filter=filters[i])
+
+            def mask_scan(i):
+                scores = mat @ normalize_rows(queries[i])
+                mask = np.fromiter((matches_filter(m, filters[i]) for m in metadata), dtype=bool, count=len(metadata))
+                scores = np.where(mask, scores, -np.inf)
+                return top_k(scores, min(K, int(mask.sum())))
+
+            def post_filter(i):
+                hits = store.similarity_search_by_vector_with_score(queries[i].tolist(), k=K * OVERFETCH)
+                return [d for d, _ in hits if matches_filter(d.metadata, filters[i])][:K]
+
+            matches = np.mean([len(store.filter_rows(f, store.count())) for f in filters])
+            recall = np.mean([
+                len(post_filter(i)) / max(1, min(K, len(store.filter_rows(filters[i], store.count()))))
+                for i in range(len(queries))
+            ])
+            print(
+                f"{n_rows:>9} {matches:>8.1f} {median_ms(pushdown, len(queries)):>12.3f} "
+                f"{median_ms(mask_scan, len(queries)):>9.2f} {median_ms(post_filter, len(queries)):>9.2f} "
+                f"{recall:>12.2f}"
+            )
+            store.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
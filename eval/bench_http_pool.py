@@ -0,0 +1,130 @@
+"""
+Benchmark - shared provider HTTP pool
+Summarization, generation and embedding calls from concurrent workers
+against a local stand-in HTTP server, counting the TCP connections the
+server accepts. Compares a new client per call, one client per component
+(one pool per SDK), and the shared registry in db/http_clients.py.
+
+Run: python -m eval.bench_http_pool [requests_per_worker]   (default 60)
+"""
+
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+from db.http_clients import HTTPClients
+
+
+WORKERS = 16
+SERVER_LATENCY_S = 0.005
+COMPONENTS = ("summarize", "generate", "embed")
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(SERVER_LATENCY_S)
+        body = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(url: str, get_client, per_worker: int) -> tuple[float, list[float]]:
+    """Each worker cycles through the components. Returns (seconds, latencies ms)."""
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def worker(w: int):
+        local = []
+        for i in range(per_worker):
+            component = COMPONENTS[(w + i) % len(COMPONENTS)]
+            start = time.perf_counter()
+            get_client(component)(f"{url}/{component}", json={"input": "hello"}).raise_for_status()
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(WORKERS) as pool:
+        list(pool.map(worker, range(WORKERS)))
+    return time.perf_counter() - start, latencies
+
+
+if __name__ == "__main__":
+    per_worker = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    server = StandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def per_call(component):
+        def post(*args, **kwargs):
+            with httpx.Client() as client:
+                return client.post(*args, **kwargs)
+        return post
+
+    per_component_clients = {c: httpx.Client() for c in COMPONENTS}
+    shared = HTTPClients(limits={"local": WORKERS})
+    limited = HTTPClients(limits={"local": 4})
+
+    scenarios = [
+        ("client per call", per_call),
+        ("client per component", lambda c: per_component_clients[c].post),
+        (f"shared pool (limit {WORKERS})", lambda c: shared.client("local").post),
+        ("shared pool (limit 4)", lambda c: limited.client("local").post),
+    ]
+
+    total = WORKERS * per_worker
+    print("\n" + "="*60)
+    print(f"SHARED HTTP POOL ({WORKERS} workers x {per_worker} calls, server latency {SERVER_LATENCY_S * 1000:.0f} ms)")
+    print("="*60)
+    print(f"{'scenario':<26} {'conns':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, get_client in scenarios:
+        before = server.connections
+        seconds, latencies = run(url, get_client, per_worker)
+        print(
+            f"{name:<26} {server.connections - before:>6} {total / seconds:>8.0f} "
+            f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f}"
+        )
+
+    for registry, label in ((shared, f"limit {WORKERS}"), (limited, "limit 4")):
+        stats = registry.stats()
+        print(f"\nregistry stats ({label}): pool {stats['pool']}")
+        print(f"  provider local: {stats['providers']['local']}")
+
+    for client in per_component_clients.values():
+        client.close()
+    shared.close()
+    limited.close()
+    server.shutdown()
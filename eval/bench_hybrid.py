@@ -0,0 +1,99 @@
+"""
+Benchmark - hybrid (BM25 shortlist) vs dense retrieval
+Per-query latency, embedding calls and hit rate for one session's memories.
+Embeddings are the local n-gram backend behind 40 ms of injected latency.
+
+Run: python -m eval.bench_hybrid
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import db.embeddings
+import db.vector_store
+import memory.retrieve
+from db.local_embeddings import HashedNgramEmbeddings
+
+
+SESSION = "bench-user"
+FACTS = [
+    ("My cat is named Whiskers", "What is my cat's name?", "whiskers"),
+    ("My favorite color is blue", "What's my favorite color?", "blue"),
+    ("I work as a software engineer at Google", "Where do I work?", "google"),
+    ("I live in Seattle near the lake", "Which city do I live in?", "seattle"),
+    ("My sister Maria is a doctor", "What does my sister do?", "doctor"),
+    ("I am allergic to peanuts", "Do I have any food allergies?", "peanuts"),
+]
+FILLER = (
+    "talked about weekend plans hiking trip movie night coffee morning routine "
+    "project deadline meeting notes gym workout recipe dinner travel airport"
+).split()
+
+
+class SlowEmbeddings(Embeddings):
+    """Local vectors, remote-like latency, call counter."""
+
+    def __init__(self, inner: Embeddings, base_ms: float = 40.0):
+        self.inner = inner
+        self.base_ms = base_ms
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.base_ms / 1000.0)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def run(mode: str, queries, embeddings: SlowEmbeddings) -> dict:
+    memory.retrieve.RETRIEVAL_MODE = mode
+    embeddings.calls = 0
+    hits, times = 0, []
+    for query, expected in queries:
+        start = time.perf_counter()
+        results = memory.retrieve.retrieve_memories(query, session_id=SESSION, k=3)
+        times.append((time.perf_counter() - start) * 1000)
+        hits += any(expected in m["text"].lower() for m in results)
+    return {
+        "p50_ms": float(np.median(times)),
+        "embed_calls": embeddings.calls,
+        "hit_rate": hits / len(queries),
+    }
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="hybrid_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    embeddings = SlowEmbeddings(HashedNgramEmbeddings())
+    db.embeddings._embeddings = embeddings
+
+    try:
+        rng = random.Random(0)
+        texts = [" ".join(rng.choices(FILLER, k=12)) for _ in range(2_000)]
+        texts += [fact for fact, _, _ in FACTS]
+        rng.shuffle(texts)
+        db.vector_store.add_documents(texts, [{"session_id": SESSION} for _ in texts])
+
+        queries = [(q, expected) for _, q, expected in FACTS] * 5
+
+        print("\n" + "="*60)
+        print("HYBRID vs DENSE RETRIEVAL (2006 memories, 40 ms embedding)")
+        print("="*60)
+        print(f"{'mode':>8} {'p50 ms':>10} {'embed calls':>12} {'hit rate':>10}")
+        for mode in ("dense", "hybrid"):
+            r = run(mode, queries, embeddings)
+            print(f"{mode:>8} {r['p50_ms']:>10.2f} {r['embed_calls']:>12} {r['hit_rate']:>10.2f}")
+        print(f"hybrid paths: {memory.retrieve.hybrid_stats}")
+        print("="*60 + "\n")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,63 @@
+"""
+Benchmark - local vs remote embedding throughput
+Measures texts/sec for the offline hashed n-gram backend against the
+remote path stubbed with realistic provider latency.
+
+Run: python -m eval.bench_local_embeddings
+"""
+
+import random
+import time
+
+from db.local_embeddings import HashedNgramEmbeddings
+from eval.bench_embedding_batcher import LatencyEmbedder
+
+
+WORDS = (
+    "user name is alex cat whiskers favorite color blue works software engineer "
+    "google lives seattle likes pizza hiking python weekend coffee morning"
+).split()
+
+
+def make_texts(n: int, seed: int = 0) -> list[str]:
+    """Summary-sized synthetic texts (10-40 words)."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(10, 40))) for _ in range(n)]
+
+
+def throughput(embed, texts: list[str], batch_size: int) -> float:
+    """texts/sec when embedding in chunks of batch_size."""
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embed(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    print("\n" + "="*60)
+    print("EMBEDDING THROUGHPUT: LOCAL vs REMOTE (stubbed)")
+    print("="*60)
+
+    texts = make_texts(2_000)
+    # ~120 ms round trip + 0.3 ms/text is typical for a hosted embedding API
+    remote = LatencyEmbedder(base_ms=120.0, per_text_ms=0.3, dim=1536)
+    local = HashedNgramEmbeddings(bulk_threshold=10**9)
+    local.fit(texts)
+
+    print(f"{'backend':<32} {'batch':>6} {'texts/sec':>12}")
+    for batch_size in (1, 64):
+        n = 200 if batch_size == 1 else len(texts)
+        r = throughput(remote.embed_documents, texts[:n], batch_size)
+        print(f"{'remote (stub)':<32} {batch_size:>6} {r:>12.1f}")
+    for batch_size in (1, 64, 2_000):
+        r = throughput(local.embed_documents, texts, batch_size)
+        print(f"{'local hashed n-gram':<32} {batch_size:>6} {r:>12.1f}")
+
+    bulk_texts = make_texts(100_000, seed=1)
+    single = HashedNgramEmbeddings(bulk_threshold=10**9)
+    pooled = HashedNgramEmbeddings(bulk_threshold=5_000)
+    r1 = throughput(single.embed_array, bulk_texts, len(bulk_texts))
+    r2 = throughput(pooled.embed_array, bulk_texts, len(bulk_texts))
+    print(f"{'local bulk, 1 process':<32} {len(bulk_texts):>6} {r1:>12.1f}")
+    print(f"{'local bulk, ' + str(pooled.max_workers) + ' processes':<32} {len(bulk_texts):>6} {r2:>12.1f}")
+    print("="*60 + "\n")
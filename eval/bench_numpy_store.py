@@ -0,0 +1,72 @@
+"""
+Benchmark - NumPy memory-mapped vector index
+Exact top-k search latency and reopen time at growing store sizes.
+
+Run: python -m eval.bench_numpy_store [max_rows]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from db.numpy_store import NumpyVectorStore
+
+
+DIM = 384
+
+
+def build(path: str, n: int, seed: int = 0) -> NumpyVectorStore:
+    """Fill a store with n random vectors, appended in chunks."""
+    rng = np.random.default_rng(seed)
+    store = NumpyVectorStore("bench", embeddings=None, persist_directory=path)
+    chunk = 50_000
+    for start in range(0, n, chunk):
+        size = min(chunk, n - start)
+        vecs = rng.standard_normal((size, DIM), dtype=np.float32)
+        texts = [f"memory {start + i}" for i in range(size)]
+        store.add_embeddings(texts, vecs, [{"session_id": f"user-{(start + i) % 100}"} for i in range(size)])
+    return store
+
+
+def time_search(store: NumpyVectorStore, queries: np.ndarray, k: int = 5) -> float:
+    """Median search latency in ms."""
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        store.similarity_search_by_vector_with_score(q.tolist(), k=k)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sizes = [n for n in (10_000, 100_000, 1_000_000, 3_000_000) if n <= max_rows]
+    queries = np.random.default_rng(1).standard_normal((50, DIM), dtype=np.float32)
+
+    print("\n" + "="*60)
+    print(f"NUMPY MMAP INDEX (dim={DIM}, k=5)")
+    print("="*60)
+    print(f"{'rows':>10} {'build s':>9} {'search ms':>10} {'reopen ms':>10}")
+
+    for n in sizes:
+        path = tempfile.mkdtemp(prefix="numpy_index_")
+        try:
+            start = time.perf_counter()
+            store = build(path, n)
+            build_s = time.perf_counter() - start
+            search_ms = time_search(store, queries)
+            store.close()
+
+            start = time.perf_counter()
+            reopened = NumpyVectorStore("bench", embeddings=None, persist_directory=path)
+            reopen_ms = (time.perf_counter() - start) * 1000
+            assert reopened.count() == n
+            reopened.close()
+            print(f"{n:>10} {build_s:>9.2f} {search_ms:>10.3f} {reopen_ms:>10.3f}")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    print("="*60 + "\n")
@@ -0,0 +1,71 @@
+"""
+Benchmark - session-partitioned memory index
+Per-query latency for one user's retrieval as the number of users grows,
+global collection vs per-session partitions (NumPy backend).
+
+Run: python -m eval.bench_partitions
+"""
+
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from db.numpy_store import NumpyVectorStore
+from db.partitions import PartitionManager
+
+
+DIM = 384
+MEMORIES_PER_USER = 200
+
+
+def median_ms(fn, repeats: int = 50) -> float:
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((50, DIM), dtype=np.float32)
+
+    print("\n" + "="*60)
+    print(f"PARTITIONED RETRIEVAL ({MEMORIES_PER_USER} memories/user, k=3)")
+    print("="*60)
+    print(f"{'users':>8} {'total rows':>11} {'global ms':>10} {'partitioned ms':>15}")
+
+    for n_users in (10, 100, 1_000):
+        path = tempfile.mkdtemp(prefix="partitions_")
+        try:
+            global_store = NumpyVectorStore("global", None, path)
+            partitions = PartitionManager(
+                "gpt_memory", lambda name: NumpyVectorStore(name, None, path), max_open=64
+            )
+            for u in range(n_users):
+                vecs = rng.standard_normal((MEMORIES_PER_USER, DIM), dtype=np.float32)
+                texts = [f"user {u} memory {i}" for i in range(MEMORIES_PER_USER)]
+                metas = [{"session_id": f"user-{u}"}] * MEMORIES_PER_USER
+                global_store.add_embeddings(texts, vecs, metas)
+                partitions.get(f"user-{u}").add_embeddings(texts, vecs, metas)
+
+            # Global store has to scan everyone, then filter to the caller
+            def global_query(i):
+                hits = global_store.similarity_search_by_vector_with_score(queries[i].tolist(), k=3 * n_users)
+                [d for d, _ in hits if d.metadata["session_id"] == "user-0"][:3]
+
+            def partitioned_query(i):
+                partitions.get("user-0").similarity_search_by_vector_with_score(queries[i].tolist(), k=3)
+
+            g = median_ms(global_query)
+            p = median_ms(partitioned_query)
+            print(f"{n_users:>8} {n_users * MEMORIES_PER_USER:>11} {g:>10.3f} {p:>15.3f}")
+            partitions.close_all()
+            global_store.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    print("="*60 + "\n")
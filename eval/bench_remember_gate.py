@@ -0,0 +1,165 @@
+"""
+Benchmark - "worth remembering?" gate
+Scores held-out labeled turns (none of them in the gate's SEED_EXAMPLES)
+and the eval scenario turns (eval/baseline_results_demo.json: statements
+are fact-bearing, questions are not) at several REMEMBER_GATE_THRESHOLD
+values: share of turns skipped, recall on fact-bearing turns, share of
+small talk skipped, and gate cost per turn.
+
+Then runs the held-out conversation through the full graph (build_graph)
+with the gate off and on: measured graph latency per turn, memories
+written (after dedup) and summarizer calls per 1,000 turns; every
+summarized turn would be one LLM call of SUMMARIZE_MS (modelled, the
+graph's summary is local).
+
+Uses the local embedder and the NumPy backend in a temp dir.
+
+Run: python -m eval.bench_remember_gate
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+os.environ["RETRIEVAL_CACHE"] = "0"
+
+import numpy as np
+
+import db.vector_store
+import memory.remember_gate
+from graph.pipeline import NODE_SECONDS, build_graph
+from memory.remember_gate import REMEMBER_GATE_THRESHOLD, SEED_EXAMPLES, RememberGate, train
+from memory.write_queue import get_write_queue
+
+
+THRESHOLDS = [0.2, 0.35, 0.5, 0.7]
+SUMMARIZE_MS = 400.0
+SCENARIOS = os.path.join(os.path.dirname(__file__), "baseline_results_demo.json")
+FACT_TURNS = [
+    "My partner's name is Sofia", "I recently adopted a parrot called Kiwi", "my husband is a chef",
+    "I'm a vegan, no animal products please", "I moved to Toronto last year", "I teach high school chemistry",
+    "My daughter turns five in June", "I'm severely allergic to bee stings", "I bought a new road bike yesterday",
+    "I've been playing the piano since I was 7", "I have a cat and two hamsters", "I'm colorblind",
+    "I'm doing a PhD in linguistics", "My favorite band is Radiohead", "I only drink decaf",
+    "Remember that my flight is on the 14th", "I'm a night owl, I work best after 10pm",
+    "My mom lives in Manila", "I'm trying to lose 5 kg before summer", "my car is an old Volvo",
+    "I work night shifts at a warehouse", "I support Arsenal", "I'm left-handed",
+    "My go-to breakfast is oatmeal with berries", "I'm renovating my kitchen this month",
+    "I have ADHD so keep answers structured", "my brother Tom is a pilot", "I hate long emails",
+    "I'm learning to code in Rust", "I live with three roommates", "I volunteer at an animal shelter on Sundays",
+    "I'm pregnant with my first child", "My team lead is called Priya", "I don't drink alcohol",
+    "I commute by train every day", "My laptop is a ThinkPad X1", "I got promoted to senior engineer",
+    "I'm Brazilian but live in Portugal", "I'm vegetarian except for fish", "We're expecting twins",
+]
+LOW_VALUE_TURNS = [
+    "hey", "hiya!", "thanks a lot", "ok cool", "good night", "great, thank you", "yep", "see you later",
+    "haha", "alright", "nice one", "cheers", "How do I boil an egg?", "What's the population of Canada?",
+    "Explain how vaccines work", "What's a good name for a goldfish?", "Convert 30 celsius to fahrenheit",
+    "Write a limerick about cheese", "How far is the moon?", "What rhymes with orange?",
+    "Can you give an example?", "Make it more formal", "Why?", "What does API stand for?",
+    "Tell me a fun fact", "How do you say thank you in Korean?", "Can you list the planets?",
+    "What's the best way to learn chess?", "Is coffee bad for you?", "Translate this to German: good luck",
+    "What's my dog's name?", "Do you know where I live?", "What did I say my job was?",
+    "Shorter please", "Try again", "What are some good podcasts?", "How does compound interest work?",
+    "Who painted the Mona Lisa?", "What's the plural of cactus?", "sounds good", "wow", "that's helpful",
+    "What is love?", "How do I center a div?", "Give me a motivational quote", "what else?",
+    "How long should I steep green tea?", "Which is bigger, a kilobyte or a kibibyte?", "ok got it thanks",
+    "What's trending today?", "Can you summarize that?", "Explain it like I'm five", "hello again",
+    "What's the time difference between London and NYC?", "Is Pluto a planet?", "more", "good point",
+    "How do I make pancakes?", "What's the square root of 144?", "Any tips for public speaking?",
+]
+
+
+def scenario_turns() -> list[tuple[str, int]]:
+    with open(SCENARIOS) as f:
+        questions = [r["question"] for r in json.load(f)["responses"]]
+    return [(q, 0 if q.rstrip().endswith("?") else 1) for q in questions]
+
+
+def score_table(gate: RememberGate, turns: list[tuple[str, int]], scenario: list[tuple[str, int]]) -> list[dict]:
+    start = time.perf_counter()
+    scores = np.array([gate.score(text) for text, _ in turns])
+    gate_us = (time.perf_counter() - start) / len(turns) * 1e6
+    labels = np.array([label for _, label in turns])
+    scenario_scores = np.array([gate.score(text) for text, label in scenario if label])
+    rows = []
+    for threshold in THRESHOLDS:
+        keep = scores >= threshold
+        rows.append({
+            "threshold": threshold,
+            "skipped": 1 - keep.mean(),
+            "recall": keep[labels == 1].mean(),
+            "small_talk_skipped": 1 - keep[labels == 0].mean(),
+            "scenario_recall": (scenario_scores >= threshold).mean(),
+            "missed": [text for (text, label), k in zip(turns, keep) if label and not k],
+            "gate_us": gate_us,
+        })
+    return rows
+
+
+def run_graph(turns: list[tuple[str, int]], gated: bool) -> dict:
+    memory.remember_gate.REMEMBER_GATE = gated
+    graph = build_graph()
+    queue = get_write_queue()
+    written = queue.enqueued
+    summarized = sum(NODE_SECONDS.labels("summarize_interaction").counts)
+    start = time.perf_counter()
+    for i, (text, _) in enumerate(turns):
+        graph.invoke({
+            "user_input": text, "retrieved_memories": [], "response": None, "summary": None,
+            "metadata": {"session_id": f"gate-{'on' if gated else 'off'}-{i % 5}", "timestamps": {}},
+        })
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    queue.flush()
+    return {
+        "graph_ms": elapsed_ms / len(turns),
+        "summarized": sum(NODE_SECONDS.labels("summarize_interaction").counts) - summarized,
+        "stored": queue.enqueued - written,
+    }
+
+
+if __name__ == "__main__":
+    turns = [(t, 1) for t in FACT_TURNS] + [(t, 0) for t in LOW_VALUE_TURNS]
+    seen = {text for text, _ in SEED_EXAMPLES}
+    assert not seen & {text for text, _ in turns}
+    start = time.perf_counter()
+    gate = RememberGate(train(SEED_EXAMPLES))
+    train_ms = (time.perf_counter() - start) * 1000
+    rows = score_table(gate, turns, scenario_turns())
+
+    path = tempfile.mkdtemp(prefix="remember_gate_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    memory.remember_gate._remember_gate = gate
+    try:
+        run_graph(turns[:5], gated=False)  # warm up the embedder and the store
+        off, on = run_graph(turns, gated=False), run_graph(turns, gated=True)
+    finally:
+        get_write_queue().close()
+        shutil.rmtree(path, ignore_errors=True)
+
+    print("\n" + "="*88)
+    print(f"REMEMBER GATE ({len(FACT_TURNS)} fact-bearing + {len(LOW_VALUE_TURNS)} low-value held-out turns, "
+          f"model trained in {train_ms:.0f} ms)")
+    print("="*88)
+    print(f"{'threshold':>9} {'skipped':>8} {'fact recall':>12} {'eval recall':>12} {'small talk skipped':>19} "
+          f"{'gate us':>8}")
+    for r in rows:
+        default = " <- default" if r["threshold"] == REMEMBER_GATE_THRESHOLD else ""
+        print(f"{r['threshold']:>9.2f} {r['skipped']:>8.1%} {r['recall']:>12.1%} {r['scenario_recall']:>12.1%} "
+              f"{r['small_talk_skipped']:>19.1%} {r['gate_us']:>8.1f}{default}")
+    for r in rows:
+        if r["threshold"] == REMEMBER_GATE_THRESHOLD and r["missed"]:
+            print(f"missed at default: {r['missed']}")
+
+    scale = 1000 / len(turns)
+    print(f"\nfull graph, {len(turns)} turns, threshold {REMEMBER_GATE_THRESHOLD}:")
+    print(f"{'gate':>6} {'graph ms/turn':>14} {'memories written/1k':>20} {'summarizer calls/1k':>20} "
+          f"{'summarize ms/turn':>18}")
+    for name, r in (("off", off), ("on", on)):
+        print(f"{name:>6} {r['graph_ms']:>14.2f} {r['stored'] * scale:>20.0f} {r['summarized'] * scale:>20.0f} "
+              f"{r['summarized'] / len(turns) * SUMMARIZE_MS:>18.0f}")
+    print("="*88 + "\n")
@@ -0,0 +1,147 @@
+"""
+Benchmark - retrieval result cache
+Replays chat sessions where users repeat or rephrase their last question
+(memory/retrieval_cache.py). Every turn retrieves, then stores its summary
+the way the graph does, so repeated questions write exact duplicates
+(metadata refresh) and new ones invalidate the session.
+
+Compares no cache, exact keys and semantic keys on retrieval latency and
+hit rate, and checks every exact-key hit against a fresh uncached search.
+
+Embeddings: the local vectorizer behind a simulated 40 ms provider and the
+in-memory content cache, like the remote setup. NumPy backend in a temp dir.
+
+Run: python -m eval.bench_retrieval_cache
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import db.embeddings
+import db.vector_store
+import memory.retrieval_cache
+import memory.retrieve
+from db.embedding_cache import CachedEmbeddings
+from db.local_embeddings import HashedNgramEmbeddings
+from memory.retrieval_cache import RetrievalCache
+from memory.retrieve import _search, retrieve_memories
+from memory.store import store_memory
+from memory.write_queue import get_write_queue
+
+
+PROVIDER_MS = 40.0
+SESSIONS = 6
+SEED_MEMORIES = 2000
+TURNS = 60
+SEMANTIC_SIMILARITY = 0.75  # the local n-gram vectors score paraphrases lower than provider models
+QUESTIONS = [
+    "what food do I like", "where do I live", "what is my job", "which sports do I play",
+    "what music do I listen to", "who is my best friend", "what languages do I speak",
+    "where did I travel last year", "what are my hobbies", "what car do I drive",
+    "what is my favourite book", "when is my birthday",
+]
+TOPICS = ["hiking", "jazz", "sourdough", "chess", "tomatoes", "rust", "marathons", "pottery", "sushi", "lisbon"]
+
+
+class ProviderEmbeddings(Embeddings):
+    """Local vectors with a remote provider's round-trip latency."""
+
+    def __init__(self, latency_ms: float = PROVIDER_MS):
+        self.inner = HashedNgramEmbeddings()
+        self.latency_ms = latency_ms
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self.inner.embed_query(text)
+
+
+def conversation(rng: random.Random) -> list[str]:
+    """40% exact repeats (case/spacing varies), 20% rephrasings, 40% new questions."""
+    turns = [rng.choice(QUESTIONS)]
+    for _ in range(TURNS - 1):
+        last, roll = turns[-1], rng.random()
+        if roll < 0.4:
+            turns.append(rng.choice([last, last.capitalize(), f"  {last}", last.upper()]))
+        elif roll < 0.6:
+            turns.append(rng.choice(["so ", "and ", "remind me, ", "tell me "]) + last.lower().strip())
+        else:
+            turns.append(rng.choice(QUESTIONS))
+    return turns
+
+
+def seed(session_id: str, rng: random.Random):
+    texts = [
+        f"User said they {rng.choice(['like', 'tried', 'hate', 'talked about'])} {rng.choice(TOPICS)} on day {i}"
+        for i in range(SEED_MEMORIES)
+    ]
+    for start in range(0, len(texts), 500):
+        chunk = texts[start:start + 500]
+        db.vector_store.add_documents(chunk, [{"session_id": session_id, "type": "summary"}] * len(chunk))
+
+
+def replay(mode: str) -> dict:
+    cache = None
+    if mode != "off":
+        cache = RetrievalCache(semantic=mode == "semantic", similarity=SEMANTIC_SIMILARITY)
+    memory.retrieval_cache._retrieval_cache = cache
+    memory.retrieve.RETRIEVAL_CACHE = cache is not None
+
+    latencies, stale = [], 0
+    for s in range(SESSIONS):
+        session_id = f"{mode}-{s}"
+        rng = random.Random(s)
+        seed(session_id, rng)
+        get_write_queue().flush()
+        for question in conversation(rng):
+            hits = cache.hits if cache is not None else 0
+            start = time.perf_counter()
+            memories = retrieve_memories(question, session_id=session_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if cache is not None and cache.hits > hits:
+                fresh = [doc.page_content for doc in _search(question, 3, session_id)]
+                stale += fresh != [m["text"] for m in memories]
+            store_memory(f"User said: {question}", session_id=session_id)
+    get_write_queue().flush()
+
+    stats = cache.stats() if cache is not None else {"hits": 0, "semantic_hits": 0, "hit_rate": 0.0}
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "mean_ms": float(np.mean(latencies)),
+        "hits": stats["hits"],
+        "semantic_hits": stats["semantic_hits"],
+        "hit_rate": stats["hit_rate"],
+        "stale": stale,
+    }
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="retrieval_cache_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    db.embeddings._embeddings = CachedEmbeddings(ProviderEmbeddings(), "bench", cache_path=None)
+
+    try:
+        rows = [(mode, replay(mode)) for mode in ("off", "exact", "semantic")]
+        print("\n" + "="*72)
+        print(f"RETRIEVAL CACHE ({SESSIONS} sessions x {TURNS} turns, {SEED_MEMORIES} memories each, "
+              f"{PROVIDER_MS:.0f} ms embeddings)")
+        print("="*72)
+        print(f"{'mode':<10} {'p50 ms':>8} {'mean ms':>8} {'hits':>6} {'semantic':>9} {'hit rate':>9} {'stale':>6}")
+        for mode, r in rows:
+            print(f"{mode:<10} {r['p50_ms']:>8.2f} {r['mean_ms']:>8.2f} {r['hits']:>6} {r['semantic_hits']:>9} "
+                  f"{r['hit_rate']:>9.1%} {r['stale']:>6}")
+        print("="*72 + "\n")
+    finally:
+        get_write_queue().close()
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,100 @@
+"""
+Benchmark - binary snapshot / restore
+Snapshot size and create/restore time for N memories, compared with the
+native persisted store directory. Chroma is used as the native store when
+chromadb is installed; otherwise the NumPy store directory.
+
+Run: python -m eval.bench_snapshot [n_memories]   (default 1,000,000)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from db import snapshot
+from db.numpy_store import NumpyVectorStore
+from db.vector_store import create_backend
+
+
+DIM = 384
+BATCH = 50_000
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def have_chroma() -> bool:
+    try:
+        import chromadb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    backend = "chroma" if have_chroma() else "numpy"
+    rng = np.random.default_rng(0)
+    work = tempfile.mkdtemp(prefix="snapshot_")
+    native_dir = os.path.join(work, "native")
+    try:
+        store = create_backend(backend, "gpt_memory", native_dir, with_embeddings=False)
+        for start in range(0, n, BATCH):
+            count = min(BATCH, n - start)
+            store.add_embeddings(
+                [f"User said: memory number {start + i} about topic {(start + i) % 97}" for i in range(count)],
+                rng.standard_normal((count, DIM), dtype=np.float32),
+                [
+                    {"type": "summary", "session_id": f"user-{(start + i) % 1000}", "ts": 1.7e9 + start + i}
+                    for i in range(count)
+                ],
+                [f"mem-{start + i}" for i in range(count)],
+            )
+        store.close()
+        query = rng.standard_normal(DIM, dtype=np.float32).tolist()
+
+        def native_cold_start():
+            s = create_backend(backend, "gpt_memory", native_dir, with_embeddings=False)
+            s.similarity_search_by_vector_with_score(query, k=5)
+            return s
+
+        _, native_open_s = timed(native_cold_start)
+
+        results = []
+        for compress in (False, True):
+            snap_dir = os.path.join(work, f"snap_{'zstd' if compress else 'raw'}")
+            _, create_s = timed(lambda: snapshot.create_snapshot(snap_dir, backend, native_dir, compress_vectors=compress))
+            restore_dir = os.path.join(work, f"restored_{'zstd' if compress else 'raw'}")
+            stats, restore_s = timed(lambda: snapshot.restore_snapshot(snap_dir, "numpy", restore_dir, lexical=False))
+            _, verify_s = timed(lambda: snapshot.verify_snapshot(snap_dir))
+            mmap_s = None
+            if not compress:
+                # Cold start straight from the snapshot: mmap the vector block and scan it
+                entry = snapshot.read_manifest(snap_dir)["collections"][0]
+                _, mmap_s = timed(lambda: snapshot.open_vectors(snap_dir, entry) @ np.asarray(query, dtype=np.float32))
+            results.append((compress, dir_bytes(snap_dir), create_s, verify_s, restore_s, mmap_s))
+            shutil.rmtree(restore_dir)
+
+        print("\n" + "="*60)
+        print(f"SNAPSHOT / RESTORE ({n:,} memories x {DIM} dims, native = {backend})")
+        print("="*60)
+        print(f"native store dir: {dir_bytes(native_dir) / 2**20:,.0f} MB, cold open + first query {native_open_s:.2f}s")
+        print(f"\n{'vectors':>8} {'size MB':>9} {'create s':>9} {'verify s':>9} {'restore s':>10} {'mmap+scan s':>12}")
+        for compress, size, create_s, verify_s, restore_s, mmap_s in results:
+            print(
+                f"{'zstd' if compress else 'raw':>8} {size / 2**20:>9,.0f} {create_s:>9.2f} {verify_s:>9.2f} "
+                f"{restore_s:>10.2f} {'-' if mmap_s is None else f'{mmap_s:.2f}':>12}"
+            )
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,119 @@
+"""
+Benchmark - API cold start
+Import time of `api.routes` (python -X importtime breakdown, fresh
+interpreter per run) and time to the first /chat response, appended to
+eval/startup_history.jsonl so regressions show up over time.
+
+Run: python -m eval.bench_startup [--runs 5] [--repo PATH] [--no-record]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY_PATH = os.path.join(HERE, "startup_history.jsonl")
+
+FIRST_CHAT = """
+import time
+start = time.perf_counter()
+import api.routes
+from fastapi.testclient import TestClient
+imported = time.perf_counter()
+with TestClient(api.routes.app) as client:
+    client.post("/chat", json={"message": "hello", "user_id": "bench"})
+    first = time.perf_counter()
+print(f"{(imported - start) * 1000:.1f} {(first - start) * 1000:.1f}")
+"""
+
+
+def importtime(repo: str, module: str = "api.routes") -> tuple[float, dict[str, float]]:
+    """(total ms, self ms per top-level package) for one fresh import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=repo, capture_output=True, text=True, check=True,
+    )
+    per_package: dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        per_package[name.split(".")[0]] += int(self_us) / 1000
+        if name == module:
+            total = int(cumulative_us) / 1000
+    return total, per_package
+
+
+def first_chat(repo: str) -> tuple[float, float]:
+    """(import ms, import + startup + first /chat ms) on the offline backends."""
+    env = dict(
+        os.environ, VECTOR_BACKEND="numpy", EMBEDDINGS_BACKEND="local", API_WARMUP="0",
+        PYTHONPATH=repo,
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the bench's memories out of the real store
+        script = f"import db.vector_store as vs; vs.NUMPY_PERSIST_DIR = {tmp!r}\n" + FIRST_CHAT
+        proc = subprocess.run([sys.executable, "-c", script], cwd=repo, env=env,
+                              capture_output=True, text=True, check=True)
+    imported, first = proc.stdout.split()[-2:]
+    return float(imported), float(first)
+
+
+def git_commit(repo: str) -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True)
+    dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                           capture_output=True, text=True).stdout.strip()
+    return (proc.stdout.strip() or "unknown") + ("+dirty" if dirty else "")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--repo", default=os.path.dirname(HERE))
+    parser.add_argument("--no-record", action="store_true")
+    args = parser.parse_args()
+
+    totals, packages = [], defaultdict(list)
+    for _ in range(args.runs):
+        total, per_package = importtime(args.repo)
+        totals.append(total)
+        for name, ms in per_package.items():
+            packages[name].append(ms)
+    chats = [first_chat(args.repo) for _ in range(args.runs)]
+
+    import_ms = float(np.median(totals))
+    wall_import_ms = float(np.median([imported for imported, _ in chats]))
+    first_chat_ms = float(np.median([first for _, first in chats]))
+    top = sorted(((float(np.median(v)), k) for k, v in packages.items()), reverse=True)[:10]
+
+    print("\n" + "="*60)
+    print(f"API COLD START (median of {args.runs} fresh interpreters)")
+    print("="*60)
+    print(f"import api.routes (-X importtime): {import_ms:8.1f} ms")
+    print(f"import api.routes (wall):          {wall_import_ms:8.1f} ms")
+    print(f"import + first /chat (wall):       {first_chat_ms:8.1f} ms")
+    print("\nslowest packages (self time, ms):")
+    for ms, name in top:
+        print(f"  {name:<32} {ms:8.1f}")
+
+    if not args.no_record:
+        record = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(args.repo),
+            "import_ms": round(import_ms, 1),
+            "wall_import_ms": round(wall_import_ms, 1),
+            "first_chat_ms": round(first_chat_ms, 1),
+            "top": {name: round(ms, 1) for ms, name in top},
+        }
+        with open(HISTORY_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\nrecorded in {os.path.relpath(HISTORY_PATH)}")
@@ -0,0 +1,140 @@
+"""
+Benchmark - /chat/stream time-to-first-token
+Drives the ASGI app directly (no server needed) with a latency-injecting
+fake LLM: first token after FIRST_TOKEN_MS, then one token every
+TOKEN_MS. Reports TTFT vs. total latency for /chat and /chat/stream, plus
+a slow client (token coalescing) and a client that disconnects mid-answer.
+
+Uses the NumPy backend in a temp dir and the local embedder.
+
+Run: python -m eval.bench_streaming
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+
+import numpy as np
+
+import db.vector_store
+import graph.pipeline
+import memory.writeback
+from api.routes import app
+
+
+FIRST_TOKEN_MS = 300.0
+TOKEN_MS = 25.0
+TOKENS = 40
+RUNS = 10
+
+
+def fake_llm(state):
+    """Streaming LLM stand-in: fixed time to first token, then a steady token rate."""
+    time.sleep(FIRST_TOKEN_MS / 1000)
+    for i in range(TOKENS):
+        if i:
+            time.sleep(TOKEN_MS / 1000)
+        yield f"tok{i} "
+
+
+async def request(path: str, message: str, user_id: str, client_delay_s: float = 0.0, disconnect_after: int = 0):
+    """POST to the app; returns [(seconds, event name, data)] as the client received them."""
+    body = json.dumps({"message": message, "user_id": user_id}).encode()
+    received: list[tuple[float, str, dict]] = []
+    disconnected = asyncio.Event()
+    request_sent = False
+    tokens = 0
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal tokens
+        if message["type"] != "http.response.body" or not message.get("body"):
+            return
+        now = time.perf_counter() - start
+        if path == "/chat":
+            received.append((now, "response", json.loads(message["body"])))
+            return
+        for frame in message["body"].decode().strip().split("\n\n"):
+            event, data = (line.split(": ", 1)[1] for line in frame.split("\n"))
+            received.append((now, event, json.loads(data)))
+            tokens += event == "token"
+        if disconnect_after and tokens >= disconnect_after:
+            disconnected.set()
+        await asyncio.sleep(client_delay_s)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"content-type", b"application/json"), (b"host", b"bench")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return received
+
+
+def first(received, event: str) -> float:
+    return next(t for t, name, _ in received if name == event) * 1000
+
+
+async def main():
+    chat, stream = [], []
+    for i in range(RUNS):
+        received = await request("/chat", f"I like hiking, run {i}", f"chat-{i}")
+        chat.append(received[-1][0] * 1000)
+        received = await request("/chat/stream", f"I like hiking, run {i}", f"stream-{i}")
+        stream.append((first(received, "retrieval"), first(received, "token"), first(received, "done"),
+                       first(received, "memory")))
+    stream = np.array(stream)
+
+    print("\n" + "="*64)
+    print(f"STREAMING CHAT (fake LLM: {FIRST_TOKEN_MS:.0f} ms to first token, {TOKENS} tokens x {TOKEN_MS:.0f} ms)")
+    print("="*64)
+    print(f"{'endpoint':<14} {'first byte':>11} {'TTFT':>9} {'response':>10} {'memory':>9}   (p50 ms)")
+    print(f"{'/chat':<14} {np.median(chat):>11.0f} {np.median(chat):>9.0f} {np.median(chat):>10.0f} {'-':>9}")
+    p50 = np.median(stream, axis=0)
+    print(f"{'/chat/stream':<14} {p50[0]:>11.0f} {p50[1]:>9.0f} {p50[2]:>10.0f} {p50[3]:>9.0f}")
+
+    received = await request("/chat/stream", "I like chess", "slow-client", client_delay_s=0.2)
+    token_frames = [data["text"] for _, name, data in received if name == "token"]
+    print(f"\nslow client (200 ms per frame): {TOKENS} tokens in {len(token_frames)} frames, "
+          f"all received: {''.join(token_frames).split() == [f'tok{i}' for i in range(TOKENS)]}")
+
+    scheduler = memory.writeback.get_writeback()
+    before = scheduler.submitted
+    start = time.perf_counter()
+    received = await request("/chat/stream", "I like pottery", "leaver", disconnect_after=5)
+    elapsed = (time.perf_counter() - start) * 1000
+    await asyncio.sleep((FIRST_TOKEN_MS + TOKENS * TOKEN_MS) / 1000)  # let the generator thread finish
+    print(f"disconnect after 5 tokens: stream closed after {elapsed:.0f} ms, "
+          f"events {[name for _, name, _ in received][:3]}..., write-backs submitted: {scheduler.submitted - before}")
+    await memory.writeback.shutdown_writeback()
+    print("="*64 + "\n")
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="streaming_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    graph.pipeline.generate_tokens = fake_llm
+    try:
+        asyncio.run(main())
+    finally:
+        from memory.compaction import shutdown_compaction
+        from memory.write_queue import shutdown_write_queue
+
+        shutdown_compaction()
+        shutdown_write_queue()
+        shutil.rmtree(path, ignore_errors=True)
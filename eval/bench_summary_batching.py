@@ -0,0 +1,184 @@
+"""
+Benchmark - batched summarization
+LLM calls, prompt/completion tokens and memory delay per 1,000 turns:
+- per turn: summarize_conversation for every turn
+- batched: the summary scheduler (memory/summary_scheduler.py) at several
+  SUMMARY_BATCH_TURNS / SUMMARY_BATCH_INTERVAL_S settings, with its rolling
+  session summary
+
+The LLM is a stub client behind memory.summarize (it lists the user's
+statements back, "none" for small talk), so the real prompts are built and
+parsed; tokens use the context packer's estimator. Sessions are replayed on
+a virtual clock: turns arrive with exponential think times and half the
+sessions end explicitly (end_session), the rest are left to the timer.
+"delay" is how long a turn waits until its batch is summarized.
+
+Run: python -m eval.bench_summary_batching
+"""
+
+import random
+import re
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+import memory.summarize
+import memory.summary_scheduler
+from memory.context import estimate_tokens
+from memory.summarize import summarize_conversation, summarize_turns
+from memory.summary_scheduler import SummaryScheduler
+
+
+TURNS = 1000
+SESSIONS = 60
+THINK_S = 30.0
+CONFIGS = [(4, 120.0), (8, 120.0), (16, 120.0), (8, 30.0), (32, 600.0)]
+SMALL_TALK = ["ok thanks", "haha nice", "cool", "good morning", "sure, go on"]
+FACTS = ["my name is {}", "I live in {}", "I work at {}", "my favorite food is {}", "I am allergic to {}",
+         "my sister is called {}", "I am learning {}", "my dog is a {}"]
+VALUES = ["Alex", "Lisbon", "Oslo", "a bakery", "sushi", "peanuts", "Maya", "Spanish", "beagle", "Google"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class StubLLM:
+    """chat.completions.create that lists the user's statements back and counts tokens."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: list, **kwargs):
+        prompt = messages[-1]["content"]
+        facts = [f"- User said {s}" for s in re.findall(r"^User said: (.*)$", prompt, re.MULTILINE)
+                 if s not in SMALL_TALK]
+        if "Session summary:" in prompt:
+            known = prompt.split("Known so far:\n", 1)[1].split("\n\nLatest turns:", 1)[0]
+            known = [] if known == "(nothing yet)" else known.splitlines()
+            summary = (known + facts)[-8:]
+            content = "\n".join(facts or ["none"]) + "\n\nSession summary:\n" + "\n".join(summary)
+        else:
+            content = "\n".join(facts or ["none"])
+        self.calls += 1
+        self.prompt_tokens += estimate_tokens(prompt)
+        self.completion_tokens += estimate_tokens(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def workload(seed: int = 0) -> list[tuple[float, str, str, bool]]:
+    """(time, session_id, message, last turn of the session) in arrival order."""
+    rng = random.Random(seed)
+    sizes = np.random.default_rng(seed)
+    lengths = sizes.multinomial(TURNS, sizes.dirichlet(np.ones(SESSIONS)))
+    events = []
+    for s, length in enumerate(lengths):
+        t = rng.uniform(0, 3600)
+        for i in range(length):
+            t += rng.expovariate(1 / THINK_S)
+            if rng.random() < 0.4:
+                message = rng.choice(FACTS).format(rng.choice(VALUES))
+            else:
+                message = rng.choice(SMALL_TALK)
+            events.append((t, f"session-{s}", message, i == length - 1))
+    return sorted(events)
+
+
+class ReplayScheduler(SummaryScheduler):
+    """The scheduler on a virtual clock: the bench fires the timer, no thread."""
+
+    def __init__(self, clock: Clock, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        self.waiting: dict[str, deque] = {}
+        self.delays: list[float] = []
+
+    def _ensure_started(self):
+        pass
+
+    def add(self, session_id: str, *args, **kwargs):
+        self.waiting.setdefault(session_id, deque()).append(self.clock.now)
+        super().add(session_id, *args, **kwargs)
+
+    def flush_session(self, session_id: str) -> bool:
+        session = self._sessions.get(session_id)
+        pending = len(session.turns) if session is not None else 0
+        flushed = super().flush_session(session_id)
+        if flushed:
+            for _ in range(pending):
+                self.delays.append(self.clock.now - self.waiting[session_id].popleft())
+        return flushed
+
+    def tick(self):
+        due, _ = self._due(self.clock.now)
+        for session_id in due:
+            self.flush_session(session_id)
+
+
+def per_turn(events: list) -> dict:
+    llm = StubLLM()
+    memory.summarize.get_client = lambda: llm
+    stored = sum(bool(summarize_conversation(message, "Noted.").strip("- ").lower() != "none")
+                 for _, _, message, _ in events)
+    return {"llm": llm, "stored": stored, "delay_s": 0.0, "delay_p95_s": 0.0}
+
+
+def batched(events: list, batch_turns: int, interval_s: float) -> dict:
+    llm = StubLLM()
+    memory.summarize.get_client = lambda: llm
+    clock = Clock()
+    memory.summary_scheduler.time = SimpleNamespace(monotonic=clock.monotonic)
+    stored = []
+    scheduler = ReplayScheduler(
+        clock, batch_turns=batch_turns, interval_s=interval_s,
+        summarizer=summarize_turns, writer=lambda session_id, memories, metadata: stored.append(memories),
+    )
+    ends = random.Random(1)
+    for t, session_id, message, last in events:
+        clock.now = t
+        scheduler.tick()
+        scheduler.add(session_id, message, "Noted.", {"session_id": session_id})
+        if last and ends.random() < 0.5:
+            scheduler.end_session(session_id)
+    clock.now = events[-1][0] + interval_s
+    scheduler.tick()
+    scheduler.flush()
+    assert not scheduler.stats()["buffered_turns"]
+    return {
+        "llm": llm,
+        "stored": len(stored),
+        "delay_s": float(np.mean(scheduler.delays)),
+        "delay_p95_s": float(np.percentile(scheduler.delays, 95)),
+    }
+
+
+if __name__ == "__main__":
+    events = workload()
+    real_time = memory.summary_scheduler.time
+    try:
+        rows = [("per turn", per_turn(events))]
+        rows += [(f"N={n}, T={t:.0f}s", batched(events, n, t)) for n, t in CONFIGS]
+    finally:
+        memory.summary_scheduler.time = real_time
+
+    scale = 1000 / len(events)
+    print("\n" + "="*92)
+    print(f"BATCHED SUMMARIZATION ({len(events)} turns, {SESSIONS} sessions, {THINK_S:.0f} s mean think time, "
+          f"stub LLM)")
+    print("="*92)
+    print(f"{'mode':<16} {'calls/1k':>9} {'prompt tok/1k':>14} {'completion tok/1k':>18} {'memories/1k':>12} "
+          f"{'delay s':>8} {'p95 s':>7}")
+    for mode, r in rows:
+        llm = r["llm"]
+        print(f"{mode:<16} {llm.calls * scale:>9.0f} {llm.prompt_tokens * scale:>14.0f} "
+              f"{llm.completion_tokens * scale:>18.0f} {r['stored'] * scale:>12.0f} {r['delay_s']:>8.1f} "
+              f"{r['delay_p95_s']:>7.1f}")
+    print("="*92 + "\n")
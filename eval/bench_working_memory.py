@@ -0,0 +1,129 @@
+"""
+Benchmark - hot working memory
+Multi-turn conversations through the full graph (build_graph), with and
+without the per-session working memory (memory/working_memory.py):
+- new: sessions that start empty (everything they store stays hot)
+- returning: sessions with SEED_MEMORIES older memories in the store
+
+Reports vector store reads per turn (from the vector_search metric),
+retrieval node latency, how lookups were answered, and whether the
+retrieved memories match a lookup with working memory off.
+
+Uses the local embedder and the NumPy backend in a temp dir; the
+retrieval cache and working sets are off so every turn really retrieves,
+and the remember gate is off so every turn is stored.
+
+Run: python -m eval.bench_working_memory
+"""
+
+import os
+import random
+import shutil
+import tempfile
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+os.environ["RETRIEVAL_CACHE"] = "0"
+os.environ["WORKING_SET"] = "0"
+os.environ["REMEMBER_GATE"] = "0"
+
+import db.vector_store
+import memory.retrieve
+import memory.store
+import memory.working_memory
+from db.metrics import EXTERNAL_CALL_SECONDS
+from graph.pipeline import NODE_SECONDS, build_graph
+from memory.retrieve import _search
+from memory.working_memory import WorkingMemory
+from memory.write_queue import get_write_queue
+
+
+SESSIONS = 10
+TURNS = 16
+SEED_MEMORIES = 300
+TOPICS = ["hiking", "jazz", "sourdough", "chess", "tomatoes", "rust", "marathons", "pottery", "sushi", "lisbon",
+          "cycling", "opera", "kimchi", "go", "roses", "haskell"]
+PATTERNS = ["I have been into {} lately", "what did I say about {}?", "remind me what I think of {}",
+            "I tried {} again this weekend", "should I do more {}?"]
+
+
+def read_count() -> int:
+    return sum(EXTERNAL_CALL_SECONDS.labels("vector_search").counts)
+
+
+def retrieve_seconds() -> tuple[float, int]:
+    child = NODE_SECONDS.labels("retrieve_memory")
+    return child.sum, sum(child.counts)
+
+
+def set_working_memory(enabled: bool):
+    memory.retrieve.WORKING_MEMORY = enabled
+    memory.store.WORKING_MEMORY = enabled
+
+
+def run(kind: str, hot: bool) -> dict:
+    memory.working_memory._working_memory = WorkingMemory()
+    set_working_memory(hot)
+    graph = build_graph()
+    reads, agree, checked = 0, 0, 0
+    seconds, lookups = retrieve_seconds()
+
+    for s in range(SESSIONS):
+        session_id = f"{kind}-{'hot' if hot else 'cold'}-{s}"
+        rng = random.Random(s)
+        if kind == "returning":
+            texts = [f"User said: {rng.choice(PATTERNS).format(rng.choice(TOPICS))} (day {i})"
+                     for i in range(SEED_MEMORIES)]
+            db.vector_store.add_documents(texts, [{"session_id": session_id, "type": "summary"}] * len(texts))
+        for turn in range(TURNS):
+            message = rng.choice(PATTERNS).format(rng.choice(TOPICS[:6]))
+            if hot:
+                # What the store alone returns at this point, for comparison
+                set_working_memory(False)
+                expected = [doc.page_content for doc in _search(message, 3, session_id)]
+                set_working_memory(True)
+            before = read_count()
+            state = graph.invoke({
+                "user_input": message, "retrieved_memories": [], "response": None, "summary": None,
+                "metadata": {"session_id": session_id, "timestamps": {}},
+            })
+            reads += read_count() - before
+            if hot:
+                agree += expected == [m["text"] for m in state["retrieved_memories"]]
+                checked += 1
+
+    total_seconds, total_lookups = retrieve_seconds()
+    stats = memory.working_memory._working_memory.stats()
+    return {
+        "reads_per_turn": reads / (SESSIONS * TURNS),
+        "retrieve_ms": (total_seconds - seconds) / (total_lookups - lookups) * 1000,
+        "served": stats["served"],
+        "merged": stats["merged"],
+        "hot_share": stats["hot_result_share"],
+        "agreement": agree / checked if checked else float("nan"),
+    }
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="working_memory_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    try:
+        rows = [(kind, hot, run(kind, hot)) for kind in ("new", "returning") for hot in (False, True)]
+        get_write_queue().flush()
+        print("\n" + "="*80)
+        print(f"HOT WORKING MEMORY ({SESSIONS} sessions x {TURNS} turns, returning sessions have "
+              f"{SEED_MEMORIES} stored memories)")
+        print("="*80)
+        print(f"{'sessions':<10} {'working mem':>11} {'reads/turn':>11} {'retrieve ms':>12} {'served':>7} "
+              f"{'merged':>7} {'hot share':>10} {'agreement':>10}")
+        for kind, hot, r in rows:
+            served = f"{r['served']}" if hot else "-"
+            merged = f"{r['merged']}" if hot else "-"
+            share = f"{r['hot_share']:.0%}" if hot else "-"
+            agreement = f"{r['agreement']:.0%}" if hot else "-"
+            print(f"{kind:<10} {'on' if hot else 'off':>11} {r['reads_per_turn']:>11.2f} {r['retrieve_ms']:>12.2f} "
+                  f"{served:>7} {merged:>7} {share:>10} {agreement:>10}")
+        print("="*80 + "\n")
+    finally:
+        get_write_queue().close()
+        shutil.rmtree(path, ignore_errors=True)
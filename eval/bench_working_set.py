@@ -0,0 +1,131 @@
+"""
+Benchmark - per-session working sets
+Per-query retrieval latency for a session served from the vector store
+(working sets off), on its first lookup (bulk load + search) and once its
+working set is warm (memory/working_set.py), for several session sizes.
+Then a conversation mix: each turn writes a memory and the next lookup
+embeds it into the warm set. Warm results are checked against the store's
+(same memories, same order; near-equal scores can swap in float32).
+
+The NumPy backend is itself an in-process matmul, so each size also runs
+with a simulated STORE_RTT_MS round trip on every store read (search and
+bulk load), standing in for a store behind a client/server hop.
+
+Uses the local embedder and the NumPy backend in a temp dir; the
+retrieval cache and working memory are off so every lookup really searches.
+
+Run: python -m eval.bench_working_set
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDINGS_BACKEND", "local")
+os.environ["RETRIEVAL_CACHE"] = "0"
+os.environ["WORKING_MEMORY"] = "0"
+
+import numpy as np
+
+import db.vector_store
+import memory.retrieve
+import memory.store
+import memory.working_set
+from memory.retrieve import retrieve_memories
+from memory.store import store_memory
+from memory.working_set import WorkingSets
+from memory.write_queue import get_write_queue
+
+
+SIZES = [100, 1000, 4000]
+STORE_RTT_MS = 5.0
+QUERIES = 200
+SEARCH = memory.retrieve.similarity_search_with_score
+LOAD = db.vector_store.load_documents
+TOPICS = ["hiking", "jazz", "sourdough", "chess", "tomatoes", "rust", "marathons", "pottery", "sushi", "lisbon"]
+
+
+def with_rtt(fn, rtt_ms: float):
+    def call(*args, **kwargs):
+        time.sleep(rtt_ms / 1000)
+        return fn(*args, **kwargs)
+    return call
+
+
+def set_store_rtt(rtt_ms: float):
+    memory.retrieve.similarity_search_with_score = with_rtt(SEARCH, rtt_ms) if rtt_ms else SEARCH
+    db.vector_store.load_documents = with_rtt(LOAD, rtt_ms) if rtt_ms else LOAD
+
+
+def set_working_sets(enabled: bool):
+    memory.retrieve.WORKING_SET = enabled
+    memory.store.WORKING_SET = enabled
+    memory.working_set._working_sets = WorkingSets()
+
+
+def seed(session_id: str, n: int, rng: random.Random):
+    texts = [f"User said they {rng.choice(['like', 'tried', 'hate'])} {rng.choice(TOPICS)} on day {i}" for i in range(n)]
+    for start in range(0, n, 1000):
+        chunk = texts[start:start + 1000]
+        db.vector_store.add_documents(chunk, [{"session_id": session_id, "type": "summary"}] * len(chunk))
+
+
+def timed_lookups(session_id: str, rng: random.Random, count: int, write: bool = False) -> tuple[list[float], int]:
+    """Latencies, and how many results differed from the store's (checked when working sets are on)."""
+    latencies, mismatches = [], 0
+    for i in range(count):
+        query = f"what do I think about {rng.choice(TOPICS)} {i}?"
+        start = time.perf_counter()
+        memories = retrieve_memories(query, session_id=session_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if memory.retrieve.WORKING_SET:
+            memory.retrieve.WORKING_SET = False
+            expected = retrieve_memories(query, session_id=session_id)
+            mismatches += [m["text"] for m in memories] != [m["text"] for m in expected]
+            memory.retrieve.WORKING_SET = True
+        if write:
+            store_memory(f"User said: {query} (turn {i})", session_id=session_id)
+    return latencies, mismatches
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="working_set_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    rng = random.Random(0)
+    try:
+        rows, mismatches, checked = [], 0, 0
+        for n in SIZES:
+            session_id = f"user-{n}"
+            seed(session_id, n, rng)
+            get_write_queue().flush()
+            for rtt in (0.0, STORE_RTT_MS):
+                set_store_rtt(rtt)
+                set_working_sets(False)
+                store, _ = timed_lookups(session_id, rng, QUERIES)
+                set_working_sets(True)
+                first, _ = timed_lookups(session_id, rng, 1)
+                warm, bad = timed_lookups(session_id, rng, QUERIES)
+                mb = memory.working_set.get_working_sets().stats()["bytes"] / 1e6
+                chat, bad_chat = timed_lookups(session_id, rng, QUERIES // 4, write=True)
+                mismatches += bad + bad_chat
+                checked += len(warm) + len(chat)
+                rows.append((n, rtt, np.median(store), first[0], np.median(warm), np.median(chat), mb))
+                set_store_rtt(0.0)
+                get_write_queue().flush()
+
+        print("\n" + "="*80)
+        print(f"WORKING SETS (p50 ms per lookup, {QUERIES} lookups, k=3)")
+        print("="*80)
+        print(f"{'memories':>9} {'store rtt':>10} {'cold':>8} {'first (load)':>13} {'warm':>8} {'warm+writes':>12} "
+              f"{'speedup':>8} {'set MB':>7}")
+        for n, rtt, store, first, warm, chat, mb in rows:
+            print(f"{n:>9} {rtt:>8.0f}ms {store:>8.3f} {first:>13.3f} {warm:>8.3f} {chat:>12.3f} "
+                  f"{store / warm:>7.1f}x {mb:>7.1f}")
+        print(f"\nwarm lookups whose results differed from the store's: {mismatches} of {checked}")
+        print("="*80 + "\n")
+    finally:
+        get_write_queue().close()
+        shutil.rmtree(path, ignore_errors=True)
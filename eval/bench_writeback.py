@@ -0,0 +1,91 @@
+"""
+Benchmark - post-response write-back
+End-to-end ChatService.process_message latency with summarize + store in
+the request (one graph) vs. in the background write-back stage
+(memory/writeback.py). The summarizer is simulated as a blocking LLM call
+and embeddings as a 40 ms provider; each client is one session sending
+turns with a short think time in between.
+
+Uses the NumPy backend in a temp dir.
+
+Run: python -m eval.bench_writeback
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ["REMEMBER_GATE"] = "0"  # every turn goes through summarize + store
+
+import numpy as np
+
+import db.embeddings
+import db.vector_store
+import graph.pipeline
+import memory.writeback
+from api.service import ChatService
+from eval.bench_embedding_batcher import LatencyEmbedder
+from memory.write_queue import get_write_queue
+
+
+SUMMARIZE_MS = 400.0
+THINK_S = 0.5
+TURNS = 6
+TOPICS = ["hiking", "jazz", "sourdough", "chess", "tomatoes", "rust", "marathons", "pottery"]
+
+
+def slow_summarize(state):
+    """Stand-in for the summarization LLM call."""
+    time.sleep(SUMMARIZE_MS / 1000)
+    return {"summary": f"User said: {state['user_input']}"}
+
+
+async def session(service: ChatService, user_id: str, latencies: list[float]):
+    for turn in range(TURNS):
+        topic = TOPICS[(hash(user_id) + turn) % len(TOPICS)]
+        start = time.perf_counter()
+        await service.process_message(f"{user_id} turn {turn}: I have been into {topic} lately", user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(THINK_S)
+
+
+async def run(background: bool, clients: int) -> tuple[list[float], float, dict]:
+    memory.writeback._writeback = None
+    service = ChatService(background_writeback=background)
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(session(service, f"user-{background:d}-{clients}-{c}", latencies) for c in range(clients)))
+    scheduler = memory.writeback.get_writeback()
+    await memory.writeback.shutdown_writeback()
+    get_write_queue().flush()
+    return latencies, time.perf_counter() - start, scheduler.stats()
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="writeback_")
+    db.vector_store.NUMPY_PERSIST_DIR = path
+    db.embeddings._embeddings = LatencyEmbedder(base_ms=40.0, per_text_ms=0.0, dim=64)
+    graph.pipeline.summarize_interaction = slow_summarize
+
+    try:
+        print("\n" + "="*72)
+        print(f"END-TO-END CHAT LATENCY ({SUMMARIZE_MS:.0f} ms summarizer, 40 ms embeddings, {TURNS} turns/session)")
+        print("="*72)
+        print(f"{'clients':>8} {'mode':>12} {'p50 ms':>9} {'p99 ms':>9} {'written':>8} {'wb lag p50':>11} {'wall s':>7}")
+        for clients in (1, 8, 32):
+            for background in (False, True):
+                latencies, wall, stats = asyncio.run(run(background, clients))
+                written = stats["completed"] if background else clients * TURNS
+                lag = f"{stats['lag_p50_ms']:.0f} ms" if background else "-"
+                print(
+                    f"{clients:>8} {'background' if background else 'inline':>12} "
+                    f"{np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 99):>9.1f} "
+                    f"{written:>8} {lag:>11} {wall:>7.1f}"
+                )
+        print("="*72 + "\n")
+    finally:
+        get_write_queue().close()
+        shutil.rmtree(path, ignore_errors=True)
@@ -1,14 +1,52 @@
 """
 LangGraph pipeline for memory-augmented chat.
 Orchestrates: ingest → retrieve → generate → summarize → store
+
+generate fits the retrieved memories into the prompt's token budget
+(memory/context.py) before streaming CHAT_MODEL's answer (a fixed
+placeholder when OPENAI_API_KEY is unset). With SUMMARY_BATCH on,
+summarize hands the turn to the batch scheduler (memory/summary_scheduler.py)
+and store only runs for per-turn summaries. Turns the remember gate
+(memory/remember_gate.py) scores as small talk skip both and end after
+generate.
+
+build_graph() runs it all in one pass. The API uses the split form:
+build_response_graph() up to generate, then build_writeback_graph() for
+summarize → store as a post-response stage (memory/writeback.py).
+
+I/O nodes come as sync/async pairs, so graph.invoke and graph.ainvoke both
+work; ainvoke never blocks the event loop on embedding or vector store calls.
+generate_response emits each token as a custom stream event, so
+graph.astream(..., stream_mode=["updates", "custom"]) sees them as they
+are produced (used by /chat/stream). Every node is timed into
+gptmemory_node_duration_seconds (db/metrics.py).
 """
 
-from langgraph.graph import StateGraph, END
+import os
+import re
 from datetime import datetime
+from typing import Iterator
+
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, END
 
+from db.http_clients import get_openai_client
+from db.metrics import counter, histogram, instrument
 from graph.state import MemoryState
-from memory.store import store_memory
-from memory.retrieve import retrieve_memories
+from memory.context import pack_memories
+from memory.store import astore_memory, store_memory
+from memory.remember_gate import worth_remembering
+from memory.retrieve import aretrieve_memories, retrieve_memories
+from memory.summary_scheduler import SUMMARY_BATCH, get_summary_scheduler
+from prompts.system_prompts import get_system_prompt
+
+
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
+PLACEHOLDER_RESPONSE = "This is a placeholder response."
+
+NODE_SECONDS = histogram("gptmemory_node_duration_seconds", "Graph node latency", ("node",))
+NODE_ERRORS = counter("gptmemory_node_errors_total", "Graph node exceptions", ("node",))
 
 
 def ingest_input(state: MemoryState):
@@ -33,15 +71,62 @@ def retrieve_memory(state: MemoryState):
     return {"retrieved_memories": memories}
 
 
+async def aretrieve_memory(state: MemoryState):
+    """Async retrieve_memory."""
+    memories = await aretrieve_memories(
+        query=state["user_input"],
+        session_id=state["metadata"]["session_id"],
+    )
+    return {"retrieved_memories": memories}
+
+
+def build_prompt(state: MemoryState) -> str:
+    """System prompt for the turn: static prefix, packed memories, user message."""
+    packed = pack_memories(state["retrieved_memories"])
+    return get_system_prompt(state["user_input"], packed.text)
+
+
+def generate_tokens(state: MemoryState) -> Iterator[str]:
+    """
+    Yields the assistant response as the chat model streams it.
+    Without OPENAI_API_KEY it yields PLACEHOLDER_RESPONSE instead, so the graph runs offline.
+    """
+    prompt = build_prompt(state)
+    if not os.getenv("OPENAI_API_KEY"):
+        yield from re.findall(r"\S+\s*", PLACEHOLDER_RESPONSE)
+        return
+    stream = get_openai_client().chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[{"role": "system", "content": prompt}],
+        stream=True,
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
 def generate_response(state: MemoryState):
-    """Generates the assistant response. LLM logic abstracted."""
-    # TODO: Add actual LLM call with retrieved memories
-    response = "This is a placeholder response."
-    return {"response": response}
+    """Generates the assistant response, forwarding tokens to stream_mode="custom" consumers."""
+    write = get_stream_writer()
+    tokens = []
+    for token in generate_tokens(state):
+        tokens.append(token)
+        write({"token": token})
+    return {"response": "".join(tokens)}
+
+
+def route_after_generate(state: MemoryState) -> str:
+    """Conditional edge: summarize + store only turns worth remembering, the rest go to END."""
+    return "summarize_interaction" if worth_remembering(state["user_input"]) else END
 
 
 def summarize_interaction(state: MemoryState):
     """Produces a compact summary suitable for long-term memory."""
+    session_id = state["metadata"].get("session_id")
+    if SUMMARY_BATCH and session_id:
+        # Summarized with the session's next turns; store_memory has nothing to do
+        get_summary_scheduler().add(session_id, state["user_input"], state.get("response"), state["metadata"])
+        return {"summary": None}
     summary = f"User said: {state['user_input']}"
     return {"summary": summary}
 
@@ -52,33 +137,87 @@ def store_memory_node(state: MemoryState):
     session_id = state["metadata"].get("session_id")
 
     if not summary or not session_id:
-        return {}
+        return {"memory_id": None}
 
-    store_memory(
+    memory_id = store_memory(
         session_id=session_id,
         summary=summary,
         metadata=state["metadata"],
     )
 
-    return {}
+    return {"memory_id": memory_id or None}
 
 
-def build_graph():
-    """Build and compile the LangGraph state machine."""
-    graph = StateGraph(MemoryState)
+async def astore_memory_node(state: MemoryState):
+    """Async store_memory_node."""
+    summary = state.get("summary")
+    session_id = state["metadata"].get("session_id")
+
+    if not summary or not session_id:
+        return {"memory_id": None}
+
+    memory_id = await astore_memory(
+        session_id=session_id,
+        summary=summary,
+        metadata=state["metadata"],
+    )
+
+    return {"memory_id": memory_id or None}
+
+
+def _node(name: str, func, afunc=None):
+    """A node callable (sync/async pair if afunc is given), timed per call."""
+    func = instrument(func, NODE_SECONDS, NODE_ERRORS, name)
+    if afunc is None:
+        return func
+    return RunnableLambda(func, afunc=instrument(afunc, NODE_SECONDS, NODE_ERRORS, name))
 
-    graph.add_node("ingest_input", ingest_input)
-    graph.add_node("retrieve_memory", retrieve_memory)
-    graph.add_node("generate_response", generate_response)
-    graph.add_node("summarize_interaction", summarize_interaction)
-    graph.add_node("store_memory", store_memory_node)
+
+def _add_response_nodes(graph: StateGraph):
+    graph.add_node("ingest_input", _node("ingest_input", ingest_input))
+    graph.add_node("retrieve_memory", _node("retrieve_memory", retrieve_memory, aretrieve_memory))
+    graph.add_node("generate_response", _node("generate_response", generate_response))
 
     graph.set_entry_point("ingest_input")
 
     graph.add_edge("ingest_input", "retrieve_memory")
     graph.add_edge("retrieve_memory", "generate_response")
-    graph.add_edge("generate_response", "summarize_interaction")
+
+
+def _add_writeback_nodes(graph: StateGraph):
+    graph.add_node("summarize_interaction", _node("summarize_interaction", summarize_interaction))
+    graph.add_node("store_memory", _node("store_memory", store_memory_node, astore_memory_node))
+
     graph.add_edge("summarize_interaction", "store_memory")
     graph.add_edge("store_memory", END)
 
-    return graph.compile()
\ No newline at end of file
+
+def build_graph():
+    """Build and compile the LangGraph state machine."""
+    graph = StateGraph(MemoryState)
+
+    _add_response_nodes(graph)
+    _add_writeback_nodes(graph)
+    graph.add_conditional_edges("generate_response", route_after_generate, ["summarize_interaction", END])
+
+    return graph.compile()
+
+
+def build_response_graph():
+    """ingest → retrieve → generate: everything the user waits for."""
+    graph = StateGraph(MemoryState)
+
+    _add_response_nodes(graph)
+    graph.add_edge("generate_response", END)
+
+    return graph.compile()
+
+
+def build_writeback_graph():
+    """summarize → store, run on the response graph's final state after replying (gated like build_graph)."""
+    graph = StateGraph(MemoryState)
+
+    _add_writeback_nodes(graph)
+    graph.set_conditional_entry_point(route_after_generate, ["summarize_interaction", END])
+
+    return graph.compile()
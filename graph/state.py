@@ -17,6 +17,10 @@ class MemoryState(TypedDict):
     user_input: str
    # memories retrieved from storage
     retrieved_memories : List[Dict[str,Any]]
+    ## assistant reply (must be declared here or LangGraph drops the update)
+    response : Optional[str]
     ## Conversational summary(used for memory write-back)
     summary : Optional[str]
+    ## id of the memory store_memory wrote this turn (None: nothing was stored)
+    memory_id : Optional[str]
     metadata : Metadata
\ No newline at end of file
@@ -0,0 +1,405 @@
+"""
+Background compaction and retention for per-session memory partitions.
+
+One pass over a session:
+1. access stats recorded on retrieval hits are folded into metadata
+   (access_count, last_access); only the hit records are read unless a
+   TTL, consolidation or quota step is due
+2. TTL: memories older than MEMORY_TTL_DAYS that were not retrieved within
+   that window are dropped (0 = keep forever)
+3. consolidation: once a session holds more than CONSOLIDATE_AT memories,
+   its oldest fine-grained summaries are merged CONSOLIDATE_GROUP at a time
+   through the summarizer hook (memory/summarize.consolidate_summaries)
+4. quota: anything still above MEMORY_QUOTA is evicted lowest retention
+   score first - (1 + access_count), halved every RECENCY_HALF_LIFE_DAYS
+   since the memory was last used
+
+Merged summaries are written before their sources are deleted, so a crash
+mid-pass can duplicate but never lose a memory. Sessions are the open
+partitions (db/partitions.py) plus any session with buffered access stats;
+compaction needs PARTITION_BY_SESSION.
+
+The background thread runs a pass every COMPACTION_INTERVAL_S, touches at
+most COMPACTION_MAX_SESSIONS sessions and COMPACTION_MAX_MERGES summarizer
+calls per pass, and pauses between sessions so request traffic keeps the
+store locks most of the time.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from db.metadata_index import to_epoch
+from db.metrics import callback
+from db.vector_store import (
+    PARTITION_BY_SESSION,
+    add_documents,
+    delete_documents,
+    get_documents,
+    get_partitions,
+    get_store,
+    list_documents,
+    update_metadata,
+)
+from memory.dedup import content_id, get_deduplicator
+from memory.retrieval_cache import invalidate_session
+from memory.working_memory import get_working_memory
+from memory.working_set import get_working_sets
+
+
+logger = logging.getLogger(__name__)
+
+COMPACTION = os.getenv("COMPACTION", "1") == "1"
+MEMORY_QUOTA = int(os.getenv("MEMORY_QUOTA", "2000"))
+MEMORY_TTL_DAYS = float(os.getenv("MEMORY_TTL_DAYS", "0"))
+CONSOLIDATE_AT = int(os.getenv("CONSOLIDATE_AT", "1000"))
+CONSOLIDATE_GROUP = int(os.getenv("CONSOLIDATE_GROUP", "20"))
+CONSOLIDATE_MIN_AGE_S = float(os.getenv("CONSOLIDATE_MIN_AGE_S", str(7 * 86400)))
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("RECENCY_HALF_LIFE_DAYS", "30"))
+COMPACTION_INTERVAL_S = float(os.getenv("COMPACTION_INTERVAL_S", "300"))
+COMPACTION_MAX_SESSIONS = int(os.getenv("COMPACTION_MAX_SESSIONS", "8"))
+COMPACTION_MAX_MERGES = int(os.getenv("COMPACTION_MAX_MERGES", "4"))
+COMPACTION_PAUSE_S = float(os.getenv("COMPACTION_PAUSE_S", "0.05"))
+MAX_TRACKED_SESSIONS = int(os.getenv("COMPACTION_MAX_TRACKED_SESSIONS", "4096"))
+
+
+def created_at(metadata: dict) -> float:
+    """Epoch seconds of a memory's timestamp (now if missing or unparsable)."""
+    value = metadata.get("ts")
+    if value is None:
+        value = to_epoch(metadata.get("timestamp"))
+    return time.time() if value is None else float(value)
+
+
+def retention_score(metadata: dict, now: float, half_life_days: float = RECENCY_HALF_LIFE_DAYS) -> float:
+    """LFU count decayed by time since last use; lowest is evicted first."""
+    last_used = max(float(metadata.get("last_access", 0.0)), created_at(metadata))
+    age_days = max(0.0, now - last_used) / 86400
+    return (1 + int(metadata.get("access_count", 0))) * 0.5 ** (age_days / half_life_days)
+
+
+def _default_summarizer(summaries: list[str]) -> str:
+    # Imported on first consolidation only
+    from memory.summarize import consolidate_summaries
+    return consolidate_summaries(summaries)
+
+
+class AccessTracker:
+    """
+    Retrieval hit counts per session, buffered in memory until the next pass.
+    At most max_sessions sessions are tracked; past that the counts of the
+    session hit least recently are dropped (they only feed retention scores).
+    """
+
+    def __init__(self, max_sessions: int = MAX_TRACKED_SESSIONS):
+        self.max_sessions = max_sessions
+        self._hits: dict[str, dict[str, list]] = {}  # insertion-ordered: least recently hit first
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def record(self, session_id: str, ids: list[str]):
+        now = time.time()
+        with self._lock:
+            session = self._hits.pop(session_id, None)
+            if session is None:
+                session = {}
+                while len(self._hits) >= self.max_sessions:
+                    oldest = next(iter(self._hits))
+                    del self._hits[oldest]
+                    self.dropped += 1
+                    logger.warning("Dropping buffered access stats for %s (tracker full)", oldest)
+            self._hits[session_id] = session
+            for doc_id in ids:
+                entry = session.get(doc_id)
+                if entry is None:
+                    session[doc_id] = [1, now]
+                else:
+                    entry[0] += 1
+                    entry[1] = now
+
+    def has_pending(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._hits
+
+    def sessions(self) -> list[str]:
+        """Sessions with hits waiting for a pass."""
+        with self._lock:
+            return list(self._hits)
+
+    def drain(self, session_id: str) -> dict[str, list]:
+        """{doc_id: [hits, last_access]} since the last drain."""
+        with self._lock:
+            return self._hits.pop(session_id, {})
+
+
+class Compactor:
+    """Applies retention policy to sessions, inline or from a background thread."""
+
+    def __init__(
+        self,
+        quota: int = MEMORY_QUOTA,
+        ttl_days: float = MEMORY_TTL_DAYS,
+        consolidate_at: int = CONSOLIDATE_AT,
+        group_size: int = CONSOLIDATE_GROUP,
+        min_age_s: float = CONSOLIDATE_MIN_AGE_S,
+        summarizer: Optional[Callable[[list[str]], str]] = None,
+        interval_s: float = COMPACTION_INTERVAL_S,
+        max_sessions: int = COMPACTION_MAX_SESSIONS,
+        max_merges: int = COMPACTION_MAX_MERGES,
+        pause_s: float = COMPACTION_PAUSE_S,
+    ):
+        self.quota = quota
+        self.ttl_days = ttl_days
+        self.consolidate_at = consolidate_at
+        self.group_size = group_size
+        self.min_age_s = min_age_s
+        self.summarizer = summarizer or _default_summarizer
+        self.interval_s = interval_s
+        self.max_sessions = max_sessions
+        self.max_merges = max_merges
+        self.pause_s = pause_s
+        self.tracker = AccessTracker()
+        self._last_compacted: dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.passes = 0
+        self.expired = 0
+        self.consolidated = 0
+        self.merges = 0
+        self.evicted = 0
+        self.last_pass: dict = {}
+
+    def record_access(self, session_id: Optional[str], ids: list[str]):
+        """Count retrieval hits (cheap; persisted on the next pass)."""
+        if session_id and ids:
+            self.tracker.record(session_id, ids)
+
+    def needs_work(self, session_id: str) -> bool:
+        if self.tracker.has_pending(session_id) or self.ttl_days > 0:
+            return True
+        return get_store(session_id).count() > min(self.quota, self.consolidate_at)
+
+    def compact_session(self, session_id: str, max_merges: Optional[int] = None) -> dict:
+        """Apply access stats, TTL, consolidation and quota to one session."""
+        now = time.time()
+        merge_budget = self.max_merges if max_merges is None else max_merges
+        hits = self.tracker.drain(session_id)
+        before = get_store(session_id).count()
+        # Only TTL, consolidation and quota need the whole partition; hits alone read just their records
+        if self.ttl_days > 0 or before > min(self.quota, self.consolidate_at):
+            records = list_documents(session_id)
+        else:
+            records = get_documents(list(hits), session_id=session_id) if hits else []
+
+        # 1. Fold buffered retrieval hits into metadata
+        patch_ids, patches = [], []
+        for rec in records:
+            if rec["id"] in hits:
+                count, last = hits[rec["id"]]
+                meta = rec["metadata"]
+                meta["access_count"] = int(meta.get("access_count", 0)) + count
+                meta["last_access"] = max(float(meta.get("last_access", 0.0)), last)
+                patch_ids.append(rec["id"])
+                patches.append({"access_count": meta["access_count"], "last_access": meta["last_access"]})
+        if patch_ids:
+            update_metadata(patch_ids, patches, session_id=session_id)
+
+        # 2. TTL
+        drop: list[str] = []
+        live = records
+        expired = set()
+        if self.ttl_days > 0:
+            cutoff = now - self.ttl_days * 86400
+            expired = {
+                rec["id"] for rec in records
+                if created_at(rec["metadata"]) < cutoff
+                and float(rec["metadata"].get("last_access", 0.0)) < cutoff
+            }
+            drop += expired
+            live = [rec for rec in records if rec["id"] not in expired]
+            self.expired += len(expired)
+
+        # 3. Consolidate the oldest fine-grained summaries
+        consolidated = 0
+        if len(live) > self.consolidate_at:
+            candidates = sorted(
+                (
+                    rec for rec in live
+                    if rec["metadata"].get("type") == "summary"
+                    and created_at(rec["metadata"]) < now - self.min_age_s
+                ),
+                key=lambda rec: created_at(rec["metadata"]),
+            )
+            merged_ids: set[str] = set()
+            new_records = []
+            while (
+                merge_budget > 0 and len(candidates) >= 2
+                and len(live) - len(merged_ids) + len(new_records) > self.consolidate_at
+            ):
+                group, candidates = candidates[:self.group_size], candidates[self.group_size:]
+                try:
+                    text = self.summarizer([rec["text"] for rec in group])
+                except Exception:
+                    logger.exception("Consolidating %d memories for %s failed", len(group), session_id)
+                    break
+                merge_budget -= 1
+                newest = max(group, key=lambda rec: created_at(rec["metadata"]))
+                metadata = {
+                    "type": "consolidated",
+                    "session_id": session_id,
+                    "timestamp": newest["metadata"].get("timestamp"),
+                    "ts": created_at(newest["metadata"]),
+                    "consolidated_from": len(group),
+                    "access_count": sum(int(rec["metadata"].get("access_count", 0)) for rec in group),
+                    "last_access": max(float(rec["metadata"].get("last_access", 0.0)) for rec in group),
+                }
+                doc_id = content_id(session_id, text)
+                # Write the merged memory before its sources are deleted
+                add_documents([text], [metadata], ids=[doc_id])
+                get_deduplicator().register(session_id, doc_id, text)
+                new_records.append({"id": doc_id, "text": text, "metadata": metadata})
+                merged_ids.update(rec["id"] for rec in group)
+                self.merges += 1
+            if merged_ids:
+                consolidated = len(merged_ids)
+                drop += merged_ids
+                live = [rec for rec in live if rec["id"] not in merged_ids] + new_records
+                self.consolidated += consolidated
+
+        # 4. Quota: evict the lowest retention scores
+        evicted = 0
+        if len(live) > self.quota:
+            ranked = sorted(live, key=lambda rec: retention_score(rec["metadata"], now))
+            victims = [rec["id"] for rec in ranked[:len(live) - self.quota]]
+            drop += victims
+            evicted = len(victims)
+            self.evicted += evicted
+
+        if drop:
+            delete_documents(drop, session_id=session_id)
+            get_deduplicator().forget(session_id, drop)
+        if drop:
+            get_working_memory().drop(session_id)
+            get_working_sets().drop(session_id)
+        else:
+            # Nothing reloads: keep loaded copies' access stats in step with the store
+            for doc_id, patch in zip(patch_ids, patches):
+                get_working_memory().touch(session_id, doc_id, patch)
+                get_working_sets().touch(session_id, doc_id, patch)
+        if drop or patch_ids:
+            invalidate_session(session_id, patches=None if drop else dict(zip(patch_ids, patches)))
+
+        self._last_compacted[session_id] = now
+        return {
+            "session_id": session_id,
+            "before": before,
+            "after": get_store(session_id).count(),
+            "expired": len(expired),
+            "consolidated": consolidated,
+            "evicted": evicted,
+        }
+
+    def run_pass(self, sessions: Optional[list[str]] = None) -> dict:
+        """
+        Compact up to max_sessions sessions, least recently compacted first.
+        Defaults to the currently open partitions plus any session with
+        buffered access stats (its partition may have been closed since).
+        """
+        start = time.perf_counter()
+        if sessions is None:
+            sessions = get_partitions().open_sessions() if PARTITION_BY_SESSION else []
+            if PARTITION_BY_SESSION:
+                sessions = list(dict.fromkeys(sessions + self.tracker.sessions()))
+        sessions = sorted(sessions, key=lambda s: self._last_compacted.get(s, 0.0))
+        reports = []
+        merges_left = self.max_merges
+        for session_id in sessions:
+            if len(reports) >= self.max_sessions or self._stop.is_set():
+                break
+            if not self.needs_work(session_id):
+                continue
+            merges_before = self.merges
+            reports.append(self.compact_session(session_id, max_merges=merges_left))
+            merges_left -= self.merges - merges_before
+            if self.pause_s:
+                time.sleep(self.pause_s)
+
+        self.passes += 1
+        self.last_pass = {
+            "sessions": len(reports),
+            "rows_before": sum(r["before"] for r in reports),
+            "rows_after": sum(r["after"] for r in reports),
+            "expired": sum(r["expired"] for r in reports),
+            "consolidated": sum(r["consolidated"] for r in reports),
+            "evicted": sum(r["evicted"] for r in reports),
+            "ms": (time.perf_counter() - start) * 1000,
+        }
+        if reports:
+            logger.info("Compaction pass: %s", self.last_pass)
+        return self.last_pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.run_pass()
+            except Exception:
+                logger.exception("Compaction pass failed")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="memory-compaction", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "passes": self.passes,
+            "expired": self.expired,
+            "consolidated": self.consolidated,
+            "merges": self.merges,
+            "evicted": self.evicted,
+            "access_stats_dropped": self.tracker.dropped,
+            "last_pass": self.last_pass,
+        }
+
+
+_compactor: Optional[Compactor] = None
+
+
+def get_compactor() -> Compactor:
+    """Initialize or return the process-wide compactor."""
+    global _compactor
+
+    if _compactor is None:
+        _compactor = Compactor()
+
+    return _compactor
+
+
+def start_compaction():
+    """Start background passes (FastAPI startup) if COMPACTION is on."""
+    if COMPACTION and PARTITION_BY_SESSION:
+        get_compactor().start()
+
+
+def shutdown_compaction(timeout: Optional[float] = None):
+    if _compactor is not None:
+        _compactor.stop(timeout)
+
+
+def _removed() -> dict:
+    if _compactor is None:
+        return {}
+    return {"expired": _compactor.expired, "consolidated": _compactor.consolidated, "evicted": _compactor.evicted}
+
+
+callback("gptmemory_compaction_removed_total", "Memories removed by compaction", _removed,
+         kind="counter", labelnames=("reason",))
@@ -0,0 +1,131 @@
+"""
+Context packer: fits retrieved memories into the prompt's token budget.
+
+pack_memories() turns retrieve_memories() output into the memory block of
+the system prompt (prompts/system_prompts.py):
+
+- memories scoring below CONTEXT_MIN_SCORE, or below CONTEXT_RELATIVE_SCORE
+  times the best score, are dropped (memories without a score, e.g.
+  confident lexical hits, are kept); every retrieval layer scores by
+  cosine similarity, so both cutoffs mean the same wherever a hit came
+  from, and the relative one adapts to embedders whose similarities sit
+  on different scales
+- a memory whose words mostly repeat an already packed, higher scored one
+  (word-set Jaccard >= CONTEXT_MAX_OVERLAP) is dropped
+- the rest are taken best first while they fit CONTEXT_TOKEN_BUDGET,
+  counted with a local estimator (~4 characters per token, no tokenizer)
+- packed memories are listed oldest first, so a turn's block usually
+  extends the previous turn's and the provider's prefix cache keeps hitting
+"""
+
+import os
+import re
+import threading
+from typing import Optional
+
+from db.metrics import callback
+
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "512"))
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", "0.1"))
+CONTEXT_RELATIVE_SCORE = float(os.getenv("CONTEXT_RELATIVE_SCORE", "0.5"))
+CONTEXT_MAX_OVERLAP = float(os.getenv("CONTEXT_MAX_OVERLAP", "0.8"))
+HEADER = "=== Relevant Past Information ==="
+FOOTER = "=" * len(HEADER)
+LINE_OVERHEAD_TOKENS = 3  # "12. " and the newline
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+
+# Retrieved memories by what the packer did with them
+context_stats = {"packed": 0, "below_threshold": 0, "redundant": 0, "over_budget": 0}
+_context_stats_lock = threading.Lock()  # packing runs on executor threads
+
+
+def _context_outcomes() -> dict:
+    with _context_stats_lock:
+        return dict(context_stats)
+
+
+callback("gptmemory_context_memories_total", "Retrieved memories by packing outcome", _context_outcomes,
+         kind="counter", labelnames=("outcome",))
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count: one per punctuation mark, one per 4 characters of a word."""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_RE.findall(text))
+
+
+def _overlap(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _age(memory: dict) -> tuple:
+    metadata = memory.get("metadata") or {}
+    ts = metadata.get("ts")
+    return (0, float(ts)) if isinstance(ts, (int, float)) else (1, 0.0)
+
+
+class PackedContext:
+    __slots__ = ("text", "memories", "tokens", "below_threshold", "redundant", "over_budget")
+
+    def __init__(self, text: str, memories: list[dict], tokens: int,
+                 below_threshold: int, redundant: int, over_budget: int):
+        self.text = text
+        self.memories = memories
+        self.tokens = tokens
+        self.below_threshold = below_threshold
+        self.redundant = redundant
+        self.over_budget = over_budget
+
+
+def pack_memories(
+    memories: list[dict],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    min_score: float = CONTEXT_MIN_SCORE,
+    relative_score: float = CONTEXT_RELATIVE_SCORE,
+    max_overlap: float = CONTEXT_MAX_OVERLAP,
+) -> PackedContext:
+    """Pick and order memories for the prompt. `text` is "" if none made it."""
+    below_threshold = redundant = over_budget = 0
+    scores = [m["score"] for m in memories if m.get("score") is not None]
+    if scores:
+        min_score = max(min_score, relative_score * max(scores))
+    candidates = []
+    for position, memory in enumerate(memories):
+        score: Optional[float] = memory.get("score")
+        if score is not None and score < min_score:
+            below_threshold += 1
+            continue
+        candidates.append((-score if score is not None else float("-inf"), position, memory))
+    candidates.sort(key=lambda c: (c[0], c[1]))
+
+    remaining = budget - estimate_tokens(HEADER) - estimate_tokens(FOOTER)
+    chosen, words = [], []
+    for _, _, memory in candidates:
+        text = memory["text"].strip()
+        vocabulary = frozenset(_WORD_RE.findall(text.casefold()))
+        if any(_overlap(vocabulary, seen) >= max_overlap for seen in words):
+            redundant += 1
+            continue
+        cost = estimate_tokens(text) + LINE_OVERHEAD_TOKENS
+        if cost > remaining:
+            over_budget += 1
+            continue
+        remaining -= cost
+        chosen.append(memory)
+        words.append(vocabulary)
+
+    with _context_stats_lock:
+        context_stats["packed"] += len(chosen)
+        context_stats["below_threshold"] += below_threshold
+        context_stats["redundant"] += redundant
+        context_stats["over_budget"] += over_budget
+    if not chosen:
+        return PackedContext("", [], 0, below_threshold, redundant, over_budget)
+
+    chosen.sort(key=_age)
+    lines = [HEADER] + [f"{i}. {m['text'].strip()}" for i, m in enumerate(chosen, 1)] + [FOOTER]
+    text = "\n".join(lines) + "\n"
+    return PackedContext(text, chosen, estimate_tokens(text), below_threshold, redundant, over_budget)
@@ -0,0 +1,231 @@
+"""
+Write-time duplicate suppression for memories.
+
+- Exact duplicates: memory IDs are content-addressed (xxh3-128 of session +
+  normalized text), so a repeated summary or a retried write maps to the
+  same ID and the stores skip it.
+- Near duplicates: a 64-bit SimHash per text, indexed per session with
+  banded LSH (4 bands x 16 bits), finds a candidate within MAX_HAMMING bits.
+  SimHash distance alone doesn't separate a reworded memory from a
+  different fact, so the candidate is confirmed by Jaccard similarity of
+  the two texts' word and word-pair sets: at 1.0 the wording is the same
+  and only the timestamp is refreshed; at MIN_JACCARD or above the stored
+  text is replaced by the newer one under the original ID; below it both
+  are kept. A changed detail in a short fact is not a near duplicate
+  ("favorite color is blue" -> "red": 14 bits, Jaccard 0.69), and in a long
+  summary it comes close (one city changed in a 30-word summary: 5 bits,
+  0.90), so raise MIN_JACCARD rather than MAX_HAMMING to merge more.
+
+The near-duplicate index lives in memory (per-session LRU, capped per
+session) and covers writes made since the process started; exact
+duplicates are caught across restarts through the content IDs.
+"""
+
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+import xxhash
+
+from db.metrics import callback
+from db.partitions import PartitionManager
+
+
+DEDUP = os.getenv("DEDUP", "1") == "1"
+MAX_HAMMING = int(os.getenv("DEDUP_MAX_HAMMING", "3"))
+MIN_JACCARD = float(os.getenv("DEDUP_MIN_JACCARD", "0.9"))
+MAX_SIGNATURES_PER_SESSION = 4096
+BANDS = 4
+BAND_BITS = 64 // BANDS
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Casefold and collapse whitespace."""
+    return " ".join(text.casefold().split())
+
+
+def content_id(session_id: Optional[str], text: str) -> str:
+    """Deterministic memory ID for a session's text."""
+    return xxhash.xxh3_128_hexdigest(f"{session_id or ''}\x00{normalize(text)}".encode("utf-8"))
+
+
+def features(text: str) -> np.ndarray:
+    """64-bit hashes of the text's word unigrams and bigrams."""
+    words = _WORD_RE.findall(text.casefold())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return np.fromiter((xxhash.xxh64_intdigest(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def simhash(text: str, hashes: Optional[np.ndarray] = None) -> int:
+    """64-bit SimHash over word unigrams and bigrams."""
+    hashes = features(text) if hashes is None else hashes
+    if not len(hashes):
+        return 0
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(np.packbits((votes > 0)[::-1].astype(np.uint8)).view(">u8")[0])
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard similarity of two sorted, de-duplicated feature sets."""
+    if not len(a) and not len(b):
+        return 1.0
+    shared = len(np.intersect1d(a, b, assume_unique=True))
+    return shared / (len(a) + len(b) - shared)
+
+
+def _bands(signature: int) -> list[tuple[int, int]]:
+    mask = (1 << BAND_BITS) - 1
+    return [(band, (signature >> (band * BAND_BITS)) & mask) for band in range(BANDS)]
+
+
+class SimHashIndex:
+    """Banded LSH over SimHash signatures (plus feature sets to confirm matches) for one session."""
+
+    def __init__(self, max_items: int = MAX_SIGNATURES_PER_SESSION):
+        self.max_items = max_items
+        self._signatures: dict[str, int] = {}  # insertion-ordered: oldest first
+        self._features: dict[str, np.ndarray] = {}
+        self._buckets: dict[tuple[int, int], set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def nearest(
+        self, signature: int, feats: np.ndarray, max_distance: int = MAX_HAMMING
+    ) -> Optional[tuple[str, float]]:
+        """(ID, Jaccard similarity) of the most similar memory within max_distance bits, if any."""
+        with self._lock:
+            best, best_similarity = None, -1.0
+            for key in _bands(signature):
+                for doc_id in self._buckets.get(key, ()):
+                    if (self._signatures[doc_id] ^ signature).bit_count() > max_distance:
+                        continue
+                    similarity = jaccard(self._features[doc_id], feats)
+                    if similarity > best_similarity:
+                        best, best_similarity = doc_id, similarity
+            return (best, best_similarity) if best is not None else None
+
+    def add(self, doc_id: str, signature: int, feats: np.ndarray):
+        with self._lock:
+            if doc_id in self._signatures:
+                return
+            self._signatures[doc_id] = signature
+            self._features[doc_id] = feats
+            for key in _bands(signature):
+                self._buckets.setdefault(key, set()).add(doc_id)
+            while len(self._signatures) > self.max_items:
+                oldest = next(iter(self._signatures))
+                self._remove(oldest)
+
+    def replace(self, doc_id: str, signature: int, feats: np.ndarray):
+        """Re-sign a memory whose text was replaced (it becomes the newest entry)."""
+        with self._lock:
+            if doc_id in self._signatures:
+                self._remove(doc_id)
+        self.add(doc_id, signature, feats)
+
+    def remove(self, doc_ids: list[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self._signatures:
+                    self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        signature = self._signatures.pop(doc_id)
+        del self._features[doc_id]
+        for key in _bands(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def close(self):
+        """Nothing to release (PartitionManager eviction hook)."""
+
+
+class Deduplicator:
+    """Classifies incoming memories as new, exact or near duplicates."""
+
+    def __init__(self, max_sessions: int = 1024, max_distance: int = MAX_HAMMING, min_jaccard: float = MIN_JACCARD):
+        self.max_distance = max_distance
+        self.min_jaccard = min_jaccard
+        self._indexes = PartitionManager("dedup", lambda name: SimHashIndex(), max_open=max_sessions)
+        self.checked = 0
+        self.exact = 0
+        self.near = 0
+
+    def check(self, session_id: Optional[str], text: str) -> tuple[str, str]:
+        """
+        Returns (kind, doc_id): ("new", content id), ("exact", id of the memory
+        with the same wording) or ("near", id of the memory this text updates).
+        New texts are registered immediately, so a duplicate is caught even while
+        the original is still queued; a near duplicate takes over the existing
+        memory's signature, so the next version is compared against it.
+        """
+        doc_id = content_id(session_id, text)
+        index = self._indexes.get(session_id or "")
+        self.checked += 1
+        feats = np.unique(features(text))
+        signature = simhash(text, feats)
+        found = index.nearest(signature, feats, self.max_distance)
+        if found is not None:
+            existing, similarity = found
+            if existing == doc_id or similarity == 1.0:
+                self.exact += 1
+                return "exact", existing
+            if similarity >= self.min_jaccard:
+                self.near += 1
+                index.replace(existing, signature, feats)
+                return "near", existing
+        index.add(doc_id, signature, feats)
+        return "new", doc_id
+
+    def register(self, session_id: Optional[str], doc_id: str, text: str):
+        """Index a memory stored without check() (e.g. a consolidated summary)."""
+        feats = np.unique(features(text))
+        self._indexes.get(session_id or "").replace(doc_id, simhash(text, feats), feats)
+
+    def forget(self, session_id: Optional[str], ids: list[str]):
+        """Drop deleted memories so later near duplicates are stored again."""
+        self._indexes.get(session_id or "").remove(ids)
+
+    def stats(self) -> dict:
+        hits = self.exact + self.near
+        return {
+            "checked": self.checked,
+            "exact_duplicates": self.exact,
+            "near_duplicates": self.near,
+            "hit_rate": hits / self.checked if self.checked else 0.0,
+            "sessions": self._indexes.stats()["open_partitions"],
+        }
+
+
+_deduplicator: Optional[Deduplicator] = None
+
+
+def get_deduplicator() -> Deduplicator:
+    """Initialize or return the process-wide deduplicator."""
+    global _deduplicator
+
+    if _deduplicator is None:
+        _deduplicator = Deduplicator()
+
+    return _deduplicator
+
+
+def _duplicates() -> dict:
+    if _deduplicator is None:
+        return {}
+    return {"exact": _deduplicator.exact, "near": _deduplicator.near}
+
+
+callback("gptmemory_dedup_checks_total", "Memory writes checked for duplicates",
+         lambda: _deduplicator.checked if _deduplicator is not None else 0, kind="counter")
+callback("gptmemory_dedup_suppressed_total", "Memory writes suppressed as duplicates", _duplicates,
+         kind="counter", labelnames=("kind",))
@@ -0,0 +1,234 @@
+"""
+"Is this worth remembering?" gate in front of summarize + store.
+
+Greetings, thanks and generic questions hold no facts about the user, yet
+each stored turn costs a summarization call, an embedding and a vector
+write. The graph asks worth_remembering() after generate and routes turns
+that score below REMEMBER_GATE_THRESHOLD straight to END.
+
+Scoring is local and takes microseconds:
+- rules: an explicit "remember ..." always passes; a turn made only of
+  greeting/acknowledgement words never does
+- otherwise a logistic model over hashed word unigrams and bigrams plus a
+  few heuristic features (first person, digits, question, length)
+
+The model is trained once, on first use, from SEED_EXAMPLES (~75 ms), or loaded
+from REMEMBER_GATE_MODEL (an .npz written by HashedLinearModel.save, e.g.
+after train() on the project's own labeled turns).
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+import xxhash
+
+from db.metrics import callback
+
+
+logger = logging.getLogger(__name__)
+
+REMEMBER_GATE = os.getenv("REMEMBER_GATE", "1") == "1"
+REMEMBER_GATE_THRESHOLD = float(os.getenv("REMEMBER_GATE_THRESHOLD", "0.35"))
+REMEMBER_GATE_MODEL = os.getenv("REMEMBER_GATE_MODEL") or None
+HASH_DIM = 1 << 14
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_FIRST_PERSON = frozenset({
+    "i", "i'm", "im", "my", "me", "mine", "i've", "i'd", "i'll", "myself", "we", "we're", "we've", "our", "us",
+})
+_SMALL_TALK = frozenset({
+    "hi", "hey", "hello", "yo", "thanks", "thank", "you", "thx", "ok", "okay", "k", "cool", "nice", "great",
+    "good", "morning", "evening", "night", "afternoon", "bye", "goodbye", "see", "ya", "lol", "haha", "hahaha",
+    "yes", "yeah", "yep", "no", "nope", "sure", "awesome", "perfect", "got", "it", "alright", "right", "wow",
+    "much", "so", "very", "a", "lot", "cheers", "np", "welcome", "later", "hmm", "oh", "ah", "there", "again",
+})
+_REMEMBER_RE = re.compile(r"\b(remember|don't forget|do not forget|keep in mind|note that)\b")
+
+# Labeled turns the default model is trained on (1: worth remembering)
+SEED_EXAMPLES = [
+    ("My name is Alex", 1), ("I have a cat named Whiskers", 1), ("My favorite color is blue", 1),
+    ("I work as a nurse at the city hospital", 1), ("I live in Berlin with my partner", 1),
+    ("I'm allergic to peanuts", 1), ("I'm vegetarian", 1), ("My birthday is on March 3rd", 1),
+    ("I have two kids, Sam and Leo", 1), ("I'm training for a marathon in October", 1),
+    ("My sister Maria is getting married next month", 1), ("I prefer short answers", 1),
+    ("I don't like horror movies", 1), ("I'm learning Japanese", 1), ("I drive a 2015 Honda Civic", 1),
+    ("We just moved to Seattle", 1), ("My dog is a golden retriever called Max", 1),
+    ("I hate cilantro", 1), ("I studied physics at MIT", 1), ("My budget for the trip is 2000 dollars", 1),
+    ("I'm 34 years old", 1), ("I usually wake up at 6am", 1), ("My wife is a teacher", 1),
+    ("I play guitar in a band on weekends", 1), ("I'm lactose intolerant", 1),
+    ("I switched jobs, I'm now a data analyst at Spotify", 1), ("My favorite food is ramen", 1),
+    ("I'm planning a trip to Japan in April", 1), ("I use Linux at work and a Mac at home", 1),
+    ("Please always answer in Spanish", 1), ("Call me Jo", 1), ("I can't eat gluten", 1),
+    ("My son starts school in September", 1), ("I'm afraid of flying", 1), ("I speak French and German", 1),
+    ("Our team uses Python and Postgres", 1), ("I'm writing a novel about pirates", 1),
+    ("My phone is a Pixel 7", 1), ("I run 5k three times a week", 1), ("I grew up in Texas", 1),
+    ("I love jazz, especially Coltrane", 1), ("I'm not a morning person", 1),
+    ("I have a meeting with my boss every Monday", 1), ("I'm saving up for a house", 1),
+    ("I'm diabetic so keep recipes low sugar", 1), ("My favourite book is Dune", 1),
+    ("I work remotely from Lisbon", 1), ("I have a peanut allergy and a shellfish allergy", 1),
+    ("hi", 0), ("hello there", 0), ("thanks!", 0), ("ok", 0), ("cool, thanks", 0), ("good morning", 0),
+    ("bye", 0), ("lol", 0), ("nice", 0), ("sure", 0), ("got it", 0), ("thank you so much", 0),
+    ("What is the capital of France?", 0), ("How do I reverse a list in Python?", 0),
+    ("Can you explain quantum entanglement?", 0), ("What's the weather like today?", 0),
+    ("Tell me a joke", 0), ("Write a haiku about autumn", 0), ("What time is it in Tokyo?", 0),
+    ("How many ounces are in a cup?", 0), ("Translate hello to Italian", 0),
+    ("What's 15% of 80?", 0), ("Summarize this article for me", 0), ("Give me a random number", 0),
+    ("What is my cat's name?", 0), ("Where do I work?", 0), ("What's my favorite color?", 0),
+    ("Do you remember my name?", 0), ("What did I tell you about my trip?", 0),
+    ("Can you say that again?", 0), ("That makes sense", 0), ("interesting", 0), ("hmm", 0),
+    ("Why is the sky blue?", 0), ("Recommend a good sci-fi movie", 0), ("How does a transformer model work?", 0),
+    ("What's the difference between TCP and UDP?", 0), ("Explain recursion simply", 0),
+    ("Who won the world cup in 2018?", 0), ("Fix the grammar: their going home", 0),
+    ("Can you make it shorter?", 0), ("Another one please", 0), ("What do you mean?", 0),
+    ("That's funny", 0), ("How are you?", 0), ("What can you do?", 0), ("Continue", 0),
+    ("Give me three ideas for dinner", 0), ("What's a synonym for happy?", 0), ("Is it going to rain?", 0),
+]
+
+# Turns by gate decision
+gate_stats = {"kept": 0, "skipped": 0}
+_gate_stats_lock = threading.Lock()  # the graph checks turns from executor threads
+
+
+def _gate_decisions() -> dict:
+    with _gate_stats_lock:
+        return dict(gate_stats)
+
+
+callback("gptmemory_remember_gate_turns_total", "Turns by remember gate decision", _gate_decisions,
+         kind="counter", labelnames=("decision",))
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.casefold())
+
+
+def _dense_features(text: str, words: list[str]) -> np.ndarray:
+    return np.array([
+        any(w in _FIRST_PERSON for w in words),
+        any(c.isdigit() for c in text),
+        text.rstrip().endswith("?"),
+        min(len(words), 20) / 20,
+        1.0,
+    ], dtype=np.float32)
+
+
+def featurize(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """(hashed n-gram buckets, dense heuristic features) of a turn."""
+    words = _words(text)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    buckets = np.fromiter(
+        (xxhash.xxh32_intdigest(g.encode("utf-8")) % HASH_DIM for g in grams), dtype=np.int64, count=len(grams)
+    )
+    return np.unique(buckets), _dense_features(text, words)
+
+
+class HashedLinearModel:
+    """Logistic regression over hashed n-grams plus dense heuristic features."""
+
+    def __init__(self, weights: np.ndarray, dense_weights: np.ndarray):
+        self.weights = weights
+        self.dense_weights = dense_weights
+
+    def score(self, text: str) -> float:
+        """Probability that the turn is worth remembering."""
+        buckets, dense = featurize(text)
+        z = float(self.weights[buckets].sum() + dense @ self.dense_weights)
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def save(self, path: str):
+        np.savez(path, weights=self.weights, dense_weights=self.dense_weights)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedLinearModel":
+        data = np.load(path)
+        return cls(data["weights"], data["dense_weights"])
+
+
+def train(examples: list[tuple[str, int]], epochs: int = 300, lr: float = 0.5, l2: float = 1e-3) -> HashedLinearModel:
+    """Fit the gate model on (text, label) pairs with full-batch gradient descent."""
+    features = [featurize(text) for text, _ in examples]
+    labels = np.array([label for _, label in examples], dtype=np.float32)
+    rows = np.concatenate([np.full(len(b), i) for i, (b, _) in enumerate(features)])
+    cols = np.concatenate([b for b, _ in features])
+    dense = np.stack([d for _, d in features])
+    weights = np.zeros(HASH_DIM, dtype=np.float32)
+    dense_weights = np.zeros(dense.shape[1], dtype=np.float32)
+    n = len(examples)
+    for _ in range(epochs):
+        z = np.bincount(rows, weights=weights[cols], minlength=n) + dense @ dense_weights
+        error = (1.0 / (1.0 + np.exp(-z)) - labels).astype(np.float32)
+        weights -= lr * (np.bincount(cols, weights=error[rows], minlength=HASH_DIM) / n + l2 * weights)
+        dense_weights -= lr * (dense.T @ error / n + l2 * dense_weights)
+    return HashedLinearModel(weights, dense_weights)
+
+
+class RememberGate:
+    """Rules first, then the linear model against a threshold."""
+
+    def __init__(self, model: Optional[HashedLinearModel] = None, threshold: float = REMEMBER_GATE_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+        self._model_lock = threading.Lock()
+
+    def _model(self) -> HashedLinearModel:
+        if self.model is None:
+            with self._model_lock:  # concurrent first turns train once
+                if self.model is None:
+                    if REMEMBER_GATE_MODEL:
+                        self.model = HashedLinearModel.load(REMEMBER_GATE_MODEL)
+                        logger.info("Loaded remember gate model from %s", REMEMBER_GATE_MODEL)
+                    else:
+                        self.model = train(SEED_EXAMPLES)
+        return self.model
+
+    def score(self, text: str) -> float:
+        """0..1, how likely the turn holds something worth remembering."""
+        lowered = text.casefold()
+        if _REMEMBER_RE.search(lowered) and not lowered.rstrip().endswith("?"):
+            return 1.0
+        words = _words(lowered)
+        if not words or all(w in _SMALL_TALK for w in words):
+            return 0.0
+        return self._model().score(text)
+
+    def check(self, text: str) -> bool:
+        """True if the turn should be summarized and stored."""
+        keep = self.score(text) >= self.threshold
+        with _gate_stats_lock:
+            gate_stats["kept" if keep else "skipped"] += 1
+        return keep
+
+    def stats(self) -> dict:
+        decisions = _gate_decisions()
+        turns = decisions["kept"] + decisions["skipped"]
+        return {
+            "threshold": self.threshold,
+            "kept": decisions["kept"],
+            "skipped": decisions["skipped"],
+            "skipped_fraction": decisions["skipped"] / turns if turns else 0.0,
+        }
+
+
+_remember_gate: Optional[RememberGate] = None
+_singleton_lock = threading.Lock()
+
+
+def get_remember_gate() -> RememberGate:
+    """Initialize or return the process-wide gate."""
+    global _remember_gate
+
+    with _singleton_lock:
+        if _remember_gate is None:
+            _remember_gate = RememberGate()
+
+    return _remember_gate
+
+
+def worth_remembering(user_input: str) -> bool:
+    """Gate decision for a turn; always True with REMEMBER_GATE off."""
+    if not REMEMBER_GATE:
+        return True
+    return get_remember_gate().check(user_input)
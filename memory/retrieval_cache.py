@@ -0,0 +1,282 @@
+"""
+Retrieval result cache for follow-up questions.
+
+Keyed by (session_id, normalized query, k, filters); the value is the
+retrieved_memories list a lookup produced. Entries are dropped:
+- when memory/store.py writes a memory to the session, or compaction
+  deletes from it (invalidate(session_id))
+- when a write only refreshes metadata (a duplicate summary's timestamp,
+  compaction access counts): just the session's filtered entries, since
+  an unfiltered ranking can't change without a text being added or
+  removed; unfiltered entries holding a patched memory get the same patch
+  merged into their copy, so they never serve stale metadata
+- after RETRIEVAL_CACHE_TTL_S
+- least recently used first, once the estimated size of all entries
+  passes RETRIEVAL_CACHE_MAX_BYTES
+
+get() hands out copies, so callers may annotate the memories they get.
+
+Each session has a generation number bumped by every invalidation. A
+lookup captures it before searching and put() discards the result if a
+write landed in between, so a stale result is never cached.
+
+RETRIEVAL_CACHE_SEMANTIC=1 also answers a miss from a cached query of the
+same session (same k and filters) whose embedding has cosine similarity of
+at least RETRIEVAL_CACHE_SIMILARITY. That costs a query embedding per
+miss; remote providers serve the search's own embedding from the content
+cache (db/embedding_cache.py) right after.
+
+Lookups without a session_id are not cached (any session's write could
+change them).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+from db.metrics import callback
+from memory.dedup import normalize
+
+
+RETRIEVAL_CACHE = os.getenv("RETRIEVAL_CACHE", "1") == "1"
+RETRIEVAL_CACHE_TTL_S = float(os.getenv("RETRIEVAL_CACHE_TTL_S", "300"))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RETRIEVAL_CACHE_SEMANTIC = os.getenv("RETRIEVAL_CACHE_SEMANTIC", "0") == "1"
+RETRIEVAL_CACHE_SIMILARITY = float(os.getenv("RETRIEVAL_CACHE_SIMILARITY", "0.95"))
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def _embed_query(text: str) -> list[float]:
+    from db.embeddings import get_embeddings
+    return get_embeddings().embed_query(text)
+
+
+def _filters_key(filters: Optional[dict]) -> Optional[str]:
+    """Canonical form of a filter; None if it can't be serialized."""
+    if not filters:
+        return ""
+    try:
+        return json.dumps(filters, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+
+
+def _copy(memories: list[dict]) -> list[dict]:
+    """Memories detached from the cache (each dict and its metadata copied)."""
+    return [{**memory, "metadata": dict(memory.get("metadata") or {})} for memory in memories]
+
+
+def _size(memories: list[dict], vector: Optional[np.ndarray]) -> int:
+    """Rough in-memory size of an entry."""
+    size = ENTRY_OVERHEAD_BYTES + (vector.nbytes if vector is not None else 0)
+    for memory in memories:
+        size += ENTRY_OVERHEAD_BYTES + len(memory.get("text", ""))
+        size += sum(len(str(k)) + len(str(v)) for k, v in (memory.get("metadata") or {}).items())
+    return size
+
+
+class _Entry:
+    __slots__ = ("memories", "ids", "vector", "size", "expires_at")
+
+    def __init__(self, memories: list[dict], ids: list[str], vector: Optional[np.ndarray], expires_at: float):
+        self.memories = memories
+        self.ids = ids
+        self.vector = vector
+        self.size = _size(memories, vector)
+        self.expires_at = expires_at
+
+
+class RetrievalCache:
+    """Per-session retrieval results with TTL, byte-bounded LRU and write invalidation."""
+
+    def __init__(
+        self,
+        ttl_s: float = RETRIEVAL_CACHE_TTL_S,
+        max_bytes: int = RETRIEVAL_CACHE_MAX_BYTES,
+        semantic: bool = RETRIEVAL_CACHE_SEMANTIC,
+        similarity: float = RETRIEVAL_CACHE_SIMILARITY,
+        embed_query: Optional[Callable[[str], list[float]]] = None,
+    ):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.semantic = semantic
+        self.similarity = similarity
+        self.embed_query = embed_query or _embed_query
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._sessions: dict[str, set[tuple]] = {}
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(session_id: str, query: str, k: int, filters: Optional[dict]) -> Optional[tuple]:
+        """Cache key, or None if the lookup can't be cached."""
+        filters_key = _filters_key(filters)
+        if not session_id or filters_key is None:
+            return None
+        return (session_id, normalize(query), k, filters_key)
+
+    def generation(self, session_id: str) -> int:
+        """Current write generation of a session (capture before searching)."""
+        return self._generations.get(session_id, 0)
+
+    def get(self, key: tuple) -> Optional[tuple[list[dict], list[str]]]:
+        """(memories, doc ids) for a cached lookup, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry.memories), list(entry.ids)
+            if not self.semantic:
+                self.misses += 1
+                return None
+
+        vector = self._vector(key[1])
+        with self._lock:
+            match = self._nearest(key, vector, now)
+            if match is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.semantic_hits += 1
+            entry = self._entries[match]
+            return _copy(entry.memories), list(entry.ids)
+
+    def put(self, key: tuple, memories: list[dict], ids: list[str], generation: int):
+        """Cache a lookup's result unless the session was written since `generation`."""
+        vector = self._vector(key[1]) if self.semantic else None
+        entry = _Entry(_copy(memories), list(ids), vector, time.monotonic() + self.ttl_s)
+        if entry.size > self.max_bytes:
+            return
+        session_id = key[0]
+        with self._lock:
+            if self._generations.get(session_id, 0) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._sessions.setdefault(session_id, set()).add(key)
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, session_id: Optional[str], patches: Optional[dict[str, dict]] = None):
+        """
+        Drop a session's cached results (call on every write to it).
+        patches: the write only merged these metadata patches (doc id -> patch) into stored memories -
+        keep unfiltered entries, patching their copies of those memories.
+        """
+        if not session_id:
+            return
+        with self._lock:
+            self._generations[session_id] = self._generations.get(session_id, 0) + 1
+            keys = [key for key in self._sessions.get(session_id, ()) if key[3] or patches is None]
+            for key in keys:
+                self._remove(key)
+            if keys:
+                self.invalidations += 1
+            if patches:
+                for key in self._sessions.get(session_id, ()):
+                    entry = self._entries[key]
+                    for memory, doc_id in zip(entry.memories, entry.ids):
+                        if doc_id in patches:
+                            memory["metadata"] = {**memory["metadata"], **patches[doc_id]}
+
+    def clear(self):
+        with self._lock:
+            for session_id in self._sessions:
+                self._generations[session_id] = self._generations.get(session_id, 0) + 1
+            self._entries.clear()
+            self._sessions.clear()
+            self.bytes = 0
+
+    def _vector(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _nearest(self, key: tuple, vector: np.ndarray, now: float) -> Optional[tuple]:
+        """Most similar live entry of the same session, k and filters above the threshold."""
+        session_id, _, k, filters_key = key
+        candidates = [
+            other for other in self._sessions.get(session_id, ())
+            if other[2] == k and other[3] == filters_key
+            and self._entries[other].vector is not None and self._entries[other].expires_at > now
+        ]
+        if not candidates:
+            return None
+        scores = np.stack([self._entries[other].vector for other in candidates]) @ vector
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity else None
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        keys = self._sessions.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._sessions[key[0]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+
+_retrieval_cache: Optional[RetrievalCache] = None
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Initialize or return the process-wide retrieval cache."""
+    global _retrieval_cache
+
+    if _retrieval_cache is None:
+        _retrieval_cache = RetrievalCache()
+
+    return _retrieval_cache
+
+
+def invalidate_session(session_id: Optional[str], patches: Optional[dict[str, dict]] = None):
+    """Write hook for memory/store.py and compaction; no-op until the cache exists."""
+    if _retrieval_cache is not None:
+        _retrieval_cache.invalidate(session_id, patches)
+
+
+def _lookups() -> dict:
+    if _retrieval_cache is None:
+        return {}
+    c = _retrieval_cache
+    return {"hit": c.hits, "semantic_hit": c.semantic_hits, "miss": c.misses}
+
+
+callback("gptmemory_retrieval_cache_lookups_total", "Retrieval cache lookups by result", _lookups,
+         kind="counter", labelnames=("result",))
+callback("gptmemory_retrieval_cache_bytes", "Estimated size of cached retrieval results",
+         lambda: _retrieval_cache.bytes if _retrieval_cache is not None else 0)
+callback("gptmemory_retrieval_cache_invalidations_total", "Session invalidations that dropped cached results",
+         lambda: _retrieval_cache.invalidations if _retrieval_cache is not None else 0, kind="counter")
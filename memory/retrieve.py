@@ -1,36 +1,283 @@
 """
 Memory retrieval module.
 Finds relevant past memories for the current question.
+
+Filters are pushed down into the store (see db/vector_backends.py for the
+syntax); e.g. recent_filter(30) limits a search to the last 30 days.
+
+RETRIEVAL_MODE picks the path:
+- "dense" (default): embed the query, vector search the session's partition
+- "hybrid": BM25 shortlist first; if the best lexical hit covers the whole
+  query it is returned without embedding anything, otherwise only the
+  shortlist is rescored with dense similarity
+
+Session lookups go through the retrieval cache first (memory/retrieval_cache.py),
+which memory/store.py invalidates on every write to the session, then the
+session's preloaded working set (memory/working_set.py) or, if it has none,
+its hot working memory (memory/working_memory.py); both can answer without
+reading the vector store.
 """
 
+import os
+import threading
+import time
 from typing import List, Optional
 
-from db.vector_store import similarity_search
+import numpy as np
+from langchain_core.documents import Document
+
+from db.embeddings import get_embeddings
+from db.executor import run_blocking
+from db.metrics import callback
+from db.vector_store import (
+    dense_scores,
+    get_lexical_index,
+    similarity_search_batch_with_score,
+    similarity_search_with_score,
+)
+from db.vector_backends import matches_filter, time_range_filter
+from memory.compaction import COMPACTION, get_compactor
+from memory.context import pack_memories
+from memory.retrieval_cache import RETRIEVAL_CACHE, get_retrieval_cache
+from memory.working_memory import WORKING_MEMORY, get_working_memory
+from memory.working_set import WORKING_SET, get_working_sets
+from memory.write_queue import get_write_queue
+
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+HYBRID_SHORTLIST = int(os.getenv("HYBRID_SHORTLIST", "20"))
+HYBRID_CONFIDENT_COVERAGE = float(os.getenv("HYBRID_CONFIDENT_COVERAGE", "1.0"))
+
+# How hybrid lookups were answered
+hybrid_stats = {"lexical_only": 0, "rescored": 0, "dense_fallback": 0}
+_hybrid_stats_lock = threading.Lock()  # retrievals run on executor threads
+
+
+def _hybrid_path(path: str):
+    with _hybrid_stats_lock:
+        hybrid_stats[path] += 1
+
+
+def _hybrid_paths() -> dict:
+    with _hybrid_stats_lock:
+        return dict(hybrid_stats)
+
+
+callback("gptmemory_hybrid_lookups_total", "Hybrid retrievals by path", _hybrid_paths,
+         kind="counter", labelnames=("path",))
+
+
+def recent_filter(days: float) -> dict:
+    """Filter for memories from the last `days` days."""
+    return time_range_filter(start=time.time() - days * 86400)
+
+
+def _score_pending(query: str, records) -> List[tuple]:
+    """Cosine-score write-behind records that are not in the store yet."""
+    embeddings = get_embeddings()
+    query_vec = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+    vectors = np.asarray(embeddings.embed_documents([r.text for r in records]), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vec) or 1.0)
+    norms[norms == 0] = 1.0
+    scores = vectors @ query_vec / norms
+    return [
+        (Document(id=r.doc_id, page_content=r.text, metadata=r.metadata), float(score))
+        for r, score in zip(records, scores)
+    ]
+
+
+def _hybrid_search(query: str, k: int, session_id: Optional[str]) -> Optional[List[tuple]]:
+    """Lexical shortlist + dense rescoring, as (Document, score or None). None means use the dense path."""
+    hits = get_lexical_index(session_id).search(query, k=max(k, HYBRID_SHORTLIST))
+    if not hits:
+        _hybrid_path("dense_fallback")
+        return None
 
+    docs = [Document(id=h["id"], page_content=h["text"], metadata=h["metadata"]) for h in hits]
+    if hits[0]["coverage"] >= HYBRID_CONFIDENT_COVERAGE:
+        _hybrid_path("lexical_only")
+        return [(doc, None) for doc in docs[:k]]
 
-def retrieve_memories(query: str, session_id: Optional[str] = None, k: int = 3) -> List[dict]:
+    scores = dense_scores(query, [d.id for d in docs], session_id)
+    if scores is None:
+        _hybrid_path("dense_fallback")
+        return None
+    _hybrid_path("rescored")
+    ranked = sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)
+    return ranked[:k]
+
+
+def _local_search(query: str, k: int, session_id: Optional[str], filters: Optional[dict] = None) -> tuple:
+    """
+    The lookups that don't need the vector store, as (hits, hot, pending):
+    hits is set when the working set or working memory answered the query;
+    otherwise hot is the working memory lookup (or None) and pending the
+    session's not-yet-flushed writes to merge into the store's hits.
+    """
+    if WORKING_SET and session_id:
+        hits = get_working_sets().search(session_id, query, k, filters)
+        if hits is not None:
+            return hits, None, []
+
+    hot = get_working_memory().lookup(session_id, query, k, filters) if WORKING_MEMORY and session_id else None
+    if hot is not None and hot.served:
+        get_working_memory().record_result(True, len(hot.hits), len(hot.hits))
+        return hot.hits, hot, []
+
+    hot_ids = {doc.id for doc, _ in hot.hits} if hot is not None else set()
+    pending = get_write_queue().pending(session_id) if session_id else []
+    pending = [r for r in pending if r.doc_id not in hot_ids and matches_filter(r.metadata, filters)]
+    return None, hot, pending
+
+
+def _merge(query: str, k: int, scored: List[tuple], hot, pending) -> List[tuple]:
+    """Store hits merged with working memory hits and pending writes, best first."""
+    hot_hits = hot.hits if hot is not None else []
+    hot_ids = {doc.id for doc, _ in hot_hits}
+    seen = {doc.id for doc, _ in scored}
+    scored = scored + [hit for hit in hot_hits if hit[0].id not in seen]
+    seen |= hot_ids
+    if pending:
+        scored += [hit for hit in _score_pending(query, pending) if hit[0].id not in seen]
+    scored.sort(key=lambda hit: hit[1], reverse=True)
+    scored = scored[:k]
+    if hot is not None:
+        get_working_memory().record_result(False, sum(doc.id in hot_ids for doc, _ in scored), len(scored))
+    return scored
+
+
+def _search_scored(query: str, k: int, session_id: Optional[str], filters: Optional[dict] = None) -> List[tuple]:
+    """
+    Working set or working memory first, then vector search merged with this session's not-yet-flushed writes.
+    Returns (Document, similarity) pairs; the similarity is None for lexical-only hits.
+    """
+    hits, hot, pending = _local_search(query, k, session_id, filters)
+    if hits is not None:
+        return hits
+
+    if not pending and not (hot is not None and hot.hits):
+        # The lexical index can't apply filters; filtered lookups stay dense
+        if RETRIEVAL_MODE == "hybrid" and not filters:
+            hits = _hybrid_search(query, k, session_id)
+        if hits is None:
+            hits = similarity_search_with_score(query, k=k, session_id=session_id, filters=filters)
+        if hot is not None:
+            get_working_memory().record_result(False, 0, len(hits))
+        return hits
+
+    scored = similarity_search_with_score(query, k=k, session_id=session_id, filters=filters)
+    return _merge(query, k, scored, hot, pending)
+
+
+def _search_scored_batch(
+    queries: List[str], k: int, session_id: Optional[str], filters: Optional[dict] = None
+) -> List[List[tuple]]:
+    """_search_scored per query; the queries that reach the store share one batched search."""
+    results: List[Optional[List[tuple]]] = [None] * len(queries)
+    remaining = []
+    for i, query in enumerate(queries):
+        hits, hot, pending = _local_search(query, k, session_id, filters)
+        if hits is not None:
+            results[i] = hits
+        else:
+            remaining.append((i, hot, pending))
+
+    if remaining:
+        batch = similarity_search_batch_with_score(
+            [queries[i] for i, _, _ in remaining], k=k, filters=filters, session_id=session_id
+        )
+        for (i, hot, pending), scored in zip(remaining, batch):
+            results[i] = _merge(queries[i], k, list(scored), hot, pending)
+    return results
+
+
+def _search(query: str, k: int, session_id: Optional[str], filters: Optional[dict] = None) -> List[Document]:
+    """_search_scored without the scores."""
+    return [doc for doc, _ in _search_scored(query, k, session_id, filters)]
+
+
+def _to_memories(hits: List[tuple]) -> List[dict]:
+    """(Document, score) pairs as memory dicts; the score is what the context packer thresholds on."""
+    return [{"text": doc.page_content, "metadata": doc.metadata, "score": score} for doc, score in hits]
+
+
+def _record_hits(session_id: Optional[str], ids: List[str]):
+    """Feed retention access stats (memory/compaction.py)."""
+    if COMPACTION and session_id:
+        get_compactor().record_access(session_id, [doc_id for doc_id in ids if doc_id])
+
+
+def _cache_key(query: str, session_id: Optional[str], k: int, filters: Optional[dict]) -> Optional[tuple]:
+    if not RETRIEVAL_CACHE:
+        return None
+    return get_retrieval_cache().key(session_id, query, k, filters)
+
+
+def retrieve_memories(
+    query: str, session_id: Optional[str] = None, k: int = 3, filters: Optional[dict] = None
+) -> List[dict]:
     """
     Find the most relevant past memories for the current question.
     
     Args:
         query: Current user message
-        session_id: Optional session filter (not used yet)
+        session_id: Only search this session's memories (its own partition)
         k: How many memories to retrieve (default: 3)
+        filters: Metadata filter applied inside the store, e.g. recent_filter(30)
         
     Returns:
-        List of memory dicts with text and metadata
+        List of memory dicts with text, metadata and score (similarity, None if unknown)
     """
     try:
-        results = similarity_search(query, k=k)
+        key = _cache_key(query, session_id, k, filters)
+        if key is not None:
+            cache = get_retrieval_cache()
+            cached = cache.get(key)
+            if cached is not None:
+                _record_hits(session_id, cached[1])
+                return cached[0]
+            generation = cache.generation(session_id)
+
+        results = _search_scored(query, k, session_id, filters)
+        ids = [doc.id for doc, _ in results]
+        _record_hits(session_id, ids)
+        memories = _to_memories(results)
         
-        # Convert Document objects to dicts
-        memories = []
-        for doc in results:
-            memories.append({
-                "text": doc.page_content,
-                "metadata": doc.metadata
-            })
+        if key is not None:
+            cache.put(key, memories, ids, generation)
+        return memories
         
+    except Exception as e:
+        print(f"Error retrieving memories: {e}")
+        return []
+
+
+async def aretrieve_memories(
+    query: str, session_id: Optional[str] = None, k: int = 3, filters: Optional[dict] = None
+) -> List[dict]:
+    """
+    Async retrieve_memories for the /chat path - same contract, no event loop blocking.
+    """
+    try:
+        key = _cache_key(query, session_id, k, filters)
+        if key is not None:
+            cache = get_retrieval_cache()
+            # Semantic keys embed the query, so they stay off the event loop
+            cached = await run_blocking(cache.get, key) if cache.semantic else cache.get(key)
+            if cached is not None:
+                _record_hits(session_id, cached[1])
+                return cached[0]
+            generation = cache.generation(session_id)
+
+        results = await run_blocking(_search_scored, query, k, session_id, filters)
+        ids = [doc.id for doc, _ in results]
+        _record_hits(session_id, ids)
+        memories = _to_memories(results)
+        if key is not None:
+            if cache.semantic:
+                await run_blocking(cache.put, key, memories, ids, generation)
+            else:
+                cache.put(key, memories, ids, generation)
         return memories
         
     except Exception as e:
@@ -38,22 +285,69 @@ def retrieve_memories(query: str, session_id: Optional[str] = None, k: int = 3)
         return []
 
 
+def retrieve_memories_batch(
+    queries: List[str],
+    session_id: Optional[str] = None,
+    k: int = 3,
+    filters: Optional[dict] = None
+) -> List[List[dict]]:
+    """
+    Batched retrieve_memories: same layers and result shape per query, but the
+    queries that reach the vector store share one embedding call and one scoring pass.
+    
+    Args:
+        queries: User messages to look up
+        session_id: Only search this session's memories
+        k: How many memories to retrieve per query
+        filters: Metadata equality filter applied to every query
+        
+    Returns:
+        One list of memory dicts (text, metadata, score) per query, in query order
+    """
+    try:
+        memories: List[Optional[List[dict]]] = [None] * len(queries)
+        keys = [_cache_key(query, session_id, k, filters) for query in queries]
+        if RETRIEVAL_CACHE:
+            cache = get_retrieval_cache()
+            generation = cache.generation(session_id)
+            for i, key in enumerate(keys):
+                cached = cache.get(key)
+                if cached is not None:
+                    _record_hits(session_id, cached[1])
+                    memories[i] = cached[0]
+
+        misses = [i for i, found in enumerate(memories) if found is None]
+        results = _search_scored_batch([queries[i] for i in misses], k, session_id, filters)
+        for i, hits in zip(misses, results):
+            ids = [doc.id for doc, _ in hits]
+            _record_hits(session_id, ids)
+            memories[i] = _to_memories(hits)
+            if keys[i] is not None:
+                cache.put(keys[i], memories[i], ids, generation)
+        return memories
+        
+    except Exception as e:
+        print(f"Error retrieving memories: {e}")
+        return [[] for _ in queries]
+
+
 def retrieve_relevant_memories(user_input: str, vector_store=None, k: int = 3, metadata_filter: Optional[dict] = None) -> List[str]:
     """
     Legacy interface - returns just the text strings.
+    A session_id in metadata_filter also routes the search to that session's partition.
     """
-    memories = retrieve_memories(user_input, k=k)
+    session_id = (metadata_filter or {}).get("session_id")
+    if not isinstance(session_id, str):
+        session_id = None
+    memories = retrieve_memories(user_input, session_id=session_id, k=k, filters=metadata_filter)
     return [m["text"] for m in memories]
 
 
 def format_memories_for_prompt(memories: List[str]) -> str:
-    """Format retrieved memories into a text block for the LLM."""
-    if not memories:
-        return "No relevant past memories."
-    
-    formatted = "=== Relevant Past Information ===\n"
-    for i, memory in enumerate(memories, 1):
-        formatted += f"{i}. {memory}\n"
-    formatted += "================================\n"
-    
-    return formatted
\ No newline at end of file
+    """
+    Legacy interface - format memory texts into a text block for the LLM.
+    Goes through the context packer (memory/context.py): redundant memories
+    are dropped and the block is cut to CONTEXT_TOKEN_BUDGET.
+    """
+    packed = pack_memories([{"text": memory} for memory in memories])
+    return packed.text or "No relevant past memories."
\ No newline at end of file
@@ -1,28 +1,197 @@
 """
 Storage boundary between LangGraph and the vector database.
 Accepts summaries, stores them. No summarization or retrieval logic here.
+New memories are also recorded in the session's working memory
+(memory/working_memory.py). Once a write is visible it is appended to the
+session's preloaded working set (memory/working_set.py) and drops the
+session's cached retrievals (memory/retrieval_cache.py).
 """
 
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Optional
+import logging
 import uuid
 
-from db.vector_store import add_documents
+from db.executor import get_executor, run_blocking
+from db.metadata_index import to_epoch
+from db.vector_store import aadd_documents, add_documents, update_documents, update_metadata
+from memory.dedup import DEDUP, get_deduplicator
+from memory.retrieval_cache import invalidate_session
+from memory.working_memory import WORKING_MEMORY, get_working_memory
+from memory.working_set import WORKING_SET, get_working_sets
+from memory.write_queue import WRITE_BEHIND, get_write_queue
 
 
-def store_summary(summary: str, metadata: Optional[dict] = None, session_id: Optional[str] = None) -> str:
-    """Store a conversation summary. Returns the document ID."""
+logger = logging.getLogger(__name__)
+
+
+def _summary_metadata(metadata: Optional[dict], session_id: Optional[str]) -> dict:
+    now = datetime.now()
     meta = {
         "type": "summary",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": now.isoformat(),
+        "ts": now.timestamp(),
         "session_id": session_id or str(uuid.uuid4())
     }
     
     if metadata:
         meta.update(metadata)
+        if "timestamp" in metadata and "ts" not in metadata:
+            meta["ts"] = to_epoch(metadata["timestamp"]) or meta["ts"]
     
-    ids = add_documents([summary], [meta])
+    return meta
+
+
+def _dedup(summary: str, meta: dict) -> tuple[str, str]:
+    """("new" | "exact" | "near", doc_id) for a summary about to be written."""
+    if not DEDUP:
+        return "new", str(uuid.uuid4())
+    return get_deduplicator().check(meta["session_id"], summary)
+
+
+def _refresh_patch(meta: dict) -> dict:
+    return {"timestamp": meta["timestamp"], "ts": meta["ts"]}
+
+
+def _remember(doc_id: str, summary: str, meta: dict):
+    """Add a new memory to working memory (before the write, see WorkingMemory.add)."""
+    if WORKING_MEMORY:
+        get_working_memory().add(meta["session_id"], doc_id, summary, meta)
+
+
+def _forget(doc_id: str, meta: dict):
+    """Undo _remember and the dedup registration after a failed write, so a retry stores it again."""
+    if WORKING_MEMORY:
+        get_working_memory().remove(meta["session_id"], doc_id)
+    if DEDUP:
+        get_deduplicator().forget(meta["session_id"], [doc_id])
+
+
+def _written(doc_id: str, summary: str, meta: dict):
+    """A new memory is visible (stored or queued)."""
+    if WORKING_SET:
+        get_working_sets().add(meta["session_id"], doc_id, summary, meta)
+    invalidate_session(meta["session_id"])
+
+
+def _dropped(record):
+    """The write queue gave up on a memory (see WriteBehindQueue._dead_letter): stop serving it."""
+    _forget(record.doc_id, record.metadata)
+    if WORKING_SET:
+        get_working_sets().drop(record.metadata["session_id"])
+    invalidate_session(record.metadata["session_id"])
+
+
+get_write_queue().on_drop = _dropped
+
+
+def _refreshed(doc_id: str, meta: dict):
+    if WORKING_MEMORY:
+        get_working_memory().touch(meta["session_id"], doc_id, _refresh_patch(meta))
+    if WORKING_SET:
+        get_working_sets().touch(meta["session_id"], doc_id, _refresh_patch(meta))
+    invalidate_session(meta["session_id"], patches={doc_id: _refresh_patch(meta)})
+
+
+def _refresh(doc_id: str, meta: dict):
+    update_metadata([doc_id], [_refresh_patch(meta)], session_id=meta["session_id"])
+    _refreshed(doc_id, meta)
+
+
+def _replaced(doc_id: str, summary: str, meta: dict):
+    if WORKING_MEMORY:
+        get_working_memory().replace(meta["session_id"], doc_id, summary, meta)
+    if WORKING_SET:
+        get_working_sets().replace(meta["session_id"], doc_id, summary, meta)
+    invalidate_session(meta["session_id"])
+
+
+def _replace(doc_id: str, summary: str, meta: dict):
+    """A near duplicate is a newer version of the memory: overwrite its text, keep its ID."""
+    update_documents([doc_id], [summary], [meta], session_id=meta["session_id"])
+    _replaced(doc_id, summary, meta)
+
+
+def _log_failure(future: Future):
+    if future.exception() is not None:
+        logger.error("Background memory update failed", exc_info=future.exception())
+
+
+def _in_background(fn, *args):
+    """Run an update off the request path; nobody awaits it, so failures are logged here."""
+    get_executor().submit(fn, *args).add_done_callback(_log_failure)
+
+
+def _update(kind: str, doc_id: str, summary: str, meta: dict):
+    """Apply a duplicate: refresh an exact one, replace a near one."""
+    if kind == "exact":
+        _refresh(doc_id, meta)
+    else:
+        _replace(doc_id, summary, meta)
+
+
+def store_summary(summary: str, metadata: Optional[dict] = None, session_id: Optional[str] = None) -> str:
+    """Store a conversation summary. Returns the document ID (the existing one for duplicates)."""
+    meta = _summary_metadata(metadata, session_id)
+    kind, doc_id = _dedup(summary, meta)
+    if kind != "new":
+        _update(kind, doc_id, summary, meta)
+        return doc_id
+    _remember(doc_id, summary, meta)
+    try:
+        ids = add_documents([summary], [meta], ids=[doc_id])
+    except Exception:
+        _forget(doc_id, meta)
+        raise
+    _written(doc_id, summary, meta)
     return ids[0] if ids else ""
+
+
+async def astore_summary(summary: str, metadata: Optional[dict] = None, session_id: Optional[str] = None) -> str:
+    """Async store_summary. Returns the document ID."""
+    meta = _summary_metadata(metadata, session_id)
+    # Dedup, working memory and working set hooks take locks and may open partitions
+    kind, doc_id = await run_blocking(_dedup, summary, meta)
+    if kind != "new":
+        await run_blocking(_update, kind, doc_id, summary, meta)
+        return doc_id
+    await run_blocking(_remember, doc_id, summary, meta)
+    try:
+        ids = await aadd_documents([summary], [meta], ids=[doc_id])
+    except Exception:
+        await run_blocking(_forget, doc_id, meta)
+        raise
+    await run_blocking(_written, doc_id, summary, meta)
+    return ids[0] if ids else ""
+
+
+def enqueue_summary(summary: str, metadata: Optional[dict] = None, session_id: Optional[str] = None) -> str:
+    """Hand a summary to the write-behind queue. Returns its document ID."""
+    meta = _summary_metadata(metadata, session_id)
+    kind, doc_id = _dedup(summary, meta)
+    queue = get_write_queue()
+    if kind == "exact":
+        # Refresh the original: in place if still queued, else off the request path
+        if queue.touch(doc_id, _refresh_patch(meta)):
+            _refreshed(doc_id, meta)
+        else:
+            _in_background(_refresh, doc_id, meta)
+        return doc_id
+    if kind == "near":
+        if queue.replace(doc_id, summary, meta):
+            _replaced(doc_id, summary, meta)
+        else:
+            _in_background(_replace, doc_id, summary, meta)
+        return doc_id
+    _remember(doc_id, summary, meta)
+    try:
+        doc_id = queue.enqueue(summary, meta, doc_id=doc_id)
+    except Exception:
+        _forget(doc_id, meta)
+        raise
+    _written(doc_id, summary, meta)
+    return doc_id
 # memory/store.py
 
 from datetime import datetime
@@ -60,16 +229,23 @@ def prepare_memory_for_storage(
     }
 
 
-def store_memory(summary: str, vector_store, session_id: Optional[str] = None):
+def store_memory(summary: str, vector_store=None, session_id: Optional[str] = None, metadata: Optional[dict] = None):
     """
     Store a memory summary in the database.
     
     Args:
         summary: The text summary to store
-        vector_store: Person 3's vector database
+        vector_store: Person 3's vector database (None = db.vector_store, routed by session)
         session_id: Optional session identifier
+        metadata: Extra metadata; only scalar values are kept (Chroma requirement)
     """
     
+    # Graph path: write-behind (or write-through) into the session's partition
+    if vector_store is None:
+        if WRITE_BEHIND:
+            return enqueue_summary(summary, metadata=_scalar_metadata(metadata), session_id=session_id)
+        return store_summary(summary, metadata=_scalar_metadata(metadata), session_id=session_id)
+    
     # Prepare the data
     memory_data = prepare_memory_for_storage(summary, session_id)
     
@@ -85,6 +261,24 @@ def store_memory(summary: str, vector_store, session_id: Optional[str] = None):
         print(f"Error storing memory: {e}")
 
 
+def _scalar_metadata(metadata: Optional[dict]) -> dict:
+    """Chroma only accepts str/int/float/bool metadata values."""
+    return {
+        key: value for key, value in (metadata or {}).items()
+        if isinstance(value, (str, int, float, bool))
+    }
+
+
+async def astore_memory(summary: str, session_id: Optional[str] = None, metadata: Optional[dict] = None) -> str:
+    """Async graph-path store_memory. Returns the document ID."""
+    if WRITE_BEHIND:
+        # Dedup, working memory and the session's stored count may open its partition
+        return await run_blocking(
+            enqueue_summary, summary, metadata=_scalar_metadata(metadata), session_id=session_id
+        )
+    return await astore_summary(summary, metadata=_scalar_metadata(metadata), session_id=session_id)
+
+
 # Test function
 if __name__ == "__main__":
     test_summary = "User's name is Alice. User lives in Seattle."
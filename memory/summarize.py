@@ -1,11 +1,22 @@
 # memory/summarize.py
 
-from openai import OpenAI
-from prompts.summary_prompts import get_summary_prompt
+import re
 
-client = OpenAI()  # You'll need OPENAI_API_KEY in environment
+from db.http_clients import get_openai_client
+from db.metrics import timed_call
+from prompts.summary_prompts import get_batch_summary_prompt, get_consolidation_prompt, get_summary_prompt
 
 
+_SESSION_SUMMARY_RE = re.compile(r"^\s*session summary:", re.IGNORECASE | re.MULTILINE)
+_MEMORIES_RE = re.compile(r"^\s*memories:", re.IGNORECASE)
+
+
+def get_client():
+    """OpenAI client on the shared connection pool (db/http_clients.py)."""
+    return get_openai_client()
+
+
+@timed_call("llm_summarize")
 def summarize_conversation(user_input: str, assistant_response: str) -> str:
     """
     Take a conversation turn and create a short, factual summary.
@@ -26,7 +37,7 @@ def summarize_conversation(user_input: str, assistant_response: str) -> str:
     # Get the prompt from our prompts module
     prompt = get_summary_prompt(user_input, assistant_response)
     
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,  # Low temperature for consistent summaries
@@ -37,6 +48,65 @@ def summarize_conversation(user_input: str, assistant_response: str) -> str:
     return summary
 
 
+@timed_call("llm_summarize")
+def summarize_turns(turns: list[tuple[str, str]], session_summary: str = "") -> tuple[str, str]:
+    """
+    Summarize several turns in one call and fold them into the session's rolling summary.
+    
+    Args:
+        turns: (user_input, assistant_response) pairs, oldest first
+        session_summary: The rolling summary so far ("" for a new session)
+        
+    Returns:
+        (memories, session_summary): the new facts to store ("" if nothing is
+        worth remembering) and the updated rolling summary
+    """
+    prompt = get_batch_summary_prompt(turns, session_summary)
+    
+    response = get_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=400
+    )
+    
+    return parse_batch_summary(response.choices[0].message.content, session_summary)
+
+
+def parse_batch_summary(text: str, session_summary: str = "") -> tuple[str, str]:
+    """Split a batch summary reply into (memories, session_summary)."""
+    parts = _SESSION_SUMMARY_RE.split(text, maxsplit=1)
+    memories = _MEMORIES_RE.sub("", parts[0]).strip()
+    if memories.lower().strip("-. ") == "none":
+        memories = ""
+    if len(parts) == 2:
+        return memories, parts[1].strip() or session_summary
+    # No summary section: extend the old one instead of losing it
+    return memories, "\n".join(part for part in (session_summary, memories) if part)
+
+
+@timed_call("llm_consolidate")
+def consolidate_summaries(summaries: list[str]) -> str:
+    """
+    Merge several old memory summaries into one (compaction hook, see memory/compaction.py).
+    
+    Args:
+        summaries: Memory texts, oldest first
+        
+    Returns:
+        One consolidated summary
+    """
+    prompt = get_consolidation_prompt(summaries)
+    
+    response = get_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=300
+    )
+    
+    return response.choices[0].message.content.strip()
+
 # Test function
 if __name__ == "__main__":
     # Test case
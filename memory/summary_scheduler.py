@@ -0,0 +1,288 @@
+"""
+Batched, incremental summarization of conversation turns.
+
+With SUMMARY_BATCH on, the graph's summarize step hands each turn to the
+scheduler instead of summarizing it alone. A session's turns accumulate
+until SUMMARY_BATCH_TURNS are waiting or the oldest has waited
+SUMMARY_BATCH_INTERVAL_S; then one LLM call (memory/summarize.summarize_turns)
+turns them into a memory and updates the session's rolling summary, which
+is passed to the next call instead of re-reading the whole conversation.
+
+Guarantees:
+- per-session ordering: a session's batches are summarized one at a time,
+  oldest turns first, so its rolling summary sees every batch in order
+- retries: a failed call puts the turns back; the timer (not new turns)
+  tries again after SUMMARY_BATCH_INTERVAL_S. After SUMMARY_MAX_ATTEMPTS
+  failed calls in a row the batch is dropped, and a session never buffers
+  more than SUMMARY_MAX_BUFFERED_TURNS (oldest dropped first); both are
+  logged and counted in stats
+- drain: end_session() summarizes a session's leftover turns right away,
+  close() does it for every session (FastAPI shutdown, before the write
+  queue drains)
+
+Trade-off: a turn becomes a retrievable memory only once its batch is
+summarized, so recent turns of a session are not recalled until then.
+Rolling summaries live in this process; a session idle for
+SUMMARY_SESSION_IDLE_S is forgotten (its memories are already stored).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from db.metrics import callback
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_BATCH = os.getenv("SUMMARY_BATCH", "0") == "1"
+SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "8"))
+SUMMARY_BATCH_INTERVAL_S = float(os.getenv("SUMMARY_BATCH_INTERVAL_S", "120"))
+SUMMARY_SESSION_IDLE_S = float(os.getenv("SUMMARY_SESSION_IDLE_S", "1800"))
+SUMMARY_MAX_ATTEMPTS = int(os.getenv("SUMMARY_MAX_ATTEMPTS", "5"))
+SUMMARY_MAX_BUFFERED_TURNS = int(os.getenv("SUMMARY_MAX_BUFFERED_TURNS", "64"))
+
+Summarizer = Callable[[list[tuple[str, str]], str], tuple[str, str]]
+Writer = Callable[[str, str, dict], object]
+
+
+def _default_summarizer(turns: list[tuple[str, str]], session_summary: str) -> tuple[str, str]:
+    # Imported on first batch only (pulls in the OpenAI client)
+    from memory.summarize import summarize_turns
+    return summarize_turns(turns, session_summary)
+
+
+def _default_writer(session_id: str, memories: str, metadata: dict):
+    from memory.store import store_memory
+    return store_memory(summary=memories, session_id=session_id, metadata=metadata)
+
+
+class SessionTurns:
+    """One session's unsummarized turns and rolling summary."""
+
+    __slots__ = ("turns", "metadata", "first_at", "last_at", "summary", "failures", "lock")
+
+    def __init__(self):
+        self.turns: list[tuple[str, str]] = []
+        self.metadata: dict = {}
+        self.first_at = 0.0
+        self.last_at = time.monotonic()
+        self.summary = ""
+        self.failures = 0  # failed calls in a row
+        self.lock = threading.Lock()
+
+
+class SummaryScheduler:
+    """Accumulates turns per session and summarizes them in batches."""
+
+    def __init__(
+        self,
+        batch_turns: int = SUMMARY_BATCH_TURNS,
+        interval_s: float = SUMMARY_BATCH_INTERVAL_S,
+        idle_s: float = SUMMARY_SESSION_IDLE_S,
+        summarizer: Summarizer = _default_summarizer,
+        writer: Writer = _default_writer,
+        max_attempts: int = SUMMARY_MAX_ATTEMPTS,
+        max_buffered_turns: int = SUMMARY_MAX_BUFFERED_TURNS,
+    ):
+        self.batch_turns = batch_turns
+        self.interval_s = interval_s
+        self.idle_s = idle_s
+        self.max_attempts = max_attempts
+        self.max_buffered_turns = max_buffered_turns
+        self.summarizer = summarizer
+        self.writer = writer
+        self._sessions: dict[str, SessionTurns] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self.turns = 0
+        self.calls = 0
+        self.failures = 0
+        self.memories = 0
+        self.empty = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="memory-summary-batch", daemon=True)
+            self._thread.start()
+
+    def add(self, session_id: str, user_input: str, assistant_response: str, metadata: Optional[dict] = None):
+        """
+        Buffer a turn. Summarizes the session's batch in the calling thread
+        once SUMMARY_BATCH_TURNS are waiting (the write-back pool, off the response path),
+        unless its last call failed - then the timer retries.
+        """
+        with self._cond:
+            self._ensure_started()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = SessionTurns()
+            if not session.turns:
+                session.first_at = time.monotonic()
+                self._cond.notify()
+            session.turns.append((user_input, assistant_response or ""))
+            self._cap_locked(session_id, session)
+            session.metadata = dict(metadata or {})
+            session.last_at = time.monotonic()
+            self.turns += 1
+            full = len(session.turns) >= self.batch_turns and not session.failures
+        if full:
+            self.flush_session(session_id)
+
+    def session_summary(self, session_id: str) -> str:
+        """The session's rolling summary ("" if none yet)."""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            return session.summary if session is not None else ""
+
+    def flush_session(self, session_id: str) -> bool:
+        """Summarize and store whatever the session has buffered. False if the call failed."""
+        with self._cond:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return True
+        with session.lock:
+            with self._cond:
+                turns, session.turns = session.turns, []
+                metadata = session.metadata
+            if not turns:
+                return True
+            try:
+                memories, summary = self.summarizer(turns, session.summary)
+                self.calls += 1
+                if memories:
+                    self.writer(session_id, memories, {**metadata, "turns": len(turns)})
+                    self.memories += 1
+                else:
+                    self.empty += 1
+            except Exception:
+                self.failures += 1
+                session.failures += 1
+                logger.exception("Summarizing %d turns for %s failed", len(turns), session_id)
+                if session.failures >= self.max_attempts:
+                    session.failures = 0
+                    self._drop(session_id, turns, f"after {self.max_attempts} failed attempts")
+                    return False
+                with self._cond:
+                    session.turns[:0] = turns
+                    session.first_at = time.monotonic()
+                    self._cap_locked(session_id, session)
+                return False
+            session.failures = 0
+            session.summary = summary
+            return True
+
+    def _cap_locked(self, session_id: str, session: SessionTurns):
+        """Drop a session's oldest turns beyond max_buffered_turns."""
+        excess = len(session.turns) - self.max_buffered_turns
+        if excess > 0:
+            dropped, session.turns = session.turns[:excess], session.turns[excess:]
+            self._drop(session_id, dropped, f"over the {self.max_buffered_turns}-turn buffer cap")
+
+    def _drop(self, session_id: str, turns: list[tuple[str, str]], reason: str):
+        self.dropped += len(turns)
+        logger.error(
+            "Dropping %d unsummarized turns for %s %s; user messages: %s",
+            len(turns), session_id, reason, [user_input[:80] for user_input, _ in turns],
+        )
+
+    def end_session(self, session_id: str) -> bool:
+        """Summarize the session's leftover turns now and forget it."""
+        flushed = self.flush_session(session_id)
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if flushed and session is not None and not session.turns:
+                del self._sessions[session_id]
+        return flushed
+
+    def _due(self, now: float) -> tuple[list[str], float]:
+        """Sessions whose oldest turn has waited interval_s, and how long until the next one is due."""
+        due, wait = [], self.interval_s
+        for session_id, session in list(self._sessions.items()):
+            if session.turns:
+                age = now - session.first_at
+                if age >= self.interval_s:
+                    due.append(session_id)
+                else:
+                    wait = min(wait, self.interval_s - age)
+            elif now - session.last_at >= self.idle_s and not session.lock.locked():
+                del self._sessions[session_id]
+        return due, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closing:
+                    due, wait = self._due(time.monotonic())
+                    if due:
+                        break
+                    self._cond.wait(wait)
+                if self._closing:
+                    return
+            for session_id in due:
+                self.flush_session(session_id)
+
+    def flush(self) -> bool:
+        """Summarize every session's buffered turns now. False if any call failed."""
+        with self._cond:
+            session_ids = [sid for sid, session in self._sessions.items() if session.turns]
+        return all([self.flush_session(session_id) for session_id in session_ids])
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the timer and summarize everything still buffered."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        if not self.flush():
+            logger.error("Some buffered turns could not be summarized at shutdown")
+
+    def stats(self) -> dict:
+        """Buffered turns and LLM calls per turn."""
+        with self._cond:
+            buffered = sum(len(session.turns) for session in self._sessions.values())
+            sessions = len(self._sessions)
+        return {
+            "sessions": sessions,
+            "buffered_turns": buffered,
+            "turns": self.turns,
+            "llm_calls": self.calls,
+            "calls_per_1k_turns": 1000 * self.calls / self.turns if self.turns else 0.0,
+            "memories": self.memories,
+            "nothing_to_remember": self.empty,
+            "failures": self.failures,
+            "dropped_turns": self.dropped,
+        }
+
+
+_summary_scheduler: Optional[SummaryScheduler] = None
+
+
+def get_summary_scheduler() -> SummaryScheduler:
+    """Initialize or return the process-wide summary scheduler."""
+    global _summary_scheduler
+
+    if _summary_scheduler is None:
+        _summary_scheduler = SummaryScheduler()
+
+    return _summary_scheduler
+
+
+def shutdown_summary_scheduler(timeout: Optional[float] = None):
+    """Summarize buffered turns and stop the timer if the scheduler was ever used."""
+    if _summary_scheduler is not None:
+        _summary_scheduler.close(timeout)
+
+
+callback("gptmemory_summary_buffered_turns", "Turns waiting to be summarized",
+         lambda: _summary_scheduler.stats()["buffered_turns"] if _summary_scheduler is not None else 0)
+callback("gptmemory_summary_calls_total", "Batched summarization LLM calls",
+         lambda: _summary_scheduler.calls if _summary_scheduler is not None else 0, kind="counter")
@@ -0,0 +1,286 @@
+"""
+Hot working memory: each session's most recent memories, kept in process.
+
+memory/store.py records every new memory here as it is written (one per
+turn - the turn's summary), in a ring buffer of the last
+WORKING_MEMORY_TURNS per session. Retrieval (memory/retrieve.py) scores
+the session's hot records first:
+
+- served: the buffer holds everything the session has ever stored (it was
+  created when the session's partition and write queue were empty and has
+  not wrapped), or its top k all score at least
+  WORKING_MEMORY_CONFIDENT_SCORE - the vector store is not read
+- merged: otherwise the hot hits are merged by score with the store's
+  hits and the session's queued writes
+
+Vectors are embedded on first lookup, in one call per session, and kept
+with the record.
+
+Sessions are evicted least recently used first once all buffers together
+pass WORKING_MEMORY_MAX_BYTES, and after WORKING_MEMORY_IDLE_S without a
+read or write (checked on every add and lookup). Compaction drops a
+session's buffer when it deletes from the session. Like the write queue's
+read-your-writes, "complete" assumes one process writes a given session.
+
+A session's preloaded working set (memory/working_set.py) is consulted
+first and answers every lookup it covers. WORKING_SET defaults on for the
+Chroma backend, so there working memory only serves sessions too large for
+a working set (above WORKING_SET_MAX_ROWS) or not partitioned by session;
+with the NumPy backend (WORKING_SET off) it serves every session.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from db.metrics import callback
+from db.vector_backends import matches_filter
+
+
+WORKING_MEMORY = os.getenv("WORKING_MEMORY", "1") == "1"
+WORKING_MEMORY_TURNS = int(os.getenv("WORKING_MEMORY_TURNS", "32"))
+WORKING_MEMORY_MAX_BYTES = int(os.getenv("WORKING_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+WORKING_MEMORY_IDLE_S = float(os.getenv("WORKING_MEMORY_IDLE_S", "1800"))
+WORKING_MEMORY_CONFIDENT_SCORE = float(os.getenv("WORKING_MEMORY_CONFIDENT_SCORE", "0.9"))
+RECORD_OVERHEAD_BYTES = 200
+
+
+def _stored_count(session_id: str) -> int:
+    """Memories a session already has outside working memory (store + write queue)."""
+    from db.vector_store import PARTITION_BY_SESSION, get_store
+    from memory.write_queue import get_write_queue
+
+    if not PARTITION_BY_SESSION:
+        return -1  # shared store: can't tell, never treat a buffer as complete
+    return get_store(session_id).count() + len(get_write_queue().pending(session_id))
+
+
+def _embeddings():
+    from db.embeddings import get_embeddings
+    return get_embeddings()
+
+
+class HotRecord:
+    __slots__ = ("doc_id", "text", "metadata", "vector", "size")
+
+    def __init__(self, doc_id: str, text: str, metadata: dict):
+        self.doc_id = doc_id
+        self.text = text
+        self.metadata = metadata
+        self.vector: Optional[np.ndarray] = None
+        self.size = RECORD_OVERHEAD_BYTES + len(text) + sum(len(str(k)) + len(str(v)) for k, v in metadata.items())
+
+
+class SessionBuffer:
+    __slots__ = ("records", "complete", "size", "last_used")
+
+    def __init__(self, max_turns: int, complete: bool):
+        self.records: deque[HotRecord] = deque(maxlen=max_turns)
+        self.complete = complete
+        self.size = 0
+        self.last_used = time.monotonic()
+
+
+class HotLookup:
+    __slots__ = ("hits", "served")
+
+    def __init__(self, hits: list[tuple[Document, float]], served: bool):
+        self.hits = hits
+        self.served = served
+
+
+class WorkingMemory:
+    """Per-session ring buffers of recent memories under one global byte budget."""
+
+    def __init__(
+        self,
+        max_turns: int = WORKING_MEMORY_TURNS,
+        max_bytes: int = WORKING_MEMORY_MAX_BYTES,
+        idle_s: float = WORKING_MEMORY_IDLE_S,
+        confident_score: float = WORKING_MEMORY_CONFIDENT_SCORE,
+        stored_count: Callable[[str], int] = _stored_count,
+    ):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.idle_s = idle_s
+        self.confident_score = confident_score
+        self.stored_count = stored_count
+        self._sessions: OrderedDict[str, SessionBuffer] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.served = 0
+        self.merged = 0
+        self.cold = 0
+        self.hot_results = 0
+        self.results = 0
+        self.evicted_sessions = 0
+
+    def add(self, session_id: Optional[str], doc_id: str, text: str, metadata: dict):
+        """
+        Record a new memory. Call before it is written, so a first write finds
+        the store empty; remove() it if the write fails.
+        """
+        if not session_id:
+            return
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+        if buffer is None:
+            # Outside the lock: may open the session's partition
+            buffer = SessionBuffer(self.max_turns, complete=self.stored_count(session_id) == 0)
+        record = HotRecord(doc_id, text, dict(metadata))
+        with self._lock:
+            buffer = self._sessions.setdefault(session_id, buffer)
+            if len(buffer.records) == buffer.records.maxlen:
+                dropped = buffer.records[0]
+                buffer.size -= dropped.size
+                self.bytes -= dropped.size
+                buffer.complete = False
+            buffer.records.append(record)
+            buffer.size += record.size
+            self.bytes += record.size
+            buffer.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._evict_locked()
+
+    def touch(self, session_id: Optional[str], doc_id: str, patch: dict):
+        """Merge a metadata patch into a hot record (duplicate refresh)."""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            for record in buffer.records if buffer is not None else ():
+                if record.doc_id == doc_id:
+                    record.metadata = {**record.metadata, **patch}
+
+    def replace(self, session_id: Optional[str], doc_id: str, text: str, patch: dict):
+        """Swap a hot record's text for a newer version (re-embedded on the next lookup)."""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            for i, record in enumerate(buffer.records if buffer is not None else ()):
+                if record.doc_id == doc_id:
+                    updated = HotRecord(doc_id, text, {**record.metadata, **patch})
+                    buffer.records[i] = updated
+                    buffer.size += updated.size - record.size
+                    self.bytes += updated.size - record.size
+
+    def remove(self, session_id: Optional[str], doc_id: str):
+        """Take back a record whose write failed."""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            for record in list(buffer.records) if buffer is not None else ():
+                if record.doc_id == doc_id:
+                    buffer.records.remove(record)
+                    buffer.size -= record.size
+                    self.bytes -= record.size
+
+    def drop(self, session_id: Optional[str]):
+        """Forget a session's buffer (its stored memories were rewritten)."""
+        with self._lock:
+            buffer = self._sessions.pop(session_id, None)
+            if buffer is not None:
+                self.bytes -= buffer.size
+
+    def lookup(self, session_id: Optional[str], query: str, k: int, filters: Optional[dict] = None) -> Optional[HotLookup]:
+        """Top-k hot records for a query, or None if the session has no buffer."""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            if buffer is not None:
+                buffer.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                records = list(buffer.records)
+                complete = buffer.complete
+            self._evict_locked()  # idle sweep; this session was just used
+        if buffer is None:
+            self.cold += 1
+            return None
+
+        records = [r for r in records if matches_filter(r.metadata, filters)]
+        if not records:
+            return HotLookup([], served=complete)
+
+        embeddings = _embeddings()
+        missing = [r for r in records if r.vector is None]
+        if missing:
+            vectors = np.asarray(embeddings.embed_documents([r.text for r in missing]), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            with self._lock:
+                for record, vector in zip(missing, vectors / norms):
+                    record.vector = vector
+                    record.size += vector.nbytes
+                    if self._sessions.get(session_id) is buffer:
+                        buffer.size += vector.nbytes
+                        self.bytes += vector.nbytes
+        query_vec = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        scores = np.stack([r.vector for r in records]) @ (query_vec / (np.linalg.norm(query_vec) or 1.0))
+        order = np.argsort(-scores, kind="stable")[:k]
+        hits = [
+            (Document(id=records[i].doc_id, page_content=records[i].text, metadata=dict(records[i].metadata)),
+             float(scores[i]))
+            for i in order
+        ]
+        served = complete or (len(hits) == k and hits[-1][1] >= self.confident_score)
+        return HotLookup(hits, served)
+
+    def record_result(self, served: bool, hot: int, total: int):
+        """Count how a lookup was answered and how many results came from the hot tier."""
+        if served:
+            self.served += 1
+        else:
+            self.merged += 1
+        self.hot_results += hot
+        self.results += total
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, buffer = next(iter(self._sessions.items()))
+            if self.bytes <= self.max_bytes and now - buffer.last_used < self.idle_s:
+                return
+            del self._sessions[session_id]
+            self.bytes -= buffer.size
+            self.evicted_sessions += 1
+
+    def stats(self) -> dict:
+        lookups = self.served + self.merged + self.cold
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.bytes,
+            "served": self.served,
+            "merged": self.merged,
+            "cold": self.cold,
+            "store_reads_avoided": self.served / lookups if lookups else 0.0,
+            "hot_result_share": self.hot_results / self.results if self.results else 0.0,
+            "evicted_sessions": self.evicted_sessions,
+        }
+
+
+_working_memory: Optional[WorkingMemory] = None
+
+
+def get_working_memory() -> WorkingMemory:
+    """Initialize or return the process-wide working memory."""
+    global _working_memory
+
+    if _working_memory is None:
+        _working_memory = WorkingMemory()
+
+    return _working_memory
+
+
+def _lookups() -> dict:
+    if _working_memory is None:
+        return {}
+    w = _working_memory
+    return {"served": w.served, "merged": w.merged, "cold": w.cold}
+
+
+callback("gptmemory_working_memory_lookups_total", "Retrievals by how working memory answered them", _lookups,
+         kind="counter", labelnames=("result",))
+callback("gptmemory_working_memory_results_total", "Retrieved memories that came from working memory",
+         lambda: _working_memory.hot_results if _working_memory is not None else 0, kind="counter")
+callback("gptmemory_working_memory_bytes", "Estimated size of all working memory buffers",
+         lambda: _working_memory.bytes if _working_memory is not None else 0)
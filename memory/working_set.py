@@ -0,0 +1,355 @@
+"""
+Per-session working sets: a session's whole memory, preloaded into RAM.
+
+On a session's first lookup, if it holds at most WORKING_SET_MAX_ROWS
+memories, its ids, texts, metadata and vectors are bulk-loaded from its
+partition (plus whatever is still in the write queue) into one contiguous
+float32 matrix. Later lookups are a matmul against that matrix; the vector
+store is not read again while the set stays loaded.
+
+- writes: memory/store.py appends new memories (embedded on the next
+  lookup, in one call), patches refreshed metadata and swaps in the newer
+  text of an updated near duplicate; compaction patches access stats into
+  a loaded set, or drops the set when it deletes and the next lookup
+  reloads it
+- eviction: least recently used sessions go first once all sets together
+  (queued appends included) pass WORKING_SET_MAX_BYTES, checked whenever a
+  set grows, and a set idle for WORKING_SET_IDLE_S is dropped
+- sessions above WORKING_SET_MAX_ROWS are left to the regular path and
+  rechecked after WORKING_SET_IDLE_S
+
+Needs PARTITION_BY_SESSION (a session's memories are its own partition)
+and, like the write queue's read-your-writes, one process per session.
+On by default for stores behind a client (Chroma); the NumPy backend
+already searches an in-process matrix, so there it is opt-in.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from db.metrics import callback
+from db.numpy_store import normalize_rows, top_k
+from db.vector_backends import matches_filter
+from db.vector_store import VECTOR_BACKEND
+
+
+logger = logging.getLogger(__name__)
+
+WORKING_SET = os.getenv("WORKING_SET", "0" if VECTOR_BACKEND == "numpy" else "1") == "1"
+WORKING_SET_MAX_ROWS = int(os.getenv("WORKING_SET_MAX_ROWS", "5000"))
+WORKING_SET_MAX_BYTES = int(os.getenv("WORKING_SET_MAX_BYTES", str(256 * 1024 * 1024)))
+WORKING_SET_IDLE_S = float(os.getenv("WORKING_SET_IDLE_S", "900"))
+ROW_OVERHEAD_BYTES = 200
+
+
+def _load(session_id: str) -> Optional[tuple[list[str], list[str], list[dict], np.ndarray]]:
+    """A session's stored memories, or None if it is too large to preload."""
+    from db.vector_store import PARTITION_BY_SESSION, get_store, load_documents
+
+    if not PARTITION_BY_SESSION or get_store(session_id).count() > WORKING_SET_MAX_ROWS:
+        return None
+    return load_documents(session_id)
+
+
+def _queued(session_id: str) -> list[tuple[str, str, dict]]:
+    from memory.write_queue import get_write_queue
+    return [(r.doc_id, r.text, dict(r.metadata)) for r in get_write_queue().pending(session_id)]
+
+
+def _embeddings():
+    from db.embeddings import get_embeddings
+    return get_embeddings()
+
+
+class SessionWorkingSet:
+    """One session's memories; rows [0, n) of `vectors` are live, unembedded appends wait in `pending`."""
+
+    __slots__ = (
+        "ids", "texts", "metadatas", "vectors", "n", "rows", "pending", "text_bytes", "pending_bytes", "accounted",
+        "loaded", "last_used", "lock",
+    )
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.n = 0
+        self.rows: dict[str, int] = {}
+        self.pending: list[tuple[str, str, dict]] = []
+        self.text_bytes = 0
+        self.pending_bytes = 0
+        self.accounted = 0  # size as last added to WorkingSets.bytes
+        self.loaded = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _append_rows(self, ids: list[str], texts: list[str], metadatas: list[dict], vectors: np.ndarray):
+        if not ids:
+            return
+        vectors = normalize_rows(vectors)
+        needed = self.n + len(ids)
+        if needed > len(self.vectors) or self.vectors.shape[1] != vectors.shape[1]:
+            grown = np.empty((max(needed, 2 * len(self.vectors), 16), vectors.shape[1]), dtype=np.float32)
+            if self.n:
+                grown[:self.n] = self.vectors[:self.n]
+            self.vectors = grown
+        self.vectors[self.n:needed] = vectors
+        for doc_id in ids:
+            self.rows[doc_id] = self.n
+            self.n += 1
+        self.ids += ids
+        self.texts += texts
+        self.metadatas += metadatas
+        self.text_bytes += sum(ROW_OVERHEAD_BYTES + len(text) for text in texts)
+
+    @property
+    def size(self) -> int:
+        return self.vectors.nbytes + self.text_bytes + self.pending_bytes
+
+    def set_pending(self, pending: list[tuple[str, str, dict]]):
+        self.pending = pending
+        self.pending_bytes = sum(ROW_OVERHEAD_BYTES + len(text) for _, text, _ in pending)
+
+    def add_pending(self, doc_id: str, text: str, metadata: dict):
+        self.pending.append((doc_id, text, metadata))
+        self.pending_bytes += ROW_OVERHEAD_BYTES + len(text)
+
+    def embed_pending(self, embed_documents: Callable[[list[str]], list[list[float]]]):
+        """Embed queued appends in one call and move them into the matrix."""
+        pending = [p for p in self.pending if p[0] not in self.rows]
+        self.set_pending([])
+        unique = list({doc_id: (doc_id, text, meta) for doc_id, text, meta in pending}.values())
+        if not unique:
+            return
+        vectors = np.asarray(embed_documents([text for _, text, _ in unique]), dtype=np.float32)
+        self._append_rows([p[0] for p in unique], [p[1] for p in unique], [p[2] for p in unique], vectors)
+
+    def search(self, query_vec: np.ndarray, k: int, filters: Optional[dict]) -> list[tuple[Document, float]]:
+        if not self.n:
+            return []
+        scores = self.vectors[:self.n] @ query_vec
+        if filters:
+            mask = np.fromiter((matches_filter(m, filters) for m in self.metadatas), dtype=bool, count=self.n)
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+        return [
+            (Document(id=self.ids[i], page_content=self.texts[i], metadata=dict(self.metadatas[i])), float(scores[i]))
+            for i in top_k(scores, k)
+        ]
+
+
+class WorkingSets:
+    """Loads, updates and evicts per-session working sets under one byte budget."""
+
+    def __init__(
+        self,
+        max_bytes: int = WORKING_SET_MAX_BYTES,
+        idle_s: float = WORKING_SET_IDLE_S,
+        load: Callable[[str], Optional[tuple]] = _load,
+        queued: Callable[[str], list] = _queued,
+    ):
+        self.max_bytes = max_bytes
+        self.idle_s = idle_s
+        self.load = load
+        self.queued = queued
+        self._sets: OrderedDict[str, SessionWorkingSet] = OrderedDict()
+        self._too_large: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.warm = 0
+        self.loads = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.load_ms = 0.0
+
+    @property
+    def bytes(self) -> int:
+        """Size of all loaded sets, kept as a running total (see _account_locked)."""
+        return self._bytes
+
+    def _account_locked(self, session_id: str, ws: SessionWorkingSet):
+        """Fold a set's size change into the total, if it is still loaded."""
+        if self._sets.get(session_id) is ws:
+            size = ws.size
+            self._bytes += size - ws.accounted
+            ws.accounted = size
+
+    def _remove_locked(self, session_id: str):
+        ws = self._sets.pop(session_id, None)
+        if ws is not None:
+            self._bytes -= ws.accounted
+            ws.accounted = 0
+
+    def search(
+        self, session_id: Optional[str], query: str, k: int, filters: Optional[dict] = None
+    ) -> Optional[list[tuple[Document, float]]]:
+        """Top-k (Document, score) from the session's working set, loading it on first use. None: not available."""
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            checked = self._too_large.get(session_id)
+            if checked is not None and now - checked < self.idle_s:
+                self.skipped += 1
+                return None
+            ws = self._sets.get(session_id)
+            fresh = ws is None
+            if fresh:
+                # Registered before loading, so writes during the load are kept
+                ws = self._sets[session_id] = SessionWorkingSet()
+            self._sets.move_to_end(session_id)
+            ws.last_used = now
+
+        with ws.lock:
+            if fresh:
+                if not self._fill(session_id, ws):
+                    return None
+            elif not ws.loaded:
+                return None  # the load this lookup waited for failed
+            else:
+                self.warm += 1
+            embeddings = _embeddings()
+            grew = fresh or bool(ws.pending)
+            if ws.pending:
+                ws.embed_pending(embeddings.embed_documents)
+            query_vec = normalize_rows(np.asarray(embeddings.embed_query(query), dtype=np.float32))
+            hits = ws.search(query_vec, k, filters)
+
+        with self._lock:
+            if grew:
+                self._account_locked(session_id, ws)
+            self._evict_locked(check_bytes=grew)
+        return hits
+
+    def _fill(self, session_id: str, ws: SessionWorkingSet) -> bool:
+        start = time.perf_counter()
+        try:
+            loaded = self.load(session_id)
+        except Exception:
+            logger.exception("Loading the working set of %s failed", session_id)
+            loaded = None
+        if loaded is None:
+            with self._lock:
+                if self._sets.get(session_id) is ws:
+                    self._remove_locked(session_id)
+                self._too_large[session_id] = time.monotonic()
+            return False
+        ws._append_rows(*loaded)
+        ws.set_pending(self.queued(session_id) + ws.pending)
+        ws.loaded = True
+        self.loads += 1
+        self.load_ms += (time.perf_counter() - start) * 1000
+        return True
+
+    def add(self, session_id: Optional[str], doc_id: str, text: str, metadata: dict):
+        """
+        Append a new memory to the session's set, if loaded (embedded on the next lookup).
+        Call after the write is visible, so a load that starts later reads it from the store.
+        """
+        with self._lock:
+            ws = self._sets.get(session_id)
+        if ws is not None:
+            with ws.lock:
+                ws.add_pending(doc_id, text, dict(metadata))
+            with self._lock:
+                self._account_locked(session_id, ws)
+                self._evict_locked(check_bytes=True)
+
+    def touch(self, session_id: Optional[str], doc_id: str, patch: dict):
+        """Merge a metadata patch into a loaded row (duplicate refresh)."""
+        with self._lock:
+            ws = self._sets.get(session_id)
+        if ws is None:
+            return
+        with ws.lock:
+            row = ws.rows.get(doc_id)
+            if row is not None:
+                ws.metadatas[row] = {**ws.metadatas[row], **patch}
+            for pending_id, _, meta in ws.pending:
+                if pending_id == doc_id:
+                    meta.update(patch)
+
+    def replace(self, session_id: Optional[str], doc_id: str, text: str, patch: dict):
+        """Swap a memory's text for a newer version in a loaded set (row re-embedded now, pending on next lookup)."""
+        with self._lock:
+            ws = self._sets.get(session_id)
+        if ws is None:
+            return
+        with ws.lock:
+            row = ws.rows.get(doc_id)
+            if row is not None:
+                vector = np.asarray(_embeddings().embed_documents([text]), dtype=np.float32)
+                ws.vectors[row] = normalize_rows(vector)[0]
+                ws.text_bytes += len(text) - len(ws.texts[row])
+                ws.texts[row] = text
+                ws.metadatas[row] = {**ws.metadatas[row], **patch}
+            ws.set_pending([
+                (pending_id, text, {**meta, **patch}) if pending_id == doc_id else (pending_id, pending_text, meta)
+                for pending_id, pending_text, meta in ws.pending
+            ])
+        with self._lock:
+            self._account_locked(session_id, ws)
+            self._evict_locked(check_bytes=True)
+
+    def drop(self, session_id: Optional[str]):
+        """Forget a session's set; the next lookup reloads it."""
+        with self._lock:
+            self._remove_locked(session_id)
+            self._too_large.pop(session_id, None)
+
+    def _evict_locked(self, check_bytes: bool):
+        """Drop idle sets; after a set grew, also least recently used ones while over budget."""
+        now = time.monotonic()
+        while self._sets:
+            session_id, ws = next(iter(self._sets.items()))
+            if (not check_bytes or self._bytes <= self.max_bytes) and now - ws.last_used < self.idle_s:
+                return
+            self._remove_locked(session_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.warm + self.loads
+        return {
+            "sessions": len(self._sets),
+            "bytes": self.bytes,
+            "rows": sum(ws.n for ws in list(self._sets.values())),
+            "warm_lookups": self.warm,
+            "loads": self.loads,
+            "too_large_lookups": self.skipped,
+            "warm_rate": self.warm / lookups if lookups else 0.0,
+            "load_ms_avg": self.load_ms / self.loads if self.loads else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_working_sets: Optional[WorkingSets] = None
+
+
+def get_working_sets() -> WorkingSets:
+    """Initialize or return the process-wide working sets."""
+    global _working_sets
+
+    if _working_sets is None:
+        _working_sets = WorkingSets()
+
+    return _working_sets
+
+
+def _lookups() -> dict:
+    if _working_sets is None:
+        return {}
+    return {"warm": _working_sets.warm, "load": _working_sets.loads, "too_large": _working_sets.skipped}
+
+
+callback("gptmemory_working_set_lookups_total", "Retrievals by working set state", _lookups,
+         kind="counter", labelnames=("result",))
+callback("gptmemory_working_set_bytes", "Size of all loaded working sets",
+         lambda: _working_sets.bytes if _working_sets is not None else 0)
@@ -0,0 +1,338 @@
+"""
+Write-behind buffer for memory persistence.
+The graph enqueues summaries and returns; a background flusher embeds and
+writes them to the vector store in batches.
+
+Guarantees:
+- read-your-writes: records still pending (or mid-flush) are visible to
+  retrieval for the same session through pending()
+- drain on shutdown: close() flushes everything before returning
+- bounded retries: a failed batch is retried record by record, so one bad
+  record can't hold up the rest; a record that still fails after
+  WRITE_BEHIND_MAX_ATTEMPTS flushes (or is still unwritten at shutdown, or
+  is pushed out of a full queue) is appended to the dead-letter file instead
+  of being retried forever
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from db.metrics import callback
+from db.vector_store import add_documents, update_documents, update_metadata
+
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+FLUSH_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "32"))
+FLUSH_INTERVAL_S = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_S", "0.5"))
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "8"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+DEAD_LETTER_PATH = os.getenv(
+    "WRITE_BEHIND_DEAD_LETTER_PATH", os.path.join(os.path.dirname(__file__), "..", "write_behind_dead_letter.jsonl")
+)
+MAX_RETRY_BACKOFF_S = 30.0
+
+
+@dataclass
+class PendingRecord:
+    """One memory waiting to be persisted."""
+    text: str
+    metadata: dict
+    doc_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class WriteBehindQueue:
+    """Batches memory writes off the request path."""
+
+    def __init__(
+        self,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        flush_interval_s: float = FLUSH_INTERVAL_S,
+        writer=add_documents,
+        max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        dead_letter_path: Optional[str] = DEAD_LETTER_PATH,
+        on_drop: Optional[Callable[[PendingRecord], None]] = None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.writer = writer
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.dead_letter_path = dead_letter_path
+        self.on_drop = on_drop
+        self._pending: deque[PendingRecord] = deque()
+        self._inflight: list[PendingRecord] = []
+        # doc_id -> (new text or None, metadata patch) for in-flight records, applied once they're written
+        self._deferred: dict[str, tuple[Optional[str], dict]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, text: str, metadata: dict, doc_id: Optional[str] = None) -> str:
+        """Queue a memory for persistence. Returns its (future) document ID."""
+        record = PendingRecord(text=text, metadata=dict(metadata))
+        if doc_id:
+            record.doc_id = doc_id
+        shed = []
+        with self._cond:
+            self._ensure_started()
+            self._pending.append(record)
+            self.enqueued += 1
+            while len(self._pending) > self.max_pending:
+                shed.append(self._pending.popleft())
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        if shed:
+            # Store can't keep up (or is down): shed the oldest rather than grow without bound
+            self._dead_letter(shed, "queue full")
+        return record.doc_id
+
+    def pending(self, session_id: Optional[str] = None) -> list[PendingRecord]:
+        """Records not yet durable, optionally for one session (read-your-writes)."""
+        with self._cond:
+            records = list(self._inflight) + list(self._pending)
+        if session_id is None:
+            return records
+        return [r for r in records if r.metadata.get("session_id") == session_id]
+
+    def touch(self, doc_id: str, patch: dict) -> bool:
+        """Merge patch into a not-yet-durable record's metadata. False if not pending."""
+        return self._update(doc_id, None, patch)
+
+    def replace(self, doc_id: str, text: str, patch: dict) -> bool:
+        """Swap a not-yet-durable record's text and merge patch into its metadata. False if not pending."""
+        return self._update(doc_id, text, patch)
+
+    def _update(self, doc_id: str, text: Optional[str], patch: dict) -> bool:
+        with self._cond:
+            for record in self._pending:
+                if record.doc_id == doc_id:
+                    if text is not None:
+                        record.text = text
+                    record.metadata.update(patch)
+                    return True
+            for record in self._inflight:
+                if record.doc_id == doc_id:
+                    # The write may already have read the old values: redo the change after it
+                    if text is not None:
+                        record.text = text
+                    record.metadata.update(patch)
+                    old_text, old_patch = self._deferred.get(doc_id, (None, {}))
+                    self._deferred[doc_id] = (text if text is not None else old_text, {**old_patch, **patch})
+                    return True
+        return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closing:
+                    if len(self._pending) >= self.batch_size:
+                        break
+                    if self._pending:
+                        age = time.monotonic() - self._pending[0].enqueued_at
+                        if age >= self.flush_interval_s:
+                            break
+                        self._cond.wait(self.flush_interval_s - age)
+                    else:
+                        self._cond.wait()
+                if self._closing and not self._pending:
+                    return
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._inflight = batch
+
+            failed = self._write(batch)
+            failed_ids = {r.doc_id for r in failed}
+            written = [r for r in batch if r.doc_id not in failed_ids]
+            self._apply_deferred(written)
+
+            retry, dead = [], []
+            for record in failed:
+                record.attempts += 1
+                too_many = self._closing or record.attempts >= self.max_attempts
+                (dead if too_many else retry).append(record)
+            if dead:
+                self._dead_letter(dead, "shutdown" if self._closing else f"{self.max_attempts} failed flushes")
+            with self._cond:
+                for record in failed:
+                    # Already folded into the record itself
+                    self._deferred.pop(record.doc_id, None)
+                # Put the rest back in order
+                self._pending.extendleft(reversed(retry))
+                self._inflight = []
+                self._cond.notify_all()
+            if retry:
+                time.sleep(min(MAX_RETRY_BACKOFF_S, self.flush_interval_s * 2 ** min(self.consecutive_failures, 6)))
+
+    def _write(self, batch: list[PendingRecord]) -> list[PendingRecord]:
+        """Write a batch; on failure retry it record by record. Returns the records that failed."""
+        if self._flush(batch):
+            return []
+        if len(batch) == 1:
+            return batch
+        failed = [r for r in batch if not self._flush([r], log=False)]
+        if failed:
+            logger.error("%d of %d memories still failed when written one at a time", len(failed), len(batch))
+        return failed
+
+    def _flush(self, batch: list[PendingRecord], log: bool = True) -> bool:
+        start = time.perf_counter()
+        try:
+            self.writer(
+                [r.text for r in batch],
+                [r.metadata for r in batch],
+                ids=[r.doc_id for r in batch],
+            )
+        except Exception:
+            # failures is the lifetime count (stats); the backoff only follows the current streak
+            self.failures += 1
+            self.consecutive_failures += 1
+            if log:
+                logger.exception("Write-behind flush of %d memories failed", len(batch))
+            return False
+        self.consecutive_failures = 0
+        elapsed = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.flushed += len(batch)
+        self.last_flush_ms = elapsed
+        self.total_flush_ms += elapsed
+        return True
+
+    def _apply_deferred(self, written: list[PendingRecord]):
+        """Redo touch()/replace() calls that landed while these records were being written."""
+        records = {r.doc_id: r for r in written}
+        while True:
+            with self._cond:
+                updates = {doc_id: self._deferred.pop(doc_id) for doc_id in records if doc_id in self._deferred}
+            if not updates:
+                return
+            # Still listed as in flight, so a change arriving meanwhile is deferred again rather than reordered
+            for doc_id, (text, patch) in updates.items():
+                record = records[doc_id]
+                session_id = record.metadata.get("session_id")
+                try:
+                    if text is not None:
+                        update_documents([doc_id], [record.text], [record.metadata], session_id=session_id)
+                    else:
+                        update_metadata([doc_id], [patch], session_id=session_id)
+                except Exception:
+                    logger.exception("Could not apply a deferred update to memory %s", doc_id)
+
+    def _dead_letter(self, records: list[PendingRecord], reason: str):
+        """Give up on records: append them to the dead-letter file and tell on_drop."""
+        self.dead_lettered += len(records)
+        logger.error("Dead-lettering %d memories (%s) to %s", len(records), reason, self.dead_letter_path)
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    for r in records:
+                        f.write(json.dumps({
+                            "id": r.doc_id, "text": r.text, "metadata": r.metadata,
+                            "attempts": r.attempts, "reason": reason,
+                        }) + "\n")
+            except OSError:
+                logger.exception("Could not write the dead-letter file; memories lost: %s", [r.doc_id for r in records])
+        if self.on_drop is not None:
+            for r in records:
+                try:
+                    self.on_drop(r)
+                except Exception:
+                    logger.exception("on_drop failed for memory %s", r.doc_id)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is persisted."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending:
+                self._ensure_started()
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                # Make the flusher treat everything as due
+                for record in self._pending:
+                    record.enqueued_at = 0.0
+                self._cond.notify_all()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(0.05 if remaining is None else min(0.05, remaining))
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        """Drain the queue and stop the flusher (FastAPI shutdown)."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        """Queue depth and flush latency."""
+        with self._cond:
+            depth = len(self._pending) + len(self._inflight)
+        return {
+            "queue_depth": depth,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+        }
+
+
+_write_queue: Optional[WriteBehindQueue] = None
+
+
+def get_write_queue() -> WriteBehindQueue:
+    """Initialize or return the process-wide write-behind queue."""
+    global _write_queue
+
+    if _write_queue is None:
+        _write_queue = WriteBehindQueue()
+
+    return _write_queue
+
+
+def shutdown_write_queue(timeout: Optional[float] = None):
+    """Drain and stop the queue if it was ever started."""
+    if _write_queue is not None:
+        _write_queue.close(timeout)
+
+
+def _stat(key: str) -> float:
+    return _write_queue.stats()[key] if _write_queue is not None else 0
+
+
+callback("gptmemory_write_queue_depth", "Memories waiting in the write-behind queue", lambda: _stat("queue_depth"))
+callback("gptmemory_write_queue_flushed_total", "Memories persisted by the write-behind queue",
+         lambda: _stat("flushed"), kind="counter")
+callback("gptmemory_write_queue_failures_total", "Failed write-behind flushes", lambda: _stat("failures"), kind="counter")
+callback("gptmemory_write_queue_dead_lettered_total", "Memories given up on and written to the dead-letter file",
+         lambda: _stat("dead_lettered"), kind="counter")
@@ -0,0 +1,227 @@
+"""
+Post-response memory write-back.
+/chat replies as soon as generate_response is done; summarize + store for
+that turn run here afterwards. Jobs are blocking callables (the summarizer
+is a sync LLM call); they run on a dedicated pool so they never occupy the
+threads the response path needs, ordered and retried by tasks on the
+serving event loop.
+
+Guarantees:
+- per-session ordering: a session's turns are written back one at a time,
+  in the order they were submitted
+- bounded concurrency: at most WRITEBACK_CONCURRENCY jobs run at once
+  (the pool size)
+- retries: a failed job is retried with exponential backoff up to
+  WRITEBACK_MAX_RETRIES times, then dropped (logged)
+- load shedding: submit() never waits; with WRITEBACK_MAX_PENDING jobs
+  queued the turn's write-back is dropped (counted as shed) instead
+- read-your-writes: wait_session() lets a session's next turn wait (bounded
+  by WRITEBACK_SESSION_WAIT_S, measured in stats()) for its earlier
+  write-backs before retrieving
+- drain on shutdown: drain() finishes everything queued
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from db.metrics import callback
+
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_WRITEBACK = os.getenv("BACKGROUND_WRITEBACK", "1") == "1"
+WRITEBACK_CONCURRENCY = int(os.getenv("WRITEBACK_CONCURRENCY", "4"))
+WRITEBACK_MAX_RETRIES = int(os.getenv("WRITEBACK_MAX_RETRIES", "3"))
+WRITEBACK_RETRY_BASE_S = float(os.getenv("WRITEBACK_RETRY_BASE_S", "0.5"))
+WRITEBACK_MAX_PENDING = int(os.getenv("WRITEBACK_MAX_PENDING", "1000"))
+WRITEBACK_SESSION_WAIT_S = float(os.getenv("WRITEBACK_SESSION_WAIT_S", "1.0"))
+LAG_SAMPLES = 1024
+
+Job = Callable[[], object]
+
+
+class WritebackScheduler:
+    """Per-session FIFO lanes sharing a bounded pool of job threads."""
+
+    def __init__(
+        self,
+        concurrency: int = WRITEBACK_CONCURRENCY,
+        max_retries: int = WRITEBACK_MAX_RETRIES,
+        retry_base_s: float = WRITEBACK_RETRY_BASE_S,
+        max_pending: int = WRITEBACK_MAX_PENDING,
+    ):
+        self.max_retries = max_retries
+        self.retry_base_s = retry_base_s
+        self.max_pending = max_pending
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="memory-writeback")
+        self._lanes: dict[str, deque] = {}
+        self._idle: dict[str, asyncio.Event] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._lags_ms: deque[float] = deque(maxlen=LAG_SAMPLES)
+        self._waits_ms: deque[float] = deque(maxlen=LAG_SAMPLES)
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.shed = 0
+        self.wait_timeouts = 0
+
+    async def submit(self, session_id: str, job: Job) -> asyncio.Future:
+        """
+        Queue a write-back job behind the session's earlier ones.
+        Returns a future resolving to the job's return value, None if it was dropped or shed.
+        """
+        self.loop = asyncio.get_running_loop()
+        done = self.loop.create_future()
+        if self.pending >= self.max_pending:
+            # The reply is already generated: lose this turn's memory rather than hold the request
+            self.shed += 1
+            logger.warning("Write-back queue full (%d pending), shedding a turn for %s", self.pending, session_id)
+            done.set_result(None)
+            return done
+        self.pending += 1
+        self.submitted += 1
+        lane = self._lanes.get(session_id)
+        if lane is not None:
+            lane.append((job, time.monotonic(), done))
+            return done
+        lane = self._lanes[session_id] = deque([(job, time.monotonic(), done)])
+        self._idle[session_id] = asyncio.Event()
+        task = asyncio.create_task(self._drain_lane(session_id, lane))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return done
+
+    async def _drain_lane(self, session_id: str, lane: deque):
+        try:
+            while lane:
+                job, submitted_at, done = lane[0]
+                result = await self._run(job, session_id)
+                if not done.done():
+                    done.set_result(result)
+                lane.popleft()
+                self.pending -= 1
+                self._lags_ms.append((time.monotonic() - submitted_at) * 1000)
+        finally:
+            # Cancelled (loop shutdown): whatever is left was dropped
+            while lane:
+                _, _, done = lane.popleft()
+                if not done.done():
+                    done.set_result(None)
+                self.pending -= 1
+            del self._lanes[session_id]
+            self._idle.pop(session_id).set()
+
+    async def _run(self, job: Job, session_id: str) -> object:
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await loop.run_in_executor(self._executor, job)
+                self.completed += 1
+                return result
+            except Exception:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.exception("Dropping write-back for %s after %d attempts", session_id, attempt + 1)
+                    return None
+                self.retries += 1
+                logger.warning("Write-back for %s failed (attempt %d), retrying", session_id, attempt + 1)
+            # Back off without holding a pool thread
+            await asyncio.sleep(self.retry_base_s * 2 ** attempt)
+
+    async def wait_session(self, session_id: str, timeout: Optional[float] = WRITEBACK_SESSION_WAIT_S) -> bool:
+        """Wait until the session has nothing queued. False on timeout."""
+        idle = self._idle.get(session_id)
+        if idle is None:
+            return True
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.wait_timeouts += 1
+            return False
+        finally:
+            self._waits_ms.append((time.monotonic() - start) * 1000)
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Finish every queued job. False if the timeout ran out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._tasks:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            await asyncio.wait(set(self._tasks), timeout=remaining)
+        return True
+
+    def close(self):
+        """Stop the job pool (call after drain)."""
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """Queue depth, outcomes, submit-to-done lag and how long turns waited in wait_session()."""
+        lags = sorted(self._lags_ms)
+        waits = sorted(self._waits_ms)
+        return {
+            "pending": self.pending,
+            "sessions": len(self._lanes),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "shed": self.shed,
+            "lag_p50_ms": lags[len(lags) // 2] if lags else 0.0,
+            "lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0,
+            "waits": len(waits),
+            "wait_p50_ms": waits[len(waits) // 2] if waits else 0.0,
+            "wait_p99_ms": waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0,
+            "wait_timeouts": self.wait_timeouts,
+        }
+
+
+_writeback: Optional[WritebackScheduler] = None
+
+
+def get_writeback() -> WritebackScheduler:
+    """Initialize or return the write-back scheduler of the serving event loop."""
+    global _writeback
+
+    if _writeback is None or (_writeback.loop is not None and _writeback.loop.is_closed()):
+        if _writeback is not None:
+            _writeback.close()
+        _writeback = WritebackScheduler()
+
+    return _writeback
+
+
+async def shutdown_writeback(timeout: Optional[float] = None):
+    """Finish queued write-backs and stop the pool (FastAPI shutdown, before the write queue drains)."""
+    global _writeback
+
+    if _writeback is not None:
+        if not await _writeback.drain(timeout):
+            logger.error("Write-back drain timed out with %d jobs pending", _writeback.pending)
+        _writeback.close()
+        _writeback = None
+
+
+def _outcomes() -> dict:
+    if _writeback is None:
+        return {}
+    return {
+        "completed": _writeback.completed, "failed": _writeback.failed,
+        "retried": _writeback.retries, "shed": _writeback.shed,
+    }
+
+
+callback("gptmemory_writeback_pending", "Turns waiting for post-response write-back",
+         lambda: _writeback.pending if _writeback is not None else 0)
+callback("gptmemory_writeback_jobs_total", "Post-response write-back jobs by outcome", _outcomes,
+         kind="counter", labelnames=("result",))
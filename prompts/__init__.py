@@ -1,12 +1,13 @@
 # prompts/__init__.py
 
 from .summary_prompts import get_summary_prompt, SUMMARIZATION_PROMPT
-from .system_prompts import get_system_prompt, SYSTEM_PROMPT_WITH_MEMORY, SYSTEM_PROMPT_NO_MEMORY
+from .system_prompts import get_system_prompt, SYSTEM_PROMPT_PREFIX, SYSTEM_PROMPT_WITH_MEMORY, SYSTEM_PROMPT_NO_MEMORY
 
 __all__ = [
     "get_summary_prompt",
     "SUMMARIZATION_PROMPT",
     "get_system_prompt",
+    "SYSTEM_PROMPT_PREFIX",
     "SYSTEM_PROMPT_WITH_MEMORY",
     "SYSTEM_PROMPT_NO_MEMORY"
 ]
\ No newline at end of file
@@ -40,6 +40,80 @@ def get_summary_prompt(user_input: str, assistant_response: str) -> str:
     )
 
 
+CONSOLIDATION_PROMPT = """
+You are compacting the long-term memory of a conversational AI system.
+Merge these older memory summaries about one user into a single summary.
+
+Memories:
+{memories}
+
+Rules:
+- Keep every distinct fact, preference and constraint
+- When memories conflict, keep the most recent (later in the list)
+- Drop repetition and small talk
+- At most 8 short lines
+
+Consolidated summary:
+"""
+
+
+def get_consolidation_prompt(summaries: list) -> str:
+    """
+    Format the consolidation prompt for a group of stored summaries.
+    
+    Args:
+        summaries: Memory texts, oldest first
+        
+    Returns:
+        Formatted prompt ready to send to LLM
+    """
+    memories = "\n".join(f"- {summary}" for summary in summaries)
+    return CONSOLIDATION_PROMPT.format(memories=memories)
+
+BATCH_SUMMARY_PROMPT = """
+You are creating memory summaries for a conversational AI system.
+Below is what is already known about the user, then the latest turns of the conversation.
+
+Known so far:
+{session_summary}
+
+Latest turns:
+{turns}
+
+Answer in two parts:
+1. Under "Memories:", the new facts, preferences or constraints from the latest turns
+   that are not already known, one short line each, or "none"
+2. Under "Session summary:", the known summary updated with them, at most 8 short lines
+
+Rules:
+- Be concise and factual
+- When the turns contradict what is known, the turns win
+- No opinions, commentary or filler words
+
+Memories:
+"""
+
+
+def get_batch_summary_prompt(turns: list, session_summary: str = "") -> str:
+    """
+    Format the prompt that summarizes several turns at once (memory/summary_scheduler.py).
+    
+    Args:
+        turns: (user_input, assistant_response) pairs, oldest first
+        session_summary: The session's rolling summary so far ("" for a new session)
+        
+    Returns:
+        Formatted prompt ready to send to LLM
+    """
+    lines = []
+    for user_input, assistant_response in turns:
+        lines.append(f"User said: {user_input}")
+        lines.append(f"Assistant said: {assistant_response}")
+    return BATCH_SUMMARY_PROMPT.format(
+        session_summary=session_summary or "(nothing yet)",
+        turns="\n".join(lines)
+    )
+
 # Test function
 if __name__ == "__main__":
     test_user = "My name is Alice and I love pizza"
@@ -1,23 +1,24 @@
 # prompts/system_prompts.py
 
-SYSTEM_PROMPT_WITH_MEMORY = """
+# Identical at the start of every prompt, with or without memories, so
+# provider-side prefix caching can reuse it; per-turn content comes after.
+SYSTEM_PROMPT_PREFIX = """
 You are a helpful AI assistant with access to memories from past conversations.
 
-Below are relevant facts and context from previous interactions:
-
-{retrieved_memories}
-
+Relevant facts and context from previous interactions, if there are any, are listed below.
 Use this information to provide personalized and contextually aware responses.
 If the memories contain relevant information, incorporate it naturally into your answer.
 If the memories don't help with the current question, just answer normally.
+"""
 
+
+SYSTEM_PROMPT_WITH_MEMORY = SYSTEM_PROMPT_PREFIX + """
+{retrieved_memories}
 Current user message: {user_input}
 """
 
 
-SYSTEM_PROMPT_NO_MEMORY = """
-You are a helpful AI assistant.
-
+SYSTEM_PROMPT_NO_MEMORY = SYSTEM_PROMPT_PREFIX + """
 Current user message: {user_input}
 """
 
@@ -28,7 +29,7 @@ def get_system_prompt(user_input: str, retrieved_memories: str = None) -> str:
     
     Args:
         user_input: Current user message
-        retrieved_memories: Formatted string of past memories (optional)
+        retrieved_memories: Memory block from memory.context.pack_memories (optional)
         
     Returns:
         Complete system prompt
@@ -0,0 +1,96 @@
+"""
+graph.ainvoke must keep embedding and vector store calls off the event loop.
+Runs the full graph on the numpy backend with local embeddings, made slow so
+that any call on the loop thread shows up as heartbeat lag.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import db.embeddings as embeddings
+import db.vector_store as vector_store
+from db.local_embeddings import HashedNgramEmbeddings
+
+
+EMBED_DELAY_S = 0.1
+
+
+class SlowEmbeddings(HashedNgramEmbeddings):
+    """Local embeddings with provider-like latency; records the threads they ran on."""
+
+    def __init__(self):
+        super().__init__(dim=64)
+        self.threads = set()
+
+    def embed_documents(self, texts):
+        self.threads.add(threading.get_ident())
+        time.sleep(EMBED_DELAY_S)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.threads.add(threading.get_ident())
+        time.sleep(EMBED_DELAY_S)
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def slow_store(tmp_path, monkeypatch):
+    slow = SlowEmbeddings()
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(vector_store, "NUMPY_PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(vector_store, "CHROMA_PERSIST_DIR", str(tmp_path))
+    for name in ("_vector_store", "_partitions", "_lexical_partitions", "_lexical_global"):
+        monkeypatch.setattr(vector_store, name, None)
+    monkeypatch.setattr(embeddings, "_embeddings", slow)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)  # placeholder generation, no provider calls
+    yield slow
+
+
+async def _heartbeat(stop: asyncio.Event, interval_s: float = 0.005) -> float:
+    """Largest delay past its due time of a task that wakes every interval_s."""
+    worst = 0.0
+    while not stop.is_set():
+        due = time.perf_counter() + interval_s
+        await asyncio.sleep(interval_s)
+        worst = max(worst, time.perf_counter() - due)
+    return worst
+
+
+def test_concurrent_ainvoke_does_not_block_loop(slow_store):
+    from graph.pipeline import build_graph
+    from memory.write_queue import get_write_queue
+
+    graph = build_graph()
+    turns = [
+        {"user_input": f"My name is user {i} and I live in city {i}.", "metadata": {"session_id": f"session-{i}"}}
+        for i in range(8)
+    ]
+    warm_up = [
+        {"user_input": f"I work as a baker number {i}.", "metadata": {"session_id": f"warm-up-{i}"}}
+        for i in range(len(turns))
+    ]
+
+    async def main():
+        # Cold start (imports, the remember gate model, growing the thread pools) holds the GIL in
+        # worker threads and makes the loop wait on thread starts; measure once that's done
+        await asyncio.gather(*(graph.ainvoke(turn) for turn in warm_up))
+        stop = asyncio.Event()
+        heartbeat = asyncio.create_task(_heartbeat(stop))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(graph.ainvoke(turn) for turn in turns))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        return results, elapsed, await heartbeat, threading.get_ident()
+
+    results, elapsed, worst_lag, loop_thread = asyncio.run(main())
+    get_write_queue().flush(10)
+
+    assert all(r["response"] for r in results)
+    assert slow_store.threads and loop_thread not in slow_store.threads
+    # One slow embedding on the loop would stall the heartbeat for EMBED_DELAY_S
+    assert worst_lag < EMBED_DELAY_S / 2
+    # The turns overlapped instead of queueing behind each other's embeddings
+    assert elapsed < len(turns) * EMBED_DELAY_S
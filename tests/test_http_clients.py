@@ -0,0 +1,135 @@
+"""
+Shared provider HTTP pool (db/http_clients.py) against a local stand-in server.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from db.http_clients import HTTPClients, PoolStats, ProviderStats, _AsyncLimitedTransport
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_s: float = 0.0):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.latency_s = latency_s
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency_s)
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = StandInServer(latency_s=0.01)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_sequential_requests_reuse_one_connection(server):
+    clients = HTTPClients(limits={"openai": 4})
+    try:
+        for _ in range(10):
+            assert clients.client("openai").post(server.url, json={}).json() == {"ok": True}
+        for _ in range(5):
+            clients.client("local").post(server.url, json={})
+        pool = clients.stats()["pool"]
+    finally:
+        clients.close()
+
+    assert server.connections == 1
+    assert pool == {"requests": 15, "connects": 1, "reused": 14}
+
+
+def test_provider_limit_caps_in_flight(server):
+    clients = HTTPClients(limits={"openai": 2})
+    try:
+        client = clients.client("openai")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: client.post(server.url, json={}), range(16)))
+        stats = clients.stats()
+    finally:
+        clients.close()
+
+    assert all(r.status_code == 200 for r in responses)
+    provider = stats["providers"]["openai"]
+    assert provider["peak_in_flight"] == 2
+    assert provider["in_flight"] == 0
+    assert provider["waited"] > 0
+    assert stats["pool"]["connects"] == server.connections <= 2
+
+
+def test_async_client_limit_and_connects(server):
+    clients = HTTPClients(limits={"openai": 2})
+
+    async def main():
+        client = clients.async_client("openai")
+        responses = await asyncio.gather(*(client.post(server.url, json={}) for _ in range(8)))
+        stats = clients.stats()
+        await clients.aclose()
+        return responses, stats
+
+    responses, stats = asyncio.run(main())
+    assert all(r.status_code == 200 for r in responses)
+    assert stats["async_providers"]["openai"]["peak_in_flight"] == 2
+    assert stats["async_pool"]["requests"] == 8
+    assert stats["async_pool"]["connects"] == server.connections <= 2
+
+
+def test_async_slots_are_per_event_loop():
+    async def body():
+        await asyncio.sleep(0.001)
+        yield b"{}"
+
+    async def handler(request):
+        # Streamed like a real provider response (the slot is freed when it's read)
+        return httpx.Response(200, content=body())
+
+    transport = _AsyncLimitedTransport(httpx.MockTransport(handler), 1, ProviderStats(1), PoolStats())
+
+    async def burst():
+        async with httpx.AsyncClient(transport=transport) as client:
+            responses = await asyncio.gather(*(client.get("http://stand-in/") for _ in range(4)))
+        return [r.status_code for r in responses]
+
+    # A contended semaphore binds to its loop; a second loop must get its own
+    assert asyncio.run(burst()) == [200] * 4
+    assert asyncio.run(burst()) == [200] * 4